@@ -45,6 +45,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # outermost, so the latency covers every other middleware
+    'core.metrics.metrics_middleware',
+    # before anything else touches the body; see core.compression
+    'core.compression.compression_middleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware', 
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -53,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.db.pin_after_write',
 ]
 
 ROOT_URLCONF = 'bms_backend.urls'
@@ -82,9 +87,91 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # seconds to keep a connection open between requests; set
+        # DB_CONN_MAX_AGE=0 under ASGI, where connections are per request
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # take the write lock at BEGIN, so writers queue on busy_timeout
+            # instead of failing when a read transaction tries to upgrade
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # a file rather than shared-cache memory, so concurrent test
+        # connections wait on the busy timeout instead of failing on table locks
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    }
+}
+
+# Applied to every new SQLite connection (core.db.configure_sqlite). WAL is
+# not among them: the journal mode is stored in the database file, so
+# migration core 0014 sets it once instead of every connection rewriting it.
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32000,  # KiB
+}
+
+# Read replica for the read-only views (core.db.replica_reads). Locally
+# DB_REPLICA_NAME may be a copy of the database file, or the same file for a
+# second connection; unset, everything reads from the primary.
+DATABASE_REPLICA = None
+if os.environ.get('DB_REPLICA_NAME'):
+    DATABASE_REPLICA = 'replica'
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DB_REPLICA_NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+# how long a client reads from the primary after its own write
+REPLICA_PIN_SECONDS = 5
+
+# /api/metrics/: with several worker processes, point METRICS_DIR at a
+# directory they share so any of them can report the totals of all
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_SECONDS = 5
+# files of exited workers idle this long are folded into retired.json
+METRICS_RETIRE_SECONDS = 300
+# statements at least this slow are logged to core.slow_queries
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', '200'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.slow_queries': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'bms-backend',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
+# seconds a cached donor search / profile payload may live
+API_CACHE_TTL = 300
+
+# admin_stats caches the grouped breakdown, and daily series spanning at least
+# ADMIN_STATS_CACHE_MIN_DAYS, for this many seconds
+ADMIN_STATS_CACHE_TTL = 60
+ADMIN_STATS_CACHE_MIN_DAYS = 7
+
+# JWTs carry role/is_staff/profile id claims; how long the cached
+# (is_active, role) check behind them may lag a change made in another
+# process. None trusts the claims until the token expires.
+AUTH_STATE_TTL = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -124,6 +211,28 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    # Profile.photo: files named by content hash, shared between identical uploads
+    'photos': {'BACKEND': 'core.storage.ContentAddressedStorage'},
+}
+
+# media view (core.media): hand the file body to the front proxy with
+# 'x-accel-redirect' (nginx, internal location at MEDIA_ACCEL_PREFIX) or
+# 'x-sendfile' (Apache, lighttpd); unset streams it from Django
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE') or None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Cache-Control max-age of media that is not content-addressed (content-addressed is immutable)
+MEDIA_CACHE_SECONDS = 3600
+# cleanup_photos leaves unreferenced photos alone for this long
+PHOTO_CLEANUP_GRACE_HOURS = 24
+
+# profile photo variants are built on a background thread pool after upload
+PHOTO_VARIANTS_ASYNC = True
+PHOTO_WORKERS = 2
+PHOTO_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -134,17 +243,73 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000", "http://127.0.0.1:3000",
 ]
 CORS_ALLOW_CREDENTIALS = True
+# conditional GETs and delta sync tokens for browser clients
+CORS_EXPOSE_HEADERS = ['ETag', 'Last-Modified', 'X-Since-Token']
 
 # DRF + JWT
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
-    )
+    ),
+    # orjson when installed, stdlib json otherwise (core.renderers); the
+    # first class also renders the async views' responses
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+# response compression (core.compression): brotli if installed, else gzip,
+# for bodies of at least COMPRESS_MIN_SIZE bytes of these types
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_CONTENT_TYPES = ('application/json', 'text/plain', 'text/csv', 'text/html')
+COMPRESS_BROTLI_QUALITY = 4
+# brotli has no BREACH padding: only for these, everything else gets gzip
+COMPRESS_BROTLI_CONTENT_TYPES = ('application/json',)
+
+# List endpoints (donors, request inboxes) use keyset pagination;
+# set API_PAGINATE_LISTS = False to serve the legacy plain arrays by default.
+API_PAGINATE_LISTS = True
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+
+# ?since= delta sync (core.delta): tokens trail now by this many seconds so
+# writes that commit out of order are not skipped (keep it above the replica
+# lag when DATABASE_REPLICA is set); rows per delta response
+DELTA_SYNC_LAG_SECONDS = 2
+DELTA_SYNC_MAX_ROWS = 500
+
+# upper bound for donors/nearby/?radius_km=
+NEARBY_MAX_RADIUS_KM = 100
+
+# most donors a single requests/broadcast/ call may reach
+BROADCAST_MAX_DONORS = 50
+
+# donor roster import/export (core.roster): rows per bulk_create transaction,
+# rows per streamed export chunk, and row errors listed in an upload's report
+ROSTER_IMPORT_BATCH_SIZE = 500
+ROSTER_EXPORT_CHUNK_SIZE = 2000
+ROSTER_IMPORT_MAX_ERRORS = 1000
+
+# archive_requests moves requests responded to more than this many days ago
+# into BloodRequestArchive; keep it above the admin_stats window (366 days)
+REQUEST_ARCHIVE_AFTER_DAYS = 400
+
+# request events for the api/events/ SSE stream (core.events). The in-process
+# broker only reaches streams of the same worker; with EVENTS_DIR set, workers
+# on one machine share events through files there instead.
+EVENTS_DIR = os.environ.get('EVENTS_DIR') or None
+EVENTS_BACKEND = 'core.events.FileBroker' if EVENTS_DIR else 'core.events.InProcessBroker'
+EVENTS_HISTORY = 100
+EVENTS_POLL_SECONDS = 0.5
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_RETRY_MS = 3000
+# streams end after this long and EventSource reconnects with Last-Event-ID
+EVENTS_MAX_STREAM_SECONDS = 300
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=30),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
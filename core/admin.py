@@ -1,6 +1,6 @@
 # core/admin.py
 from django.contrib import admin
-from .models import Profile, BloodRequest
+from .models import Profile, BloodRequest, BloodRequestArchive, PhotoBlob
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
@@ -9,3 +9,11 @@ class ProfileAdmin(admin.ModelAdmin):
 @admin.register(BloodRequest)
 class BloodRequestAdmin(admin.ModelAdmin):
     list_display = ('id','requester','donor','status','requested_at','responded_at')
+
+@admin.register(BloodRequestArchive)
+class BloodRequestArchiveAdmin(admin.ModelAdmin):
+    list_display = ('id','requester','donor','status','requested_at','responded_at','archived_at')
+
+@admin.register(PhotoBlob)
+class PhotoBlobAdmin(admin.ModelAdmin):
+    list_display = ('name','refs','released_at','created_at')
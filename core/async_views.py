@@ -0,0 +1,324 @@
+# core/async_views.py
+"""
+Async-native versions of the read and request endpoints.
+
+DRF's @api_view functions are synchronous, so under ASGI each call is pushed
+through the sync-to-async thread bridge. These plain Django async views use
+the async ORM end to end and return the same payloads as their counterparts
+in core.views, encoded by the same renderer (core.renderers). Serializers
+only run once every row and related object has been fetched, so they never
+touch the database.
+"""
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import exceptions
+
+from . import events
+from .authentication import AsyncJWTAuthentication
+from .cache import acached_conditional, profile_dependencies
+from .cities import city_key
+from .conditional import aqueryset_validators
+from .db import replica_reads
+from .delta import InvalidSince, adelta_data, eligibility_flips, initial_token
+from .models import Profile, BloodRequest, BloodRequestArchive
+from .pagination import KeysetPagination, merge_ordered, pagination_requested
+from .renderers import JsonResponse
+from .permissions import user_role
+from .serializers import ProfileSerializer, BloodRequestSerializer, sparse_fields
+from .views import PROFILE_ORDERING, REQUEST_ORDERING, include_archived, with_since_token
+
+
+def error(detail, status):
+    return JsonResponse({"detail": detail}, status=status)
+
+
+def async_authenticated(view):
+    """
+    Resolve the JWT without blocking and require a user, like
+    permission_classes([IsAuthenticated]) on the sync views.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await AsyncJWTAuthentication().aauthenticate(request)
+        except exceptions.APIException as exc:
+            return JsonResponse(
+                exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail},
+                status=exc.status_code,
+            )
+        if result is None:
+            return error("Authentication credentials were not provided.", 401)
+        request.user, request.auth = result
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+async def list_data(request, qs, serializer_class, ordering, archived=None):
+    """Async twin of core.views.list_data."""
+    context = {"request": request}
+    querysets = [qs] if archived is None else [qs, archived]
+    if not pagination_requested(request):
+        rows = merge_ordered([[obj async for obj in q.order_by(*ordering)] for q in querysets], ordering)
+        return serializer_class(rows, many=True, context=context).data
+
+    paginator = KeysetPagination(ordering)
+    page = paginator.set_page(merge_ordered(
+        [[obj async for obj in paginator.page_queryset(q, request)] for q in querysets], ordering
+    ))
+    return paginator.get_paginated_data(
+        serializer_class(page, many=True, context=context).data
+    )
+
+
+async def list_response(request, qs, serializer_class, ordering, archived=None):
+    try:
+        data = await list_data(request, qs, serializer_class, ordering, archived)
+    except exceptions.NotFound as exc:
+        return error(exc.detail, 404)
+    return JsonResponse(data, safe=False)
+
+
+async def delta_response(request, changes, matching, serializer_class, flipped=None):
+    """Async twin of core.views.delta_response."""
+    try:
+        data = await adelta_data(
+            request, request.GET["since"], changes, matching, serializer_class, flipped
+        )
+    except InvalidSince as exc:
+        return error(str(exc), 400)
+    return JsonResponse(data)
+
+
+async def conditional_list_response(request, qs, archived=None):
+    """Async twin of core.views.conditional_list_response."""
+    querysets = [qs] if archived is None else [qs, archived]
+    serializer, trim = sparse_fields(request, BloodRequestSerializer, "requested_at")
+    related = [trim(q.select_related(*BloodRequestSerializer.related_fields)) for q in querysets]
+    if "since" in request.GET:
+        return await delta_response(request, querysets, related, serializer)
+
+    token = initial_token()
+    validators = await aqueryset_validators(
+        request, *querysets, related=BloodRequestSerializer.related_fields
+    )
+    not_modified = validators.not_modified(request)
+    if not_modified is not None:
+        return with_since_token(not_modified, token)
+    return with_since_token(validators.apply(
+        await list_response(request, related[0], serializer, REQUEST_ORDERING, *related[1:])
+    ), token)
+
+
+# ---------------------------
+# Donor list & profiles
+# ---------------------------
+@replica_reads
+@require_GET
+async def donors_list(request):
+    blood = (request.GET.get("blood") or "").strip().upper()
+    city = city_key(request.GET.get("city"))
+    available = request.GET.get("available") == "true"
+
+    async def donors():
+        qs = Profile.objects.filter(role="donor")
+        if blood:
+            qs = qs.filter(blood_group=blood)
+        if city:
+            exact = qs.filter(city_key=city)
+            qs = exact if await exact.aexists() else qs.city_like(city)
+        if available:
+            qs = qs.eligible_on()
+        return qs
+
+    serializer, trim = sparse_fields(request, ProfileSerializer, "date_created")
+    if "since" in request.GET:
+        matching = trim((await donors()).select_related("user"))
+        return await delta_response(
+            request,
+            [Profile.objects.donor_changes()],
+            [matching],
+            serializer,
+            eligibility_flips(matching),
+        )
+
+    async def build(qs):
+        return await list_data(request, trim(qs.select_related("user")), serializer, PROFILE_ORDERING)
+
+    params = {
+        "blood": blood,
+        "city": city,
+        "available": available,
+        "cursor": request.GET.get("cursor"),
+        "page_size": request.GET.get("page_size"),
+        "paginate": pagination_requested(request),
+        "fields": request.GET.get("fields"),
+        "expand": request.GET.get("expand"),
+    }
+    token = initial_token()
+    try:
+        validators, data = await acached_conditional(
+            request,
+            "donors",
+            params,
+            profile_dependencies(blood_group=blood, city=city),
+            donors,
+            build,
+        )
+    except exceptions.NotFound as exc:
+        return error(exc.detail, 404)
+    if data is None:
+        return with_since_token(validators.not_modified(request), token)
+    return with_since_token(validators.apply(JsonResponse(data, safe=False)), token)
+
+
+@replica_reads
+@require_GET
+async def profile_detail(request, pk):
+    serializer, trim = sparse_fields(request, ProfileSerializer)
+
+    async def profile():
+        return Profile.objects.filter(id=pk)
+
+    async def build(qs):
+        obj = await trim(qs.select_related("user")).aget()
+        return serializer(obj, context={"request": request}).data
+
+    params = {"pk": pk, "fields": request.GET.get("fields"), "expand": request.GET.get("expand")}
+    try:
+        validators, data = await acached_conditional(
+            request, "profile", params, profile_dependencies(profile_id=pk), profile, build
+        )
+    except Profile.DoesNotExist:
+        return error("Not found", 404)
+    if data is None:
+        return validators.not_modified(request)
+    return validators.apply(JsonResponse(data))
+
+
+# ---------------------------
+# Blood Requests (Patient ↔ Donor)
+# ---------------------------
+@csrf_exempt
+@require_POST
+@async_authenticated
+async def send_request(request, donor_id):
+    """
+    Patient sends blood request to a donor.
+    """
+    if request.content_type == "application/json":
+        try:
+            body = json.loads(request.body or b"{}")
+        except ValueError:
+            return error("Malformed JSON.", 400)
+    else:
+        body = request.POST
+    message = body.get("message", "")
+
+    try:
+        donor_profile = await Profile.objects.select_related("user").aget(
+            id=donor_id, role="donor"
+        )
+    except Profile.DoesNotExist:
+        return error("No Profile matches the given query.", 404)
+    donor_user = donor_profile.user
+
+    if request.user == donor_user:
+        return error("You cannot send request to yourself.", 400)
+
+    blood_request = await BloodRequest.objects.acreate(
+        requester=request.user, donor=donor_user, message=message
+    )
+    # acreate() has already committed
+    events.notify_request(blood_request, "request.created", after_commit=False)
+    # request.user comes from the token claims, without its profile
+    blood_request = await BloodRequest.objects.select_related(
+        *BloodRequestSerializer.related_fields
+    ).aget(pk=blood_request.pk)
+    return JsonResponse(
+        BloodRequestSerializer(blood_request, context={"request": request}).data,
+        status=201,
+    )
+
+
+@require_GET
+@async_authenticated
+async def donor_requests(request):
+    """
+    Donor views all incoming requests
+    """
+    role = user_role(request.user)
+    if role is None:
+        return error("Profile not found", 404)
+
+    if role != "donor":
+        return error("Only donors can access this endpoint.", 403)
+
+    archived = BloodRequestArchive.objects.filter(donor=request.user) if include_archived(request) else None
+    return await conditional_list_response(
+        request, BloodRequest.objects.filter(donor=request.user), archived
+    )
+
+
+@require_GET
+@async_authenticated
+async def patient_requests(request):
+    """
+    Patient views all requests they have sent.
+    """
+    archived = BloodRequestArchive.objects.filter(requester=request.user) if include_archived(request) else None
+    return await conditional_list_response(
+        request, BloodRequest.objects.filter(requester=request.user), archived
+    )
+
+
+# ---------------------------
+# Server-sent events
+# ---------------------------
+def token_from_query(view):
+    """
+    EventSource cannot set headers, so accept the access token as ?token=
+    when there is no Authorization header.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        token = request.GET.get("token")
+        if token and "HTTP_AUTHORIZATION" not in request.META:
+            request.META["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@require_GET
+@token_from_query
+@async_authenticated
+async def events_stream(request):
+    """
+    text/event-stream of the user's request events (see core.events).
+    Resumes after Last-Event-ID (header, or ?last_event_id=); ?timeout=
+    ends the stream sooner than EVENTS_MAX_STREAM_SECONDS.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    max_seconds = settings.EVENTS_MAX_STREAM_SECONDS
+    try:
+        if last_event_id is not None:
+            last_event_id = max(0, int(last_event_id))
+        if "timeout" in request.GET:
+            max_seconds = max(0.0, min(float(request.GET["timeout"]), max_seconds))
+    except ValueError:
+        return error("last_event_id and timeout must be numbers.", 400)
+
+    response = StreamingHttpResponse(
+        events.stream(events.user_channel(request.user.id), last_event_id, max_seconds),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # nginx would otherwise buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,186 @@
+# core/authentication.py
+"""
+Stateless JWT authentication.
+
+Tokens carry the user's role, is_staff flag and profile id as claims, so
+request.user can be rebuilt from the token without loading User or Profile.
+The only per-user state consulted is a small (is_active, is_staff, role,
+profile id) record cached for AUTH_STATE_TTL seconds: it makes deactivation
+and role changes take effect on tokens that were issued before them. Saving
+a User or Profile drops the record (see signals.py), so the TTL only bounds
+staleness across processes. AUTH_STATE_TTL = None skips the check entirely
+and trusts the claims for the token's lifetime.
+
+Tokens issued before the claims existed fall back to the database lookup.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+ROLE_CLAIM = "role"
+STAFF_CLAIM = "is_staff"
+PROFILE_CLAIM = "profile_id"
+
+_MISSING = object()
+
+
+def add_claims(token, user):
+    from .models import Profile
+
+    try:
+        profile = user.profile
+    except Profile.DoesNotExist:
+        profile = None
+    token["email"] = user.email
+    token[ROLE_CLAIM] = profile.role if profile else None
+    token[STAFF_CLAIM] = user.is_staff
+    token[PROFILE_CLAIM] = profile.id if profile else None
+    return token
+
+
+def token_for_user(user):
+    """RefreshToken.for_user with the claims; access tokens derived from it inherit them."""
+    return add_claims(RefreshToken.for_user(user), user)
+
+
+def _state_key(user_id):
+    return f"bms:auth:{user_id}"
+
+
+def _state_ttl():
+    return getattr(settings, "AUTH_STATE_TTL", 60)
+
+
+def _state_query(user_id):
+    return get_user_model().objects.filter(
+        **{api_settings.USER_ID_FIELD: user_id}
+    ).values("is_active", "is_staff", "profile__role", "profile__id")
+
+
+def _as_state(row):
+    if row is None:
+        return None
+    return {
+        "is_active": row["is_active"],
+        STAFF_CLAIM: row["is_staff"],
+        ROLE_CLAIM: row["profile__role"],
+        PROFILE_CLAIM: row["profile__id"],
+    }
+
+
+def user_state(user_id):
+    state = cache.get(_state_key(user_id), _MISSING)
+    if state is _MISSING:
+        state = _as_state(_state_query(user_id).first())
+        cache.set(_state_key(user_id), state, _state_ttl())
+    return state
+
+
+async def auser_state(user_id):
+    state = await cache.aget(_state_key(user_id), _MISSING)
+    if state is _MISSING:
+        state = _as_state(await _state_query(user_id).afirst())
+        await cache.aset(_state_key(user_id), state, _state_ttl())
+    return state
+
+
+def forget_user_state(user_id):
+    cache.delete(_state_key(user_id))
+
+
+def _read_only(*args, **kwargs):
+    raise TypeError("Users rebuilt from token claims cannot be saved; load the user first.")
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that builds request.user from the token claims.
+
+    The user is an unsaved User instance carrying the primary key, email and
+    is_staff, plus `role` and `profile_id` attributes, so it can be compared
+    with and assigned to foreign keys like a loaded user. `user.profile`
+    still works but costs a query; views should read `role` instead.
+    """
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        user_id = self.get_user_id(validated_token)
+        state = user_state(user_id) if _state_ttl() is not None else _MISSING
+        return self.claims_user(user_id, validated_token, state)
+
+    def get_user_id(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+        # simplejwt stores the id as a string
+        return self.user_model._meta.get_field(api_settings.USER_ID_FIELD).to_python(user_id)
+
+    def claims_user(self, user_id, validated_token, state=_MISSING):
+        claims = {
+            key: validated_token.get(key) for key in (ROLE_CLAIM, STAFF_CLAIM, PROFILE_CLAIM)
+        }
+        if state is not _MISSING:
+            if state is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            if api_settings.CHECK_USER_IS_ACTIVE and not state["is_active"]:
+                raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+            # the claims are a snapshot from login; a role change since wins
+            claims.update((key, state[key]) for key in claims)
+
+        email = validated_token.get("email") or ""
+        user = self.user_model(
+            **{api_settings.USER_ID_FIELD: user_id},
+            username=email,
+            email=email,
+            is_active=True,
+            is_staff=bool(claims[STAFF_CLAIM]),
+        )
+        user._state.adding = False
+        user.save = _read_only
+        user.role = claims[ROLE_CLAIM]
+        user.profile_id = claims[PROFILE_CLAIM]
+        return user
+
+
+class AsyncJWTAuthentication(ClaimsJWTAuthentication):
+    """
+    ClaimsJWTAuthentication for plain async Django views. Token parsing and
+    signature checks are CPU-only; the state check and the fallback user
+    lookup go through the async cache and ORM so the event loop is never
+    blocked.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        if ROLE_CLAIM in validated_token:
+            state = await auser_state(user_id) if _state_ttl() is not None else _MISSING
+            return self.claims_user(user_id, validated_token, state)
+
+        try:
+            user = await self.user_model.objects.select_related("profile").aget(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,199 @@
+# core/cache.py
+"""
+Versioned response cache for the anonymous donor endpoints.
+
+Entries are never deleted on write. Instead every entry key embeds the current
+value of the generation counters it depends on (per blood group, per city,
+per profile); a Profile change bumps its counters, so later lookups compute a
+new key and the old entries simply age out of the cache.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .cities import city_key
+from .conditional import aqueryset_stats, build_validators, queryset_stats
+
+ANY = '*'
+HITS_KEY = 'bms:stats:hits'
+MISSES_KEY = 'bms:stats:misses'
+
+
+def _gen_key(kind, value):
+    return f'bms:gen:{kind}:{value}'
+
+
+def _incr(key, initial):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, None)
+        return cache.get(key)
+
+
+def get_generations(keys):
+    """
+    Current value of each generation counter. A missing counter (never bumped,
+    or evicted) starts from the clock so it can never repeat an older value.
+    """
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def profile_dependencies(blood_group=None, city=None, profile_id=None):
+    keys = [_gen_key('group', blood_group or ANY)]
+    if city:
+        keys.append(_gen_key('city', city_key(city)))
+    if profile_id is not None:
+        keys.append(_gen_key('profile', profile_id))
+    return keys
+
+
+def bump_profile(profile, previous=None):
+    """
+    Invalidate everything a profile can appear in: its own detail entry, its
+    group and city (before and after the change) and the unfiltered lists.
+    """
+    keys = {_gen_key('group', ANY), _gen_key('profile', profile.pk)}
+    for blood_group, city in filter(None, [(profile.blood_group, profile.city), previous]):
+        keys.add(_gen_key('group', blood_group))
+        keys.add(_gen_key('city', city_key(city)))
+    for key in keys:
+        _incr(key, time.time_ns())
+
+
+def bump_bulk(blood_groups=(), cities=()):
+    """
+    bump_profile for bulk writes, which skip the post_save signals: invalidate
+    the unfiltered lists and every given group and city.
+    """
+    keys = {_gen_key('group', ANY)}
+    keys.update(_gen_key('group', blood_group) for blood_group in blood_groups)
+    keys.update(_gen_key('city', city_key(city)) for city in cities)
+    for key in keys:
+        _incr(key, time.time_ns())
+
+
+def _response_key(request, namespace, params, versions):
+    raw = json.dumps(
+        [namespace, request.build_absolute_uri('/'), str(timezone.now().date()), params, versions],
+        sort_keys=True,
+        default=str,
+    )
+    return f'bms:resp:{namespace}:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def cached_data(request, namespace, params, dependencies, build):
+    """
+    Return the cached payload for (namespace, params) or call `build()` and
+    store its result. The key also carries the request host, since photo URLs
+    are absolute, and today's date, since eligibility flips at midnight.
+    """
+    key = _response_key(request, namespace, params, get_generations(dependencies))
+    data = cache.get(key)
+    if data is not None:
+        _incr(HITS_KEY, 1)
+        return data
+
+    _incr(MISSES_KEY, 1)
+    data = build()
+    cache.set(key, data, getattr(settings, 'API_CACHE_TTL', 300))
+    return data
+
+
+async def _aresponse_key(request, namespace, params, dependencies):
+    values = await cache.aget_many(dependencies)
+    for key in dependencies:
+        if key not in values:
+            await cache.aadd(key, time.time_ns(), None)
+            values[key] = await cache.aget(key)
+    return _response_key(request, namespace, params, [values[k] for k in dependencies])
+
+
+async def _acount(hit):
+    counter = HITS_KEY if hit else MISSES_KEY
+    try:
+        await cache.aincr(counter)
+    except ValueError:
+        await cache.aadd(counter, 1, None)
+
+
+async def acached_data(request, namespace, params, dependencies, abuild):
+    """Async twin of `cached_data`; `abuild` is a coroutine function."""
+    key = await _aresponse_key(request, namespace, params, dependencies)
+    data = await cache.aget(key)
+    await _acount(data is not None)
+    if data is None:
+        data = await abuild()
+        await cache.aset(key, data, getattr(settings, 'API_CACHE_TTL', 300))
+    return data
+
+
+def cached_conditional(request, namespace, params, dependencies, queryset, build):
+    """
+    `cached_data` for endpoints answering conditional GETs. The entry keeps
+    the validator stats (core.conditional) of `queryset()` next to the payload
+    `build(queryset())`, so a warm request runs no SQL and a 304 never builds
+    the payload. `queryset` is called at most once, and only on a miss.
+    Returns (validators, data); data is None when the client's copy is current.
+    """
+    ttl = getattr(settings, 'API_CACHE_TTL', 300)
+    key = _response_key(request, namespace, params, get_generations(dependencies))
+    entry = cache.get(key) or {}
+    qs = None
+    if 'stats' not in entry:
+        qs = queryset()
+        entry = {'stats': queryset_stats(qs)}
+        cache.set(key, entry, ttl)
+    hit = qs is None
+    validators = build_validators(request, entry['stats'])
+    if validators.not_modified(request) is not None:
+        data = None
+    elif 'data' in entry:
+        data = entry['data']
+    else:
+        hit = False
+        data = entry['data'] = build(queryset() if qs is None else qs)
+        cache.set(key, entry, ttl)
+    _incr(HITS_KEY if hit else MISSES_KEY, 1)
+    return validators, data
+
+
+async def acached_conditional(request, namespace, params, dependencies, aqueryset, abuild):
+    """Async twin of `cached_conditional`; `aqueryset` and `abuild` are coroutine functions."""
+    ttl = getattr(settings, 'API_CACHE_TTL', 300)
+    key = await _aresponse_key(request, namespace, params, dependencies)
+    entry = await cache.aget(key) or {}
+    qs = None
+    if 'stats' not in entry:
+        qs = await aqueryset()
+        entry = {'stats': await aqueryset_stats(qs)}
+        await cache.aset(key, entry, ttl)
+    hit = qs is None
+    validators = build_validators(request, entry['stats'])
+    if validators.not_modified(request) is not None:
+        data = None
+    elif 'data' in entry:
+        data = entry['data']
+    else:
+        hit = False
+        data = entry['data'] = await abuild(await aqueryset() if qs is None else qs)
+        await cache.aset(key, entry, ttl)
+    await _acount(hit)
+    return validators, data
+
+
+def cache_stats():
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {
+        'hits': values.get(HITS_KEY, 0),
+        'misses': values.get(MISSES_KEY, 0),
+    }
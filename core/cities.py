@@ -0,0 +1,93 @@
+# core/cities.py
+"""
+Normalized city keys for Profile.city.
+
+Profile.city is free text, so users type the same place several ways
+("Dhaka ", "DHAKA", "Dacca"). Profile.city_key stores one canonical spelling
+that donor search can match exactly on an index; anything that misses falls
+back to a trigram FTS5 side table (SQLite) or a key prefix range.
+"""
+import re
+import unicodedata
+
+from django.db import connection, connections
+
+FTS_TABLE = 'core_profile_city_fts'
+
+# historic / alternate spellings -> current official spelling
+CITY_ALIASES = {
+    'dacca': 'dhaka',
+    'chittagong': 'chattogram',
+    'chittagang': 'chattogram',
+    'ctg': 'chattogram',
+    'comilla': 'cumilla',
+    'barisal': 'barishal',
+    'jessore': 'jashore',
+    'bogra': 'bogura',
+    'mymensing': 'mymensingh',
+}
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+
+
+def city_key(value):
+    """
+    'Dacca ' -> 'dhaka', 'Cox's  Bazar' -> 'cox s bazar'
+    """
+    if not value:
+        return ''
+    folded = unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode()
+    key = _NON_WORD.sub(' ', folded.lower()).strip()
+    return CITY_ALIASES.get(key, key)
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def fts_match_sql(key):
+    """
+    SQL + params selecting profile ids whose city key contains `key`
+    (trigram tokens need at least three characters).
+    """
+    phrase = '"' + key.replace('"', '""') + '"'
+    return f'SELECT rowid FROM {FTS_TABLE} WHERE city_key MATCH %s', [phrase]
+
+
+
+_TRIGGERS = {
+    'core_profile_city_fts_ai': f"""AFTER INSERT ON core_profile BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, city_key) VALUES (new.id, new.city_key);
+    END""",
+    'core_profile_city_fts_au': f"""AFTER UPDATE OF city_key ON core_profile BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, city_key) VALUES (new.id, new.city_key);
+    END""",
+    'core_profile_city_fts_ad': f"""AFTER DELETE ON core_profile BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+}
+
+
+def ensure_city_search_index(using):
+    """
+    (Re)create the FTS side table and its sync triggers. SQLite rebuilds
+    core_profile on most schema changes, which silently drops the triggers,
+    so this runs after every migrate and resyncs the table if any were missing.
+    """
+    conn = connections[using]
+    if conn.vendor != 'sqlite' or 'core_profile' not in conn.introspection.table_names():
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(city_key, tokenize='trigram')"
+        )
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'core_profile'")
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in _TRIGGERS if name not in existing]
+        if not missing:
+            return
+        for name in missing:
+            cursor.execute(f"CREATE TRIGGER {name} {_TRIGGERS[name]}")
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}(rowid, city_key) SELECT id, city_key FROM core_profile")
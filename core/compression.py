@@ -0,0 +1,123 @@
+# core/compression.py
+"""
+Negotiated response compression.
+
+Responses of at least COMPRESS_MIN_SIZE bytes with a COMPRESS_CONTENT_TYPES
+type are compressed with the best encoding the client accepts: brotli when
+the optional `brotli` package is installed and the type is one of
+COMPRESS_BROTLI_CONTENT_TYPES, otherwise gzip. Smaller bodies go out as they
+are, since compressing them costs more time than it saves bytes.
+
+Like django.middleware.gzip.GZipMiddleware, it sets Vary: Accept-Encoding,
+turns a strong ETag into a weak one (conditional GETs still match), and keeps
+the original body when compression would not shrink it. gzip output carries
+Django's random filename padding against BREACH; brotli has no such padding,
+so it is kept to the API's JSON, which has no CSRF token or other secret next
+to reflected input. Pages such as text/html always get gzip. Streaming
+responses are left alone: event streams must not be buffered, and exports are
+better compressed by the proxy in front.
+"""
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+
+def _gzip(content):
+    return compress_string(content, max_random_bytes=100)
+
+
+def _brotli(content):
+    return brotli.compress(content, quality=getattr(settings, "COMPRESS_BROTLI_QUALITY", 4))
+
+
+def encoders(content_type="application/json"):
+    """(coding, compress) pairs for `content_type` in server preference order."""
+    available = [("gzip", _gzip)]
+    brotli_types = tuple(getattr(settings, "COMPRESS_BROTLI_CONTENT_TYPES", ("application/json",)))
+    if brotli is not None and content_type.startswith(brotli_types):
+        available.insert(0, ("br", _brotli))
+    return available
+
+
+def parse_accept_encoding(header):
+    """{coding: q} from an Accept-Encoding header."""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(header, content_type="application/json"):
+    """The (coding, compress) pair to use, or None for identity."""
+    accepted = parse_accept_encoding(header or "")
+    best = None
+    for coding, compress in encoders(content_type):
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > 0 and (best is None or q > best[0]):
+            best = (q, coding, compress)
+    return best[1:] if best else None
+
+
+def _content_type(response):
+    return response.get("Content-Type", "").split(";")[0].strip().lower()
+
+
+def _compressible(response):
+    if response.streaming or response.has_header("Content-Encoding"):
+        return False
+    if len(response.content) < getattr(settings, "COMPRESS_MIN_SIZE", 1024):
+        return False
+    content_types = tuple(getattr(settings, "COMPRESS_CONTENT_TYPES", ("application/json",)))
+    return _content_type(response).startswith(content_types)
+
+
+def compress_response(request, response):
+    if not _compressible(response):
+        return response
+    patch_vary_headers(response, ("Accept-Encoding",))
+    chosen = negotiate(request.META.get("HTTP_ACCEPT_ENCODING"), _content_type(response))
+    if chosen is None:
+        return response
+    coding, compress = chosen
+    content = compress(response.content)
+    if len(content) >= len(response.content):
+        return response
+    response.content = content
+    response.headers["Content-Length"] = str(len(content))
+    response.headers["Content-Encoding"] = coding
+    etag = response.get("ETag")
+    if etag and etag.startswith('"'):
+        response.headers["ETag"] = "W/" + etag
+    return response
+
+
+@sync_and_async_middleware
+def compression_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return compress_response(request, await get_response(request))
+
+    else:
+        def middleware(request):
+            return compress_response(request, get_response(request))
+
+    return middleware
@@ -0,0 +1,96 @@
+# core/conditional.py
+"""
+ETag support for the polled list and detail endpoints.
+
+Validators come from one aggregate (MAX(updated_at), COUNT(*)) over the same
+filter the view serializes, which the (…, updated_at) indexes answer without
+touching the table. COUNT catches rows that left the filter, which MAX alone
+would miss; lists that nest related rows (the inboxes' profiles) fold in
+their MAX(updated_at) too. Today's date is folded in because the eligibility
+flags in the payload change at midnight even when no row does.
+
+No Last-Modified is sent: a date cannot express a row leaving the list, so
+If-Modified-Since would answer 304 for a shorter list.
+
+Endpoints behind the response cache (core.cache) store those stats next to
+the payload they describe, so a warm request builds its validators without
+any SQL.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+
+
+# updated_at is NOT NULL, so counting it equals COUNT(*) and keeps the
+# aggregate on the covering index
+AGGREGATES = {"last": Max("updated_at"), "count": Count("updated_at")}
+
+
+class Validators:
+    def __init__(self, etag):
+        self.etag = etag
+
+    def not_modified(self, request):
+        """The 304 response if the client's copy is current, else None."""
+        response = get_conditional_response(request, etag=self.etag)
+        return self.apply(response) if response is not None else None
+
+    def apply(self, response):
+        response["ETag"] = self.etag
+        return response
+
+
+def _aggregates(related):
+    # MAX(<path>__updated_at) for each nested relation the payload shows
+    aggregates = dict(AGGREGATES)
+    for i, path in enumerate(related):
+        aggregates[f"related_{i}"] = Max(f"{path}__updated_at")
+    return aggregates
+
+
+def queryset_stats(*querysets, related=()):
+    """
+    The build_validators() input for one queryset, or the union of several.
+    `related` are the lookups of nested rows whose changes alter the payload,
+    e.g. BloodRequestSerializer.related_fields.
+    """
+    return combine([qs.order_by().aggregate(**_aggregates(related)) for qs in querysets])
+
+
+async def aqueryset_stats(*querysets, related=()):
+    return combine([await qs.order_by().aaggregate(**_aggregates(related)) for qs in querysets])
+
+
+def queryset_validators(request, *querysets, related=()):
+    """Validators over one queryset, or the union of several (e.g. live + archived rows)."""
+    return build_validators(request, queryset_stats(*querysets, related=related))
+
+
+async def aqueryset_validators(request, *querysets, related=()):
+    return build_validators(request, await aqueryset_stats(*querysets, related=related))
+
+
+def combine(stats):
+    latest = [value for row in stats for key, value in row.items() if key != "count" and value is not None]
+    return {
+        "last": max(latest) if latest else None,
+        "count": sum(row["count"] for row in stats),
+    }
+
+
+def build_validators(request, stats):
+    user = getattr(request, "user", None)
+    raw = "|".join(
+        str(part)
+        for part in (
+            request.build_absolute_uri(),
+            user.pk if user is not None and user.is_authenticated else "",
+            timezone.now().date(),
+            stats["last"],
+            stats["count"],
+        )
+    )
+    etag = '"%s"' % hashlib.md5(raw.encode()).hexdigest()
+    return Validators(etag)
@@ -0,0 +1,141 @@
+# core/db.py
+"""
+Database connection setup and read-replica routing.
+
+Every new SQLite connection gets SQLITE_PRAGMAS (synchronous=NORMAL,
+busy_timeout, mmap and page cache sizes); see configure_connection in
+signals.py. WAL mode is persistent and set once, by migration 0014.
+
+Views wrapped in @replica_reads send their reads to the DATABASE_REPLICA
+alias when one is configured. Writes always go to "default", and so does
+every read inside a transaction. After a successful write request the client
+(its Authorization header, or its address) is pinned to the primary for
+REPLICA_PIN_SECONDS, so it reads its own writes even while the replica lags.
+"""
+import hashlib
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_replica_reads = ContextVar("bms_replica_reads", default=False)
+
+
+def configure_sqlite(connection):
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def replica_alias():
+    alias = getattr(settings, "DATABASE_REPLICA", None)
+    return alias if alias and alias != DEFAULT_DB_ALIAS else None
+
+
+def _pin_key(request):
+    ident = request.META.get("HTTP_AUTHORIZATION") or request.META.get("REMOTE_ADDR", "")
+    return "bms:pin:" + hashlib.md5(ident.encode()).hexdigest()
+
+
+def _pins(request, response):
+    return (
+        replica_alias() is not None
+        and request.method not in SAFE_METHODS
+        and response.status_code < 400
+    )
+
+
+class ReplicaRouter:
+    """
+    Reads from views marked with @replica_reads go to the replica; everything
+    else keeps Django's default behaviour.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias is None or not _replica_reads.get():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != replica_alias()
+
+
+def replica_reads(view):
+    """
+    Let a read-only view query the replica, unless the request is a write or
+    the client is pinned to the primary after a recent write of its own.
+    Works for sync and async views.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if (
+                replica_alias() is None
+                or request.method not in SAFE_METHODS
+                or await cache.aget(_pin_key(request))
+            ):
+                return await view(request, *args, **kwargs)
+            token = _replica_reads.set(True)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _replica_reads.reset(token)
+
+        return wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (
+            replica_alias() is None
+            or request.method not in SAFE_METHODS
+            or cache.get(_pin_key(request))
+        ):
+            return view(request, *args, **kwargs)
+        token = _replica_reads.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+
+    return wrapper
+
+
+@sync_and_async_middleware
+def pin_after_write(get_response):
+    """Pin the client to the primary after a successful write request."""
+    timeout = getattr(settings, "REPLICA_PIN_SECONDS", 5)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            response = await get_response(request)
+            if _pins(request, response):
+                await cache.aset(_pin_key(request), True, timeout)
+            return response
+
+    else:
+        def middleware(request):
+            response = get_response(request)
+            if _pins(request, response):
+                cache.set(_pin_key(request), True, timeout)
+            return response
+
+    return middleware
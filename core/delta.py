@@ -0,0 +1,192 @@
+# core/delta.py
+"""
+Delta sync for list endpoints: ?since=<token> returns only the rows created
+or modified after the token, plus a new token to send next time.
+
+A row that changed but no longer matches the endpoint's filters comes back
+as a tombstone, {"id": ..., "removed": true}; live rows carry
+"removed": false. Examples are a donor who moved city, became a patient or
+just donated. Clients upsert live rows and drop tombstones by id.
+
+Changes are found through the (…, updated_at) indexes, ordered by
+(updated_at, id): an empty delta is a single index probe. The token is that
+keyset position, but it never runs ahead of now - DELTA_SYNC_LAG_SECONDS.
+A write whose transaction started before a later write committed can carry
+an older updated_at; the lag means it is still picked up, at the cost of
+sometimes sending a recent row twice. Hard deletes leave no row behind and
+are not reported, so clients should do a full refresh now and then.
+
+Rows whose output changes without a write (donors becoming eligible again)
+count as changed at midnight UTC of that day and share the same keyset, so
+DELTA_SYNC_MAX_ROWS and has_more cover them too.
+"""
+import base64
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from .pagination import merge_ordered
+
+ORDERING = ("updated_at", "id")
+
+
+class InvalidSince(ValueError):
+    pass
+
+
+def encode_token(updated_at, pk):
+    raw = f"{updated_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_token(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        value, pk = base64.urlsafe_b64decode(padded).decode().split("|")
+        updated_at, pk = datetime.fromisoformat(value), int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidSince("Invalid since token.") from exc
+    if timezone.is_naive(updated_at):
+        raise InvalidSince("Invalid since token.")
+    return updated_at, pk
+
+
+def initial_token():
+    """A token for clients that have just done a full fetch."""
+    return encode_token(_horizon(), 0)
+
+
+def _horizon():
+    return timezone.now() - timedelta(seconds=getattr(settings, "DELTA_SYNC_LAG_SECONDS", 2))
+
+
+def _after(qs, position):
+    # (updated_at, id) > position, written as a range on updated_at so the
+    # index is probed rather than scanned (as in KeysetPagination)
+    updated_at, pk = position
+    return qs.filter(updated_at__gte=updated_at).exclude(updated_at=updated_at, id__lte=pk)
+
+
+def _limit():
+    return getattr(settings, "DELTA_SYNC_MAX_ROWS", 500)
+
+
+def _next_token(position, last=None):
+    updated_at, pk = (last.updated_at, last.id) if last is not None else position
+    horizon = _horizon()
+    if updated_at > horizon:
+        updated_at, pk = horizon, 0
+    return encode_token(updated_at, pk)
+
+
+def _flip_time(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def eligibility_flips(qs):
+    """
+    `flipped` callback for profile lists: donors of `qs` whose 90-day wait
+    ended after the token, whose can_donate flags changed without a write.
+    Returns (id, next_eligible_date) rows in keyset order, or None while the
+    date has not moved on (no query).
+    """
+    def flipped(position):
+        updated_at, pk = position
+        day = updated_at.astimezone(dt_timezone.utc).date()
+        if _flip_time(day) < updated_at:
+            # that day's flips came before the token
+            day, pk = day + timedelta(days=1), 0
+        today = timezone.now().date()
+        if day > today:
+            return None
+        return (
+            qs.filter(next_eligible_date__gte=day, next_eligible_date__lte=today)
+            .exclude(next_eligible_date=day, id__lte=pk)
+            .order_by("next_eligible_date", "id")
+            .values_list("id", "next_eligible_date")
+        )
+
+    return flipped
+
+
+def _changes_query(qs, position, limit):
+    return _after(qs, position).order_by(*ORDERING).values_list("id", "updated_at")[:limit]
+
+
+class _Change:
+    __slots__ = ("id", "updated_at", "flip")
+
+    def __init__(self, pk, updated_at, flip=False):
+        self.id, self.updated_at, self.flip = pk, updated_at, flip
+
+
+def _merge_changes(changes, flips, limit):
+    lists = [[_Change(*row) for row in rows] for rows in changes]
+    lists.append([_Change(pk, _flip_time(day), flip=True) for pk, day in flips])
+    return merge_ordered(lists, ORDERING)[:limit + 1]
+
+
+def _payload(request, changed, live, serializer_class, position, limit):
+    has_more = len(changed) > limit
+    changed = changed[:limit]
+    rows = list({c.id: live[c.id] for c in changed if c.id in live}.values())
+    # one many=True pass: a serializer per row would rebuild its fields every time
+    serialized = {
+        row["id"]: {**row, "removed": False}
+        for row in serializer_class(rows, many=True, context={"request": request}).data
+    }
+    results, sent = [], set()
+    for change in changed:
+        if change.id in sent:
+            continue
+        sent.add(change.id)
+        if change.id in serialized:
+            results.append(serialized[change.id])
+        elif not change.flip:
+            # a flip that stopped matching since is not a change to the list
+            results.append({"id": change.id, "removed": True})
+    last = changed[-1] if changed else None
+    return {"since": _next_token(position, last), "has_more": has_more, "results": results}
+
+
+def delta_data(request, since, changes, matching, serializer_class, flipped=None):
+    """
+    Payload for ?since=. `changes` are querysets covering every row that can
+    enter or leave the list (e.g. Profile.objects.donor_changes()), `matching`
+    the endpoint's filtered querysets (same tables, select_related as needed). `flipped`
+    optionally adds rows of `matching` whose output changed without a
+    write, such as donors who became eligible again (see eligibility_flips).
+    """
+    position = decode_token(since)
+    limit = _limit()
+    flips = flipped(position) if flipped is not None else None
+    changed = _merge_changes(
+        [list(_changes_query(qs, position, limit + 1)) for qs in changes],
+        list(flips[:limit + 1]) if flips is not None else [],
+        limit,
+    )
+    ids = {change.id for change in changed[:limit]}
+    live = {}
+    if ids:
+        for qs in matching:
+            live.update((obj.id, obj) for obj in qs.filter(id__in=ids))
+    return _payload(request, changed, live, serializer_class, position, limit)
+
+
+async def adelta_data(request, since, changes, matching, serializer_class, flipped=None):
+    """Async twin of delta_data."""
+    position = decode_token(since)
+    limit = _limit()
+    flips = flipped(position) if flipped is not None else None
+    changed = _merge_changes(
+        [[row async for row in _changes_query(qs, position, limit + 1)] for qs in changes],
+        [row async for row in flips[:limit + 1]] if flips is not None else [],
+        limit,
+    )
+    ids = {change.id for change in changed[:limit]}
+    live = {}
+    if ids:
+        for qs in matching:
+            live.update([(obj.id, obj) async for obj in qs.filter(id__in=ids)])
+    return _payload(request, changed, live, serializer_class, position, limit)
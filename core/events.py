@@ -0,0 +1,252 @@
+# core/events.py
+"""
+Server-sent events for blood request changes.
+
+Views publish small events ("request.created", "request.responded") to the
+channel of each user involved, once the write commits. The events/ stream
+(core.async_views.events_stream) forwards them to the user's open
+connections. A client that reconnects with Last-Event-ID gets everything it
+missed, provided the broker still holds it. Otherwise it receives a
+"resync" event and should refetch its inbox.
+
+The broker is pluggable through EVENTS_BACKEND:
+
+* InProcessBroker (default) keeps the last EVENTS_HISTORY events per channel
+  in memory and wakes waiting streams directly. It only reaches streams
+  served by the same process.
+* FileBroker appends to one small file per channel under EVENTS_DIR and
+  lets streams poll it. It is a local stand-in for a real pub/sub service
+  when several workers share one machine.
+
+A backend implements publish(), last_id(), read() and the coroutine wait().
+"""
+import asyncio
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+_encoder = DjangoJSONEncoder(separators=(",", ":"))
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+class InProcessBroker:
+    def __init__(self, history=None):
+        self.history = history or getattr(settings, "EVENTS_HISTORY", 100)
+        self._lock = threading.Lock()
+        self._events = {}   # channel -> deque of (id, event, data)
+        self._last = {}     # channel -> last id
+        self._waiters = {}  # channel -> set of (loop, asyncio.Event)
+
+    def publish(self, channel, event, data):
+        with self._lock:
+            event_id = self._last.get(channel, 0) + 1
+            self._last[channel] = event_id
+            self._events.setdefault(channel, deque(maxlen=self.history)).append((event_id, event, data))
+            waiters = self._waiters.pop(channel, ())
+        for loop, ready in waiters:
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass  # the stream's loop has already closed
+        return event_id
+
+    def last_id(self, channel):
+        return self._last.get(channel, 0)
+
+    def read(self, channel, after):
+        """
+        (events newer than `after`, complete). complete is False when some
+        of them have already been dropped from the history.
+        """
+        with self._lock:
+            events = list(self._events.get(channel, ()))
+            last = self._last.get(channel, 0)
+        newer = [e for e in events if e[0] > after]
+        oldest = newer[0][0] if newer else last + 1
+        return newer, after <= last and oldest == after + 1
+
+    async def wait(self, channel, after, timeout):
+        ready = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), ready)
+        with self._lock:
+            if self._last.get(channel, 0) > after:
+                return True
+            self._waiters.setdefault(channel, set()).add(waiter)
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.get(channel, set()).discard(waiter)
+
+
+class FileBroker:
+    """
+    Channel files hold one JSON event per line. They are appended to under
+    an exclusive flock and trimmed back to `history` lines once they hold
+    twice that many. Readers never lock; a trim swaps the file in
+    atomically.
+    """
+
+    def __init__(self, directory=None, history=None, poll_seconds=None):
+        self.directory = directory or settings.EVENTS_DIR
+        self.history = history or getattr(settings, "EVENTS_HISTORY", 100)
+        self.poll_seconds = poll_seconds or getattr(settings, "EVENTS_POLL_SECONDS", 0.5)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, channel):
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "-", channel) + ".ndjson")
+
+    def _load(self, path):
+        try:
+            with open(path) as fh:
+                lines = fh.read().splitlines()
+        except FileNotFoundError:
+            return []
+        return [tuple(json.loads(line)) for line in lines if line]
+
+    def publish(self, channel, event, data):
+        path = self._path(channel)
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            events = self._load(path)
+            event_id = events[-1][0] + 1 if events else 1
+            line = _encoder.encode([event_id, event, data]) + "\n"
+            if len(events) + 1 >= 2 * self.history:
+                kept = events[-(self.history - 1):] if self.history > 1 else []
+                with open(path + ".tmp", "w") as fh:
+                    fh.writelines(_encoder.encode(list(e)) + "\n" for e in kept)
+                    fh.write(line)
+                os.replace(path + ".tmp", path)
+            else:
+                with open(path, "a") as fh:
+                    fh.write(line)
+        return event_id
+
+    def last_id(self, channel):
+        events = self._load(self._path(channel))
+        return events[-1][0] if events else 0
+
+    def read(self, channel, after):
+        events = self._load(self._path(channel))
+        last = events[-1][0] if events else 0
+        newer = [e for e in events if e[0] > after]
+        oldest = newer[0][0] if newer else last + 1
+        return newer, after <= last and oldest == after + 1
+
+    async def wait(self, channel, after, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.last_id(channel) > after:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(self.poll_seconds, remaining))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                backend = getattr(settings, "EVENTS_BACKEND", "core.events.InProcessBroker")
+                _broker = import_string(backend)()
+    return _broker
+
+
+@receiver(setting_changed)
+def _reset_broker(setting, **kwargs):
+    global _broker
+    if setting.startswith("EVENTS_"):
+        _broker = None
+
+
+def publish(channel, event, data):
+    return get_broker().publish(channel, event, data)
+
+
+def publish_on_commit(channel, event, data):
+    """Publish once the current transaction commits (right away outside one)."""
+    transaction.on_commit(lambda: publish(channel, event, data))
+
+
+def request_event(blood_request):
+    return {
+        "id": blood_request.id,
+        "requester": blood_request.requester_id,
+        "donor": blood_request.donor_id,
+        "status": blood_request.status,
+        "requested_at": blood_request.requested_at,
+        "responded_at": blood_request.responded_at,
+    }
+
+
+def notify_request(blood_request, event, after_commit=True):
+    """
+    Tell both sides of a request about `event`, after commit. Async views
+    write in autocommit and pass after_commit=False, since on_commit()
+    needs the sync connection.
+    """
+    data = request_event(blood_request)
+    send = publish_on_commit if after_commit else publish
+    for user_id in {blood_request.requester_id, blood_request.donor_id}:
+        send(user_channel(user_id), event, data)
+
+
+# ---------------------------
+# Stream
+# ---------------------------
+def format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {_encoder.encode(data)}\n\n"
+
+
+async def stream(channel, last_event_id, max_seconds):
+    """
+    The text/event-stream body for `channel`. Without last_event_id only new
+    events are sent. The stream ends after max_seconds; EventSource then
+    reconnects on its own and resumes from Last-Event-ID.
+    """
+    broker = get_broker()
+    heartbeat = getattr(settings, "EVENTS_HEARTBEAT_SECONDS", 15)
+    yield f"retry: {int(getattr(settings, 'EVENTS_RETRY_MS', 3000))}\n\n"
+
+    after = broker.last_id(channel) if last_event_id is None else last_event_id
+    deadline = time.monotonic() + max_seconds
+    while True:
+        events, complete = broker.read(channel, after)
+        if not complete:
+            last = broker.last_id(channel)
+            yield format_event(last, "resync", {"last_id": last})
+            after = last
+            continue
+        for event_id, event, data in events:
+            yield format_event(event_id, event, data)
+            after = event_id
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        if not await broker.wait(channel, after, min(heartbeat, remaining)):
+            # keeps proxies from timing out an idle connection
+            yield ": keepalive\n\n"
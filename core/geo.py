@@ -0,0 +1,85 @@
+# core/geo.py
+"""
+Geohash helpers for nearby-donor search on plain SQLite.
+
+Profiles store a fixed-precision geohash of their coordinates. A radius query
+is turned into a handful of geohash prefixes covering its bounding box; each
+prefix is a contiguous range on the indexed column, so candidate pruning is a
+few index range scans and exact distances are only computed for those rows.
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# ~150m x 150m cells; queries use a prefix of this
+STORED_PRECISION = 7
+MAX_COVER_CELLS = 16
+EARTH_RADIUS_KM = 6371.0088
+
+
+def encode(lat, lon, precision=STORED_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(lat degrees, lon degrees) covered by one cell at `precision`."""
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def bounding_box(lat, lon, radius_km):
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    # guard the poles, where a longitude degree shrinks to nothing
+    dlon = math.degrees(radius_km / (EARTH_RADIUS_KM * max(math.cos(math.radians(lat)), 1e-6)))
+    return (
+        max(lat - dlat, -90.0), min(lat + dlat, 90.0),
+        max(lon - dlon, -180.0), min(lon + dlon, 180.0),
+    )
+
+
+def covering_cells(lat, lon, radius_km):
+    """
+    The finest set of at most MAX_COVER_CELLS geohash prefixes whose union
+    covers the circle's bounding box.
+    """
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    for precision in range(STORED_PRECISION, 0, -1):
+        lat_step, lon_step = cell_size(precision)
+        rows = range(math.floor((min_lat + 90) / lat_step), math.floor((max_lat + 90) / lat_step) + 1)
+        cols = range(math.floor((min_lon + 180) / lon_step), math.floor((max_lon + 180) / lon_step) + 1)
+        if len(rows) * len(cols) > MAX_COVER_CELLS:
+            continue
+        return sorted({
+            encode(
+                min(-90 + (r + 0.5) * lat_step, 90.0),
+                min(-180 + (c + 0.5) * lon_step, 180.0),
+                precision,
+            )
+            for r in rows for c in cols
+        })
+    return ['']  # whole world
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
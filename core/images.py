@@ -0,0 +1,149 @@
+# core/images.py
+"""
+Profile photo variants.
+
+Uploads are only checked on the request thread; resizing and re-encoding into
+the fixed VARIANTS happens on a small thread pool once the upload has been
+committed. Profile.photo_variants maps variant name -> stored file name and
+stays empty until the worker is done, so serializers fall back to the
+original photo in the meantime.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+from rest_framework import serializers
+
+from .storage import get_photo_storage, name_digest
+
+logger = logging.getLogger(__name__)
+
+# name -> (width, height, crop to fill)
+VARIANTS = {
+    'thumb': (96, 96, True),
+    'card': (320, 320, True),
+    'full': (1280, 1280, False),
+}
+VARIANT_DIR = 'profiles/variants'
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+MAX_PIXELS = 40_000_000
+
+_executor = None
+
+
+def validate_photo(upload):
+    """
+    Cheap request-thread checks: size limit, a decodable image, no
+    decompression bombs. Raises serializers.ValidationError.
+    """
+    if upload.size > getattr(settings, 'PHOTO_MAX_UPLOAD_BYTES', MAX_UPLOAD_BYTES):
+        raise serializers.ValidationError("Photo is too large.")
+    try:
+        with Image.open(upload) as image:
+            if image.width * image.height > MAX_PIXELS:
+                raise serializers.ValidationError("Photo dimensions are too large.")
+            image.verify()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise serializers.ValidationError("Upload a valid image.")
+    finally:
+        upload.seek(0)
+    return upload
+
+
+def render_variant(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+    return resized
+
+
+def variant_names(photo_name):
+    stem = os.path.splitext(os.path.basename(photo_name))[0]
+    return {variant: f'{VARIANT_DIR}/{stem}-{variant}.jpg' for variant in VARIANTS}
+
+
+def build_variants(photo_name, rebuild=False):
+    """
+    Re-encode the stored photo into every variant; returns {variant: file name}.
+    A content-addressed photo (core.storage) that already has its variants,
+    e.g. one uploaded before by someone else, reuses them unless `rebuild`.
+    """
+    targets = variant_names(photo_name)
+    if not rebuild and name_digest(photo_name) and all(map(default_storage.exists, targets.values())):
+        return targets
+
+    with get_photo_storage().open(photo_name, 'rb') as fh:
+        with Image.open(fh) as source:
+            image = ImageOps.exif_transpose(source).convert('RGB')
+
+    names = {}
+    for variant, (width, height, crop) in VARIANTS.items():
+        buffer = io.BytesIO()
+        render_variant(image, width, height, crop).save(
+            buffer, 'JPEG', quality=85, optimize=True, progressive=True
+        )
+        target = targets[variant]
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        names[variant] = default_storage.save(target, ContentFile(buffer.getvalue()))
+    return names
+
+
+def generate_variants(profile_id, photo_name, rebuild=False):
+    """
+    Build the variants and attach them to the profile, unless the photo was
+    replaced in the meantime.
+    """
+    from .cache import bump_profile
+    from .models import Profile
+
+    try:
+        names = build_variants(photo_name, rebuild)
+        updated = Profile.objects.filter(pk=profile_id, photo=photo_name).update(
+            photo_variants=names, updated_at=timezone.now()
+        )
+        if updated:
+            bump_profile(Profile.objects.get(pk=profile_id))
+    except Exception:
+        logger.exception("Could not build photo variants for profile %s", profile_id)
+
+
+def _generate_in_worker(profile_id, photo_name):
+    try:
+        generate_variants(profile_id, photo_name)
+    finally:
+        # worker threads own their DB connections
+        connections.close_all()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'PHOTO_WORKERS', 2), thread_name_prefix='photo-variants'
+        )
+    return _executor
+
+
+def schedule_variants(profile):
+    """
+    Queue variant generation for after the current transaction commits.
+    PHOTO_VARIANTS_ASYNC = False runs it inline (tests, management commands).
+    """
+    profile_id, photo_name = profile.pk, profile.photo.name
+
+    def run():
+        if getattr(settings, 'PHOTO_VARIANTS_ASYNC', True):
+            get_executor().submit(_generate_in_worker, profile_id, photo_name)
+        else:
+            generate_variants(profile_id, photo_name)
+
+    transaction.on_commit(run)
@@ -0,0 +1,67 @@
+# core/management/commands/archive_requests.py
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import BloodRequest, BloodRequestArchive
+from core.stats import MAX_WINDOW_DAYS
+
+
+class Command(BaseCommand):
+    help = (
+        "Move accepted/rejected requests responded to before the retention window "
+        "into BloodRequestArchive, one bounded transaction per batch. Safe to stop "
+        "and re-run: every batch commits on its own."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="retention window (default: REQUEST_ARCHIVE_AFTER_DAYS)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-batches', type=int, default=None, help="stop after this many batches")
+        parser.add_argument('--sleep', type=float, default=0.0, help="seconds to pause between batches")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived.")
+
+    def handle(self, *args, **options):
+        days = options['days'] or getattr(settings, 'REQUEST_ARCHIVE_AFTER_DAYS', 400)
+        if days < 1:
+            raise CommandError("--days must be at least 1.")
+        if days < MAX_WINDOW_DAYS:
+            self.stderr.write(
+                f"Warning: admin stats cover up to {MAX_WINDOW_DAYS} days and do not read the archive."
+            )
+        cutoff = timezone.now() - timedelta(days=days)
+        # the status filter is redundant (only responded rows have responded_at)
+        # but keeps a stray pending row out of the archive
+        due = BloodRequest.objects.filter(
+            responded_at__lt=cutoff, status__in=('accepted', 'rejected')
+        ).order_by('responded_at', 'id')
+
+        if options['dry_run']:
+            self.stdout.write(f"{due.count()} requests responded to before {cutoff:%Y-%m-%d} would be archived.")
+            return
+
+        moved = batches = 0
+        while options['max_batches'] is None or batches < options['max_batches']:
+            rows = list(due.values(*BloodRequestArchive.ARCHIVED_FIELDS)[:options['batch_size']])
+            if not rows:
+                break
+            ids = [row['id'] for row in rows]
+            with transaction.atomic():
+                # ignore_conflicts: a row copied by an interrupted manual run is not copied twice
+                BloodRequestArchive.objects.bulk_create(
+                    [BloodRequestArchive(**row) for row in rows], ignore_conflicts=True
+                )
+                # BloodRequest has no delete signals or dependants: one DELETE
+                BloodRequest.objects.filter(id__in=ids).delete()
+            moved += len(rows)
+            batches += 1
+            self.stdout.write(f"Archived {moved} requests...")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} requests in {batches} batches."))
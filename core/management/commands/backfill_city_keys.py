@@ -0,0 +1,43 @@
+# core/management/commands/backfill_city_keys.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.cities import city_key
+from core.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Recompute Profile.city_key for existing rows in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = 0
+        scanned = updated = 0
+
+        while True:
+            batch = list(
+                Profile.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .only('id', 'city', 'city_key')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            scanned += len(batch)
+
+            changed = []
+            for profile in batch:
+                key = city_key(profile.city)
+                if profile.city_key != key:
+                    profile.city_key = key
+                    changed.append(profile)
+            if changed:
+                # bulk_update skips save()/signals; the FTS triggers still fire
+                with transaction.atomic():
+                    Profile.objects.bulk_update(changed, ['city_key'])
+                updated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f"Scanned {scanned} profiles, updated {updated} city keys."))
@@ -0,0 +1,324 @@
+# core/management/commands/bench_api.py
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import django
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import urls
+from core.authentication import token_for_user
+from core.delta import encode_token
+from core.models import BloodRequest, Profile
+
+PASSWORD = 'bench-password'
+
+
+class Scenario:
+    """
+    One benchmarked call. `args`, `query` and `data` may be callables taking
+    (fixtures, i), where i counts every call of the scenario.
+    """
+
+    def __init__(self, label, name, method='get', args=None, query='', data=None, auth=None, slow=False,
+                 multipart=False):
+        self.label, self.name, self.method = label, name, method
+        self.args, self.query, self.data, self.auth = args, query, data, auth
+        # password hashing dominates: capped at --slow-requests
+        self.slow = slow
+        self.multipart = multipart
+
+    def call(self, client, fixtures, i):
+        args = self.args(fixtures, i) if callable(self.args) else self.args or []
+        query = self.query(fixtures, i) if callable(self.query) else self.query
+        url = reverse(self.name, args=args) + query
+        extra = {'HTTP_AUTHORIZATION': f'Bearer {fixtures.tokens[self.auth]}'} if self.auth else {}
+        if self.method == 'get':
+            response = client.get(url, **extra)
+            if response.streaming:
+                # the body is produced while it is read
+                read_streaming(response)
+            return response
+        data = self.data(fixtures, i) if callable(self.data) else self.data or {}
+        if self.multipart:
+            return getattr(client, self.method)(url, data=data, **extra)
+        return getattr(client, self.method)(
+            url, data=json.dumps(data), content_type='application/json', **extra
+        )
+
+
+def read_streaming(response):
+    if response.is_async:
+        async def drain():
+            return b''.join([chunk async for chunk in response.streaming_content])
+        return async_to_sync(drain)()
+    return b''.join(response.streaming_content)
+
+
+def roster_upload(fixtures, i, rows=50):
+    lines = ['name,email,blood_group,city,role,ever_donated,last_donation']
+    lines += [
+        f'Bench Import {i}-{n},bench-import-{i}-{n}@example.com,O+,Dhaka,donor,true,2024-01-15'
+        for n in range(rows)
+    ]
+    return {'file': SimpleUploadedFile('roster.csv', '\n'.join(lines).encode(), 'text/csv')}
+
+
+SCENARIOS = [
+    Scenario('register', 'register', 'post', slow=True, data=lambda fx, i: {
+        'name': f'Bench {i}', 'email': f'bench-register-{i}@example.com', 'password': PASSWORD,
+        'blood_group': 'A+', 'city': 'Dhaka', 'role': 'patient',
+    }),
+    Scenario('login', 'token_obtain_pair', 'post', slow=True,
+             data=lambda fx, i: {'username': fx.donor.username, 'password': PASSWORD}),
+    Scenario('token_refresh', 'token_refresh', 'post', data=lambda fx, i: {'refresh': fx.refresh}),
+    Scenario('donors_list', 'donors-list'),
+    Scenario('donors_list_filtered', 'donors-list', query='?blood=O%2B&city=dhaka&available=true'),
+    Scenario('donors_list_card', 'donors-list', query='?fields=card'),
+    Scenario('donors_list_delta', 'donors-list', query=lambda fx, i: f'?blood=O%2B&since={fx.since}'),
+    Scenario('donors_match', 'donors-match', query='?blood=A%2B&city=Dhaka'),
+    Scenario('donors_nearby', 'donors-nearby', query='?lat=23.81&lon=90.41&radius_km=10'),
+    Scenario('donors_import', 'donors-import', 'post', auth='staff', multipart=True, data=roster_upload),
+    Scenario('donors_export', 'donors-export', auth='staff', query='?fmt=csv'),
+    Scenario('donors_export_ndjson', 'donors-export', auth='staff', query='?fmt=ndjson'),
+    Scenario('profile_detail', 'profile-detail', args=lambda fx, i: [fx.profile_ids[i % len(fx.profile_ids)]]),
+    Scenario('profile_update', 'profile-update', 'put', auth='donor', data=lambda fx, i: {'bio': f'bench {i}'}),
+    Scenario('send_request', 'send-request', 'post', auth='patient',
+             args=lambda fx, i: [fx.donor.profile.id], data={'message': 'bench'}),
+    Scenario('broadcast_request', 'broadcast-request', 'post', auth='patient',
+             data={'blood': 'O+', 'city': 'Dhaka', 'limit': 10, 'message': 'bench'}),
+    Scenario('donor_requests', 'donor-requests', auth='donor'),
+    Scenario('respond_request', 'respond-request', 'post', auth='donor',
+             args=lambda fx, i: [fx.pending.pop()], data={'status': 'rejected'}),
+    Scenario('patient_requests', 'patient-requests', auth='patient'),
+    Scenario('patient_requests_card', 'patient-requests', auth='patient', query='?fields=card'),
+    Scenario('patient_requests_delta', 'patient-requests', auth='patient',
+             query=lambda fx, i: f'?since={fx.since}'),
+    Scenario('patient_requests_archived', 'patient-requests', auth='patient', query='?include_archived=true'),
+    Scenario('admin_stats', 'admin-stats', auth='staff', query='?breakdown=true&days=30'),
+    Scenario('metrics', 'metrics', auth='staff'),
+    Scenario('async_donors_list', 'async-donors-list'),
+    Scenario('async_profile_detail', 'async-profile-detail',
+             args=lambda fx, i: [fx.profile_ids[i % len(fx.profile_ids)]]),
+    Scenario('async_send_request', 'async-send-request', 'post', auth='patient',
+             args=lambda fx, i: [fx.donor.profile.id], data={'message': 'bench'}),
+    Scenario('async_donor_requests', 'async-donor-requests', auth='donor'),
+    Scenario('async_patient_requests', 'async-patient-requests', auth='patient'),
+    Scenario('media', 'media', args=lambda fx, i: [fx.media]),
+    # replay from the start of the channel, then close instead of waiting
+    Scenario('events_replay', 'events', auth='donor', query='?last_event_id=0&timeout=0'),
+]
+
+# metric -> compared relative to --threshold (False: any increase regresses)
+COMPARED = {'p50_ms': True, 'p95_ms': True, 'queries': False, 'peak_kib': True}
+
+
+def percentile(ordered, pct):
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class Fixtures:
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every API route in-process through the Django test client: "
+        "latency percentiles, throughput, SQL queries and peak memory per "
+        "endpoint. Seed data first (seed_data); writes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="timed requests per scenario")
+        parser.add_argument('--slow-requests', type=int, default=10, help="timed requests for password-hashing routes")
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--profile-requests', type=int, default=5, help="requests sampled for queries and memory")
+        parser.add_argument('--cold', action='store_true', help="Clear the cache before every request.")
+        parser.add_argument('--only', help="comma-separated scenario labels")
+        parser.add_argument('--output', help="write the results as JSON to this file")
+        parser.add_argument('--baseline', help="JSON from an earlier run to compare against")
+        parser.add_argument('--threshold', type=float, default=0.2, help="allowed relative slowdown, 0.2 = 20%%")
+
+    def handle(self, *args, **options):
+        scenarios = SCENARIOS
+        if options['only']:
+            wanted = set(options['only'].split(','))
+            scenarios = [s for s in SCENARIOS if s.label in wanted]
+            if unknown := wanted - {s.label for s in scenarios}:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        uncovered = {p.name for p in urls.urlpatterns} - {s.name for s in SCENARIOS}
+        if uncovered:
+            self.stderr.write(f"No benchmark scenario for: {', '.join(sorted(uncovered))}")
+
+        results = {}
+        self.stdout.write(
+            f"{'scenario':<24}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'queries':>9}{'peak KiB':>10}{'errors':>8}"
+        )
+        with transaction.atomic():
+            fixtures = self.make_fixtures(options)
+            client = Client()
+            for scenario in scenarios:
+                result = results[scenario.label] = self.measure(client, scenario, fixtures, options)
+                self.stdout.write(
+                    f"{scenario.label:<24}{result['throughput_rps']:>9.1f}{result['p50_ms']:>9.2f}"
+                    f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['queries']:>9.1f}"
+                    f"{result['peak_kib']:>10.1f}{result['errors']:>8}"
+                )
+            transaction.set_rollback(True)
+        # cached responses may reference the rolled-back rows
+        cache.clear()
+
+        report = {'meta': self.meta(options), 'results': results}
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+            self.stdout.write(f"Wrote {options['output']}")
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['threshold'])
+
+    def make_fixtures(self, options):
+        if not Profile.objects.filter(role='donor').exists():
+            raise CommandError("No donor profiles; run seed_data first.")
+        fx = Fixtures()
+        fx.donor = self.make_user('bench-donor@example.com', role='donor', blood_group='O+')
+        fx.patient = self.make_user('bench-patient@example.com', role='patient', blood_group='A+')
+        fx.staff = self.make_user('bench-staff@example.com', role='patient', is_staff=True)
+        fx.tokens = {}
+        for role in ('donor', 'patient', 'staff'):
+            token = token_for_user(getattr(fx, role))
+            fx.tokens[role] = str(token.access_token)
+        fx.refresh = str(token_for_user(fx.patient))
+        fx.profile_ids = list(
+            Profile.objects.filter(role='donor').order_by('id').values_list('id', flat=True)[:50]
+        )
+        # every respond_request call needs a request that is still pending
+        calls = options['warmup'] + options['profile_requests'] + options['requests']
+        fx.pending = [
+            br.id for br in BloodRequest.objects.bulk_create(
+                BloodRequest(requester=fx.patient, donor=fx.donor, message='bench') for _ in range(calls)
+            )
+        ]
+        # a token from "now" rather than now - lag: the fixtures written just
+        # above would otherwise fill every delta
+        fx.since = encode_token(timezone.now(), 0)
+        # any stored photo; the media view does not touch the database
+        photos = sorted(default_storage.listdir('profiles')[1]) if default_storage.exists('profiles') else []
+        fx.media = f'profiles/{photos[0]}' if photos else 'profiles/missing.jpg'
+        return fx
+
+    def make_user(self, email, role, blood_group='O+', is_staff=False):
+        user = User.objects.create_user(
+            username=email, email=email, password=PASSWORD, is_staff=is_staff
+        )
+        profile = user.profile
+        profile.role, profile.blood_group, profile.city = role, blood_group, 'Dhaka'
+        profile.latitude, profile.longitude = 23.81, 90.41
+        profile.save()
+        return User.objects.select_related('profile').get(pk=user.pk)
+
+    def measure(self, client, scenario, fixtures, options):
+        counter = iter(range(sys.maxsize))
+        errors = 0
+
+        def call():
+            nonlocal errors
+            if options['cold']:
+                cache.clear()
+            response = scenario.call(client, fixtures, next(counter))
+            if response.status_code >= 400:
+                errors += 1
+            return response
+
+        for _ in range(options['warmup']):
+            call()
+
+        queries, peak = [], 0
+        for _ in range(options['profile_requests']):
+            tracemalloc.start()
+            with CaptureQueriesContext(connection) as ctx:
+                call()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            queries.append(len(ctx.captured_queries))
+
+        total = options['slow_requests'] if scenario.slow else options['requests']
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(total):
+            t0 = time.perf_counter()
+            call()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'route': scenario.name,
+            'method': scenario.method.upper(),
+            'requests': total,
+            'errors': errors,
+            'throughput_rps': total / elapsed if elapsed else 0.0,
+            'mean_ms': statistics.fmean(latencies) if latencies else 0.0,
+            'p50_ms': percentile(latencies, 50) if latencies else 0.0,
+            'p95_ms': percentile(latencies, 95) if latencies else 0.0,
+            'p99_ms': percentile(latencies, 99) if latencies else 0.0,
+            'queries': statistics.fmean(queries) if queries else 0.0,
+            'peak_kib': peak / 1024,
+        }
+
+    def meta(self, options):
+        return {
+            'timestamp': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'profiles': Profile.objects.count(),
+            'blood_requests': BloodRequest.objects.count(),
+            'requests': options['requests'],
+            'warmup': options['warmup'],
+            'cold_cache': options['cold'],
+        }
+
+    def compare(self, results, baseline_path, threshold):
+        with open(baseline_path) as fh:
+            baseline = json.load(fh)['results']
+
+        regressions = []
+        self.stdout.write(f"\n{'scenario':<24}{'metric':<10}{'baseline':>10}{'current':>10}{'change':>9}")
+        for label, current in results.items():
+            base = baseline.get(label)
+            if base is None:
+                self.stdout.write(f"{label:<24}(not in baseline)")
+                continue
+            for metric, relative in COMPARED.items():
+                before, after = base.get(metric), current[metric]
+                if before is None:
+                    continue
+                change = (after - before) / before if before else 0.0
+                regressed = change > threshold if relative else after > before
+                if regressed:
+                    regressions.append(f"{label} {metric}")
+                if regressed or abs(change) > threshold:
+                    self.stdout.write(
+                        f"{label:<24}{metric:<10}{before:>10.2f}{after:>10.2f}{change:>+9.0%}"
+                        + ("  REGRESSION" if regressed else "")
+                    )
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} regression(s) beyond {threshold:.0%}: {', '.join(regressions)}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"No regressions beyond {threshold:.0%}."))
@@ -0,0 +1,123 @@
+# core/management/commands/bench_asgi.py
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.models import Profile
+
+# (label, sync url name, async url name, needs donor/patient token)
+ROUTES = [
+    ("donors_list", "donors-list", "async-donors-list", None),
+    ("profile_detail", "profile-detail", "async-profile-detail", None),
+    ("donor_requests", "donor-requests", "async-donor-requests", "donor"),
+    ("patient_requests", "patient-requests", "async-patient-requests", "patient"),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sync (DRF) and async-native views under many concurrent slow "
+        "clients by driving the ASGI application in-process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=100, help="concurrent clients")
+        parser.add_argument("--requests", type=int, default=500, help="requests per route and mode")
+        parser.add_argument(
+            "--client-delay", type=float, default=0.02,
+            help="seconds each client takes to send its request and to read the response",
+        )
+
+    def handle(self, *args, **options):
+        donor = Profile.objects.filter(role="donor").select_related("user").first()
+        patient = Profile.objects.filter(role="patient").select_related("user").first()
+        if donor is None or patient is None:
+            raise CommandError("Need at least one donor and one patient profile; seed the database first.")
+        tokens = {
+            "donor": str(RefreshToken.for_user(donor.user).access_token),
+            "patient": str(RefreshToken.for_user(patient.user).access_token),
+        }
+
+        from bms_backend.asgi import application
+
+        self.stdout.write(
+            f"{'route':<18}{'mode':<7}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}"
+        )
+        for label, sync_name, async_name, role in ROUTES:
+            args = [donor.id] if label == "profile_detail" else []
+            for mode, name in (("sync", sync_name), ("async", async_name)):
+                url = reverse(name, args=args) + "?page_size=20"
+                result = asyncio.run(self.run_route(application, url, tokens.get(role), options))
+                self.stdout.write(
+                    f"{label:<18}{mode:<7}{result['throughput']:>9.1f}"
+                    f"{result['p50']:>9.1f}{result['p95']:>9.1f}{result['errors']:>8}"
+                )
+
+    async def run_route(self, application, url, token, options):
+        delay = options["client_delay"]
+        parts = urlsplit(url)
+        headers = [(b"host", b"testserver")]
+        if token:
+            headers.append((b"authorization", f"Bearer {token}".encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": parts.path,
+            "raw_path": parts.path.encode(),
+            "query_string": parts.query.encode(),
+            "headers": headers,
+            "server": ("testserver", 80),
+            "client": ("127.0.0.1", 50000),
+        }
+
+        latencies, errors = [], 0
+        slots = asyncio.Semaphore(options["clients"])
+
+        async def one_request():
+            nonlocal errors
+            async with slots:
+                started = time.perf_counter()
+                status = None
+                sent_body = False
+
+                async def receive():
+                    nonlocal sent_body
+                    if sent_body:
+                        # keep the connection open until the app is done
+                        await asyncio.sleep(3600)
+                        return {"type": "http.disconnect"}
+                    sent_body = True
+                    await asyncio.sleep(delay)  # slow upload
+                    return {"type": "http.request", "body": b"", "more_body": False}
+
+                async def send(message):
+                    nonlocal status
+                    if message["type"] == "http.response.start":
+                        status = message["status"]
+                    elif message["type"] == "http.response.body" and not message.get("more_body"):
+                        await asyncio.sleep(delay)  # slow download
+
+                await application(dict(scope), receive, send)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if status != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(options["requests"])))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "throughput": len(latencies) / elapsed,
+            "p50": statistics.median(latencies),
+            "p95": latencies[int(len(latencies) * 0.95) - 1],
+            "errors": errors,
+        }
@@ -0,0 +1,102 @@
+# core/management/commands/cleanup_photos.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+
+from core.images import variant_names
+from core.models import PhotoBlob, Profile
+from core.storage import get_photo_storage, name_digest
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete content-addressed photos (and their variants) that no profile has "
+        "used for the grace period, going by the PhotoBlob reference counts. "
+        "--recount first rebuilds the counts from the profile table and the files "
+        "on disk, picking up uploads whose profile was never saved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=None,
+                            help="keep unreferenced photos this long (default: PHOTO_CLEANUP_GRACE_HOURS)")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--recount', action='store_true',
+                            help="Recompute reference counts, e.g. after queryset.update(photo=...).")
+        parser.add_argument('--dry-run', action='store_true', help="Only list what would be deleted.")
+
+    def handle(self, *args, **options):
+        hours = options['grace_hours']
+        if hours is None:
+            hours = getattr(settings, 'PHOTO_CLEANUP_GRACE_HOURS', 24)
+        if hours < 0:
+            raise CommandError("--grace-hours cannot be negative.")
+        if options['recount']:
+            self.recount()
+
+        cutoff = timezone.now() - timedelta(hours=hours)
+        due = PhotoBlob.objects.filter(refs=0, released_at__lt=cutoff).order_by('name')
+        storage = get_photo_storage()
+        deleted = 0
+        last = ''
+        while True:
+            names = list(due.filter(name__gt=last).values_list('name', flat=True)[:options['batch_size']])
+            if not names:
+                break
+            last = names[-1]
+            # counts can be behind writes that bypassed the signals; never delete a photo in use
+            used = set(Profile.objects.filter(photo__in=names).values_list('photo', flat=True))
+            for name in names:
+                if name in used:
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(f"Would delete {name}")
+                    deleted += 1
+                    continue
+                # the row goes first: a concurrent upload of the same image re-creates it
+                if not PhotoBlob.objects.filter(name=name, refs=0, released_at__lt=cutoff).delete()[0]:
+                    continue
+                for variant in variant_names(name).values():
+                    default_storage.delete(variant)
+                storage.delete(name)
+                deleted += 1
+
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} unreferenced photos."))
+
+    def recount(self):
+        counts = {
+            row['photo']: row['refs']
+            for row in Profile.objects.exclude(photo='').exclude(photo__isnull=True)
+            .values('photo').annotate(refs=Count('id'))
+            if name_digest(row['photo'])
+        }
+        now = timezone.now()
+        for blob in PhotoBlob.objects.all().iterator():
+            refs = counts.pop(blob.name, 0)
+            if refs != blob.refs:
+                PhotoBlob.objects.filter(name=blob.name).update(
+                    refs=refs, released_at=now if refs == 0 else None
+                )
+        untracked = [
+            PhotoBlob(name=name, refs=counts.get(name, 0), released_at=None if name in counts else now)
+            for name in set(counts) | (self.stored_names() - set(PhotoBlob.objects.values_list('name', flat=True)))
+        ]
+        PhotoBlob.objects.bulk_create(untracked, ignore_conflicts=True)
+        self.stdout.write(f"Recounted photo references; {len(untracked)} photos were untracked.")
+
+    def stored_names(self):
+        storage = get_photo_storage()
+        root = Profile._meta.get_field('photo').upload_to.rstrip('/')
+        if not storage.exists(root):
+            return set()
+        names = set()
+        for directory in storage.listdir(root)[0]:
+            for filename in storage.listdir(f'{root}/{directory}')[1]:
+                name = f'{root}/{directory}/{filename}'
+                if name_digest(name):
+                    names.add(name)
+        return names
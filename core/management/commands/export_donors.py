@@ -0,0 +1,29 @@
+# core/management/commands/export_donors.py
+from django.core.management.base import BaseCommand
+
+from core import roster
+from core.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Stream profiles as CSV or NDJSON in the format import_donors reads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=roster.FORMATS, default='csv')
+        parser.add_argument('--role', default='donor', help="donor, patient or all")
+        parser.add_argument('--output', help="file to write (default: stdout)")
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        qs = Profile.objects.all()
+        if options['role'] != 'all':
+            qs = qs.filter(role=options['role'])
+        chunks = roster.export_lines(roster.export_queryset(qs), options['format'], options['chunk_size'])
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+        self.stderr.write(f"Wrote {options['output']}")
@@ -0,0 +1,48 @@
+# core/management/commands/generate_photo_variants.py
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.images import generate_variants
+from core.models import Profile
+
+
+def _generate(profile_id, photo_name, rebuild):
+    try:
+        generate_variants(profile_id, photo_name, rebuild)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Build thumb/card/full variants for existing profile photos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--force', action='store_true', help="Rebuild profiles that already have variants.")
+
+    def handle(self, *args, **options):
+        qs = Profile.objects.exclude(photo='').exclude(photo__isnull=True)
+        if not options['force']:
+            qs = qs.filter(photo_variants={})
+
+        last_id = done = 0
+        while True:
+            batch = list(
+                qs.filter(id__gt=last_id).order_by('id').values_list('id', 'photo')[:options['batch_size']]
+            )
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            if options['workers'] > 1:
+                with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                    list(pool.map(lambda row: _generate(*row, options['force']), batch))
+            else:
+                for profile_id, photo_name in batch:
+                    generate_variants(profile_id, photo_name, options['force'])
+            done += len(batch)
+            self.stdout.write(f"Processed {done} photos...")
+
+        self.stdout.write(self.style.SUCCESS(f"Generated variants for {done} profiles."))
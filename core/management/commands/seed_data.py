@@ -0,0 +1,145 @@
+# core/management/commands/seed_data.py
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.cache import bump_bulk
+from core.models import BloodRequest, Profile
+
+# approximate share of each group in the population, percent
+BLOOD_GROUP_WEIGHTS = {
+    'O+': 35, 'B+': 30, 'A+': 20, 'AB+': 8,
+    'O-': 2, 'B-': 2, 'A-': 2, 'AB-': 1,
+}
+
+# (city, weight, latitude, longitude, spellings people also type)
+CITIES = [
+    ('Dhaka', 40, 23.8103, 90.4125, ['dhaka', 'Dacca', 'DHAKA ']),
+    ('Chattogram', 15, 22.3569, 91.7832, ['Chittagong', 'chattogram']),
+    ('Khulna', 8, 22.8456, 89.5403, ['khulna']),
+    ('Rajshahi', 7, 24.3745, 88.6042, ['Rajshahi ']),
+    ('Sylhet', 6, 24.8949, 91.8687, ['Sylhet']),
+    ('Barishal', 5, 22.7010, 90.3535, ['Barisal']),
+    ('Rangpur', 5, 25.7439, 89.2752, ['rangpur']),
+    ('Mymensingh', 5, 24.7471, 90.4203, ['Mymensingh']),
+    ('Cumilla', 5, 23.4607, 91.1809, ['Comilla']),
+    ('Gazipur', 4, 23.9999, 90.4203, ['gazipur']),
+]
+
+STATUS_WEIGHTS = {'pending': 60, 'accepted': 25, 'rejected': 15}
+
+
+def weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Deterministically seed users, profiles and blood requests for load tests "
+        "and benchmarks. The same --seed always produces the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--donor-ratio', type=float, default=0.6)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--prefix', default='seed', help="username/email prefix of seeded users")
+        parser.add_argument('--password', default='seed-password')
+        parser.add_argument('--clear', action='store_true', help="Delete users seeded earlier with --prefix first.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+        seeded = User.objects.filter(username__startswith=f'{prefix}-')
+        if seeded.exists():
+            if not options['clear']:
+                raise CommandError(f"Users with prefix '{prefix}-' already exist; pass --clear to replace them.")
+            deleted, _ = seeded.delete()
+            self.stdout.write(f"Deleted {deleted} previously seeded rows.")
+
+        with transaction.atomic():
+            donors, patients = self.seed_users(rng, options)
+            created = self.seed_requests(rng, donors, patients, options)
+
+        bump_bulk(BLOOD_GROUP_WEIGHTS, [spelling for city in CITIES for spelling in [city[0], *city[4]]])
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(donors)} donors, {len(patients)} patients and {created} requests."
+        ))
+
+    def seed_users(self, rng, options):
+        # hashing is deliberately slow; every seeded user shares one hash
+        password = make_password(options['password'])
+        now = timezone.now()
+        today = now.date()
+        prefix = options['prefix']
+        donors, patients = [], []
+
+        for start in range(0, options['users'], options['batch_size']):
+            indices = range(start, min(start + options['batch_size'], options['users']))
+            users = User.objects.bulk_create(
+                User(username=f'{prefix}-{i}@example.com', email=f'{prefix}-{i}@example.com',
+                     password=password, date_joined=now)
+                for i in indices
+            )
+            profiles = []
+            for i, user in zip(indices, users):
+                name, _, lat, lon, spellings = rng.choices(CITIES, weights=[c[1] for c in CITIES])[0]
+                city = rng.choice(spellings) if rng.random() < 0.2 else name
+                role = 'donor' if rng.random() < options['donor_ratio'] else 'patient'
+                profile = Profile(
+                    user=user,
+                    name=f'{prefix.title()} User {i}',
+                    blood_group=weighted(rng, BLOOD_GROUP_WEIGHTS),
+                    city=city,
+                    role=role,
+                    latitude=round(lat + rng.uniform(-0.15, 0.15), 6),
+                    longitude=round(lon + rng.uniform(-0.15, 0.15), 6),
+                )
+                if role == 'donor' and rng.random() < 0.5:
+                    profile.ever_donated = True
+                    profile.last_donation = today - timedelta(days=rng.randint(1, 365))
+                # bulk_create skips save(), so fill the stored derived columns here
+                profile.fill_derived_fields()
+                profiles.append(profile)
+                (donors if role == 'donor' else patients).append(user.id)
+            Profile.objects.bulk_create(profiles)
+            self.stdout.write(f"Created {indices.stop} users...")
+        return donors, patients
+
+    def seed_requests(self, rng, donors, patients, options):
+        if not donors or not patients:
+            return 0
+        now = timezone.now()
+        created = 0
+        for start in range(0, options['requests'], options['batch_size']):
+            count = min(options['batch_size'], options['requests'] - start)
+            rows, times = [], []
+            for _ in range(count):
+                requested_at = now - timedelta(minutes=rng.randint(0, 90 * 24 * 60))
+                status = weighted(rng, STATUS_WEIGHTS)
+                responded_at = None
+                if status != 'pending':
+                    responded_at = min(now, requested_at + timedelta(minutes=rng.randint(5, 3 * 24 * 60)))
+                rows.append(BloodRequest(
+                    requester_id=rng.choice(patients),
+                    donor_id=rng.choice(donors),
+                    message='Seeded request',
+                    status=status,
+                    responded_at=responded_at,
+                ))
+                times.append((requested_at, responded_at or requested_at))
+            rows = BloodRequest.objects.bulk_create(rows)
+            # requested_at/updated_at are auto fields that bulk_create sets to now;
+            # spread them over the last 90 days afterwards
+            for row, (requested_at, updated_at) in zip(rows, times):
+                row.requested_at, row.updated_at = requested_at, updated_at
+            BloodRequest.objects.bulk_update(rows, ['requested_at', 'updated_at'])
+            created += len(rows)
+        return created
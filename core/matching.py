@@ -0,0 +1,75 @@
+# core/matching.py
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .cities import city_key
+from .models import Profile, BLOOD_GROUPS
+
+BLOOD_GROUP_CODES = [code for code, _ in BLOOD_GROUPS]
+
+
+def _antigens(abo):
+    return set(abo) - {'O'}
+
+
+def _can_give(donor, recipient):
+    """
+    Red cell compatibility: the donor may not carry an ABO antigen the recipient
+    lacks, and Rh+ blood only goes to Rh+ recipients.
+    """
+    donor_abo, donor_rh = donor[:-1], donor[-1]
+    recipient_abo, recipient_rh = recipient[:-1], recipient[-1]
+    if not _antigens(donor_abo) <= _antigens(recipient_abo):
+        return False
+    return donor_rh == '-' or recipient_rh == '+'
+
+
+# recipient group -> donor groups that can give to it, exact group first
+COMPATIBLE_DONORS = {
+    recipient: tuple(
+        sorted(
+            (donor for donor in BLOOD_GROUP_CODES if _can_give(donor, recipient)),
+            key=lambda donor: donor != recipient,
+        )
+    )
+    for recipient in BLOOD_GROUP_CODES
+}
+
+
+def match_donors(blood_group, city=None, day=None, limit=20, same_city=False):
+    """
+    Eligible donors who can give to `blood_group`, best candidates first:
+    exact group, then same city, then longest since they became eligible.
+    With `same_city`, donors outside `city` are left out instead of ranked last.
+
+    A single query: the IN list over compatible groups is served by the
+    (role, blood_group, ...) index and only the candidate rows are ranked.
+    """
+    qs = (
+        Profile.objects.filter(role='donor', blood_group__in=COMPATIBLE_DONORS[blood_group])
+        .eligible_on(day)
+        .select_related('user')
+        .annotate(
+            group_rank=Case(
+                When(blood_group=blood_group, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        )
+    )
+    if city and same_city:
+        qs = qs.filter(city_key=city_key(city)).annotate(city_rank=Value(0, output_field=IntegerField()))
+    elif city:
+        qs = qs.annotate(
+            city_rank=Case(
+                When(city_key=city_key(city), then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        )
+    else:
+        qs = qs.annotate(city_rank=Value(0, output_field=IntegerField()))
+
+    # never donated (NULL) counts as eligible the longest
+    return qs.order_by(
+        'group_rank', 'city_rank', F('next_eligible_date').asc(nulls_first=True), 'id'
+    )[:limit]
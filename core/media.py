@@ -0,0 +1,140 @@
+# core/media.py
+"""
+Serving MEDIA_ROOT, in production as well as under DEBUG.
+
+Content-addressed photos (core.storage) never change under their name. They
+are served as immutable for a year, with their digest as a strong ETag.
+Other files (photo variants, uploads from before content addressing) get a
+MEDIA_CACHE_SECONDS max-age and an ETag made of size and mtime. Revalidation
+gets a 304.
+
+With MEDIA_SENDFILE set, the view only checks the request and the front
+proxy sends the body (X-Accel-Redirect or X-Sendfile), Range included.
+Without it, a single byte range is answered with a 206. Multi-range
+requests get the whole file, which RFC 9110 allows.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+from .storage import name_digest
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header, size):
+    """
+    (first, last) byte positions, inclusive, for a single-range header, or
+    None to send the whole file (no range, several ranges, or a malformed
+    header). Raises RangeNotSatisfiable when the range lies past the end.
+    """
+    match = RANGE_RE.match((header or "").strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        # suffix range: the final `last` bytes
+        if int(last) == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        return max(size - int(last), 0), size - 1
+    if last and int(last) < int(first):
+        return None
+    if int(first) >= size:
+        raise RangeNotSatisfiable(header)
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+def _read(path, start, length):
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _validators(path, info):
+    digest = name_digest(path)
+    if digest:
+        return f'"{digest}"', {"public": True, "max_age": IMMUTABLE_MAX_AGE, "immutable": True}
+    etag = f'W/"{info.st_size:x}-{info.st_mtime_ns:x}"'
+    return etag, {"public": True, "max_age": getattr(settings, "MEDIA_CACHE_SECONDS", 3600)}
+
+
+def _offload(path, full_path, content_type):
+    mode = settings.MEDIA_SENDFILE
+    response = HttpResponse(content_type=content_type)
+    if mode == "x-accel-redirect":
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX.rstrip("/") + "/" + quote(path)
+    elif mode == "x-sendfile":
+        response["X-Sendfile"] = full_path
+    else:
+        raise ImproperlyConfigured(f"Unknown MEDIA_SENDFILE {mode!r}; use 'x-accel-redirect' or 'x-sendfile'.")
+    return response
+
+
+def _body(request, full_path, info, etag, content_type):
+    byte_range = None
+    if_range = request.META.get("HTTP_IF_RANGE")
+    # If-Range: only a strong validator of the current file keeps the range
+    if not if_range or (if_range in (etag, http_date(info.st_mtime)) and not if_range.startswith("W/")):
+        try:
+            byte_range = parse_range(request.META.get("HTTP_RANGE"), info.st_size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416, content_type=content_type)
+            response["Content-Range"] = f"bytes */{info.st_size}"
+            return response
+    if byte_range is None:
+        response = FileResponse(open(full_path, "rb"), content_type=content_type)
+    else:
+        first, last = byte_range
+        length = last - first + 1
+        response = StreamingHttpResponse(
+            _read(full_path, first, length), status=206, content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {first}-{last}/{info.st_size}"
+        response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = default_storage.path(path)
+        info = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404("No such file.")
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404("No such file.")
+
+    etag, cache_control = _validators(path, info)
+    response = get_conditional_response(request, etag=etag, last_modified=int(info.st_mtime))
+    if response is None:
+        content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        if getattr(settings, "MEDIA_SENDFILE", None):
+            response = _offload(path, full_path, content_type)
+        else:
+            response = _body(request, full_path, info, etag, content_type)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(info.st_mtime)
+    patch_cache_control(response, **cache_control)
+    return response
@@ -0,0 +1,386 @@
+# core/metrics.py
+"""
+Per-endpoint request metrics in Prometheus text format.
+
+The metrics middleware times every request and, through a query recorder
+installed on each new database connection, counts its SQL statements and SQL
+time. Everything is keyed by the resolved URL name. Unresolved paths are
+grouped under "unmatched", so that label cardinality stays bounded.
+
+Counters live in per-thread shards, so recording a request never takes a
+lock; a scrape merges the shards. When a thread exits (runserver starts one
+per connection), its shard is folded into the process's retired totals and
+dropped. With METRICS_DIR set, each process also writes its totals to
+METRICS_DIR/<pid>-<token>.json at most every METRICS_FLUSH_SECONDS, and a
+scrape sums every file there. That way any worker can answer for all of
+them. A scrape folds the files of exited workers (pid gone, file untouched
+for METRICS_RETIRE_SECONDS) into retired.json, so their counts never go
+backwards and the directory does not grow with worker recycling.
+
+Statements slower than SLOW_QUERY_MS are logged to "core.slow_queries".
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+try:
+    import fcntl
+except ImportError:  # Windows: exited workers' files are then never folded
+    fcntl = None
+
+logger = logging.getLogger('core.slow_queries')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+_current = ContextVar('bms_request_queries', default=None)
+_local = threading.local()
+_shards = []
+_retired = {}  # totals of exited threads, as snapshot() returns them
+_shards_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flush_state = {'pid': None, 'token': None, 'last': 0.0}
+
+
+class RequestQueries:
+    __slots__ = ('count', 'seconds', 'slow')
+
+    def __init__(self):
+        self.count, self.seconds, self.slow = 0, 0.0, 0
+
+
+class Series:
+    """Totals for one (route, method)."""
+
+    __slots__ = ('latency', 'duration', 'queries', 'query_buckets', 'query_seconds', 'slow', 'statuses')
+
+    def __init__(self):
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.duration = 0.0
+        self.queries = 0
+        self.query_buckets = [0] * (len(QUERY_BUCKETS) + 1)
+        self.query_seconds = 0.0
+        self.slow = 0
+        self.statuses = {}
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _bucket(buckets, value):
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            return i
+    return len(buckets)
+
+
+class _ShardOwner:
+    """Lives in the thread's locals; collected when the thread exits."""
+
+
+def _retire(shard):
+    with _shards_lock:
+        # by identity: shards are dicts, and equal ones are not the same shard
+        _shards[:] = [other for other in _shards if other is not shard]
+        for (route, method), series in shard.items():
+            merge(_retired, {f'{route}|{method}': series.as_dict()})
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        _local.owner = _ShardOwner()
+        with _shards_lock:
+            _shards.append(shard)
+        weakref.finalize(_local.owner, _retire, shard)
+    return shard
+
+
+def observe(route, method, status, seconds, queries):
+    shard = _shard()
+    series = shard.get((route, method))
+    if series is None:
+        series = shard[(route, method)] = Series()
+    series.latency[_bucket(LATENCY_BUCKETS, seconds)] += 1
+    series.duration += seconds
+    series.queries += queries.count
+    series.query_buckets[_bucket(QUERY_BUCKETS, queries.count)] += 1
+    series.query_seconds += queries.seconds
+    series.slow += queries.slow
+    series.statuses[status] = series.statuses.get(status, 0) + 1
+    flush()
+
+
+def snapshot():
+    """This process's totals as {"route|method": Series.as_dict()}."""
+    with _shards_lock:
+        shards = list(_shards)
+        merged = merge({}, _retired)
+    for shard in shards:
+        for (route, method), series in shard.copy().items():
+            merge(merged, {f'{route}|{method}': series.as_dict()})
+    return merged
+
+
+def merge(into, other):
+    for key, values in other.items():
+        target = into.get(key)
+        if target is None:
+            into[key] = json.loads(json.dumps(values))  # statuses keys become strings
+            continue
+        for name, value in values.items():
+            if name == 'statuses':
+                for status, count in value.items():
+                    target[name][str(status)] = target[name].get(str(status), 0) + count
+            elif isinstance(value, list):
+                target[name] = [a + b for a, b in zip(target[name], value)]
+            else:
+                target[name] += value
+    return into
+
+
+def flush(force=False):
+    """Write this process's totals to METRICS_DIR, if set, at most every METRICS_FLUSH_SECONDS."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return
+    now = time.monotonic()
+    state = _flush_state
+    if not force and now - state['last'] < getattr(settings, 'METRICS_FLUSH_SECONDS', 5):
+        return
+    if not _flush_lock.acquire(blocking=force):
+        return
+    try:
+        if state['pid'] != os.getpid():
+            # first flush in this (possibly forked) process
+            state['pid'], state['token'] = os.getpid(), uuid.uuid4().hex[:8]
+        state['last'] = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{state['pid']}-{state['token']}.json")
+        with open(path + '.tmp', 'w') as fh:
+            json.dump(snapshot(), fh)
+        os.replace(path + '.tmp', path)
+    finally:
+        _flush_lock.release()
+
+
+def collect():
+    """Totals across all processes when METRICS_DIR is set, else this process's."""
+    directory = getattr(settings, 'METRICS_DIR', None)
+    if not directory:
+        return snapshot()
+    flush(force=True)
+    retire_files(directory)
+    merged = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as fh:
+                merge(merged, json.load(fh))
+        except (OSError, ValueError):
+            continue  # replaced or half-written; next scrape picks it up
+    return merged
+
+
+def _exited(name):
+    pid = name.split('-', 1)[0]
+    if not pid.isdigit() or int(pid) == os.getpid():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass  # exists, owned by another user
+    return False
+
+
+def retire_files(directory):
+    """Fold the files of exited workers into retired.json."""
+    if fcntl is None:
+        return
+    cutoff = time.time() - getattr(settings, 'METRICS_RETIRE_SECONDS', 300)
+    with open(os.path.join(directory, 'retire.lock'), 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return  # another worker is at it
+        dead = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith('.json') and _exited(name) and os.path.getmtime(path) < cutoff:
+                dead.append(path)
+        if not dead:
+            return
+        retired_path = os.path.join(directory, 'retired.json')
+        try:
+            with open(retired_path) as fh:
+                retired = json.load(fh)
+        except FileNotFoundError:
+            retired = {}
+        # renamed first: a crash below may lose these counts, never double them
+        folding = []
+        for path in dead:
+            os.replace(path, path + '.folding')
+            folding.append(path + '.folding')
+        for path in folding:
+            try:
+                with open(path) as fh:
+                    merge(retired, json.load(fh))
+            except ValueError:
+                pass  # half-written by a worker that died mid-flush
+        with open(retired_path + '.tmp', 'w') as fh:
+            json.dump(retired, fh)
+        os.replace(retired_path + '.tmp', retired_path)
+        for path in folding:
+            os.remove(path)
+
+
+def reset():
+    with _shards_lock:
+        for shard in _shards:
+            shard.clear()
+        _retired.clear()
+
+
+# ---------------------------
+# SQL recording
+# ---------------------------
+def record_queries(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        current = _current.get()
+        slow = elapsed * 1000 >= getattr(settings, 'SLOW_QUERY_MS', 200)
+        if current is not None:
+            current.count += 1
+            current.seconds += elapsed
+            current.slow += slow
+        if slow:
+            logger.warning(
+                "slow query (%.1f ms) on %s: %s",
+                elapsed * 1000, context['connection'].alias, sql[:2000],
+            )
+
+
+def install_query_recorder(connection):
+    """
+    Register record_queries on a new connection. It is the same hook as
+    connection.execute_wrapper(), installed once per connection instead of
+    per request, so it also sees the queries that async views run in
+    sync_to_async threads.
+    """
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_queries)
+
+
+# ---------------------------
+# Middleware and exposition
+# ---------------------------
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match and match.view_name else 'unmatched'
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            queries = RequestQueries()
+            token = _current.set(queries)
+            started = time.perf_counter()
+            try:
+                response = await get_response(request)
+            finally:
+                _current.reset(token)
+            observe(_route(request), request.method, response.status_code,
+                    time.perf_counter() - started, queries)
+            return response
+
+    else:
+        def middleware(request):
+            queries = RequestQueries()
+            token = _current.set(queries)
+            started = time.perf_counter()
+            try:
+                response = get_response(request)
+            finally:
+                _current.reset(token)
+            observe(_route(request), request.method, response.status_code,
+                    time.perf_counter() - started, queries)
+            return response
+
+    return middleware
+
+
+def _labels(**labels):
+    escaped = (
+        (key, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _histogram(lines, name, labels, buckets, counts, total):
+    cumulative = 0
+    for bound, count in zip((*buckets, '+Inf'), counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}')
+    lines.append(f'{name}_sum{_labels(**labels)} {total}')
+    lines.append(f'{name}_count{_labels(**labels)} {cumulative}')
+
+
+def render(data=None):
+    """Prometheus text exposition (format 0.0.4)."""
+    data = collect() if data is None else data
+    series = sorted((tuple(key.split('|', 1)), values) for key, values in data.items())
+    lines = []
+
+    lines += [
+        '# HELP bms_http_request_duration_seconds Request latency by URL name.',
+        '# TYPE bms_http_request_duration_seconds histogram',
+    ]
+    for (route, method), values in series:
+        _histogram(lines, 'bms_http_request_duration_seconds', {'route': route, 'method': method},
+                   LATENCY_BUCKETS, values['latency'], values['duration'])
+
+    lines += [
+        '# HELP bms_http_responses_total Responses by URL name and status code.',
+        '# TYPE bms_http_responses_total counter',
+    ]
+    for (route, method), values in series:
+        for status, count in sorted(values['statuses'].items()):
+            lines.append(
+                f'bms_http_responses_total{_labels(route=route, method=method, status=status)} {count}'
+            )
+
+    lines += [
+        '# HELP bms_db_queries_per_request SQL statements issued per request.',
+        '# TYPE bms_db_queries_per_request histogram',
+    ]
+    for (route, method), values in series:
+        _histogram(lines, 'bms_db_queries_per_request', {'route': route, 'method': method},
+                   QUERY_BUCKETS, values['query_buckets'], values['queries'])
+
+    for name, key, help_text in (
+        ('bms_db_query_seconds_total', 'query_seconds', 'Time spent in SQL by URL name.'),
+        ('bms_db_slow_queries_total', 'slow', 'Statements slower than SLOW_QUERY_MS by URL name.'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for (route, method), values in series:
+            lines.append(f'{name}{_labels(route=route, method=method)} {values[key]}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:00
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def backfill_next_eligible_date(apps, schema_editor):
+    Profile = apps.get_model('core', 'Profile')
+    profiles = Profile.objects.filter(ever_donated=True, last_donation__isnull=False)
+    for profile in profiles.iterator():
+        profile.next_eligible_date = profile.last_donation + timedelta(days=90)
+        profile.save(update_fields=['next_eligible_date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='next_eligible_date',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_next_eligible_date, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bloodrequest',
+            name='bloodreq_donor_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='bloodrequest',
+            name='bloodreq_requester_recent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='profile',
+            name='profile_role_group_city_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['donor', '-requested_at', '-id'], name='bloodreq_donor_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['requester', '-requested_at', '-id'], name='bloodreq_requester_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['role', 'blood_group', 'date_created', 'id'], name='profile_role_group_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['role', 'date_created', 'id'], name='profile_role_page_idx'),
+        ),
+    ]
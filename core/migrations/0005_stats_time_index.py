@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['requested_at', 'status'], name='bloodreq_recent_status_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+# trigram side table for fuzzy city search, kept in sync by triggers so that
+# queryset.update() and bulk writes are covered too (SQLite only)
+CREATE_FTS_SQL = [
+    "CREATE VIRTUAL TABLE core_profile_city_fts USING fts5(city_key, tokenize='trigram')",
+    "INSERT INTO core_profile_city_fts(rowid, city_key) SELECT id, city_key FROM core_profile",
+    """CREATE TRIGGER core_profile_city_fts_ai AFTER INSERT ON core_profile BEGIN
+        INSERT INTO core_profile_city_fts(rowid, city_key) VALUES (new.id, new.city_key);
+    END""",
+    """CREATE TRIGGER core_profile_city_fts_au AFTER UPDATE OF city_key ON core_profile BEGIN
+        DELETE FROM core_profile_city_fts WHERE rowid = old.id;
+        INSERT INTO core_profile_city_fts(rowid, city_key) VALUES (new.id, new.city_key);
+    END""",
+    """CREATE TRIGGER core_profile_city_fts_ad AFTER DELETE ON core_profile BEGIN
+        DELETE FROM core_profile_city_fts WHERE rowid = old.id;
+    END""",
+]
+
+DROP_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS core_profile_city_fts_ai",
+    "DROP TRIGGER IF EXISTS core_profile_city_fts_au",
+    "DROP TRIGGER IF EXISTS core_profile_city_fts_ad",
+    "DROP TABLE IF EXISTS core_profile_city_fts",
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_stats_time_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='city_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['role', 'city_key', 'date_created', 'id'], name='profile_role_city_page_idx'),
+        ),
+        migrations.RunPython(run_on_sqlite(CREATE_FTS_SQL), run_on_sqlite(DROP_FTS_SQL)),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_profile_city_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
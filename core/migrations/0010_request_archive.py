@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BloodRequestArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('message', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('rejected', 'Rejected')], max_length=10)),
+                ('requested_at', models.DateTimeField()),
+                ('responded_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['responded_at', 'id'], name='bloodreq_responded_idx'),
+        ),
+        migrations.AddField(
+            model_name='bloodrequestarchive',
+            name='donor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_requests_received', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='bloodrequestarchive',
+            name='requester',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_requests_made', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequestarchive',
+            index=models.Index(fields=['donor', '-requested_at', '-id'], name='bloodarch_donor_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequestarchive',
+            index=models.Index(fields=['requester', '-requested_at', '-id'], name='bloodarch_requester_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequestarchive',
+            index=models.Index(fields=['donor', 'updated_at'], name='bloodarch_donor_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequestarchive',
+            index=models.Index(fields=['requester', 'updated_at'], name='bloodarch_requester_upd_idx'),
+        ),
+    ]
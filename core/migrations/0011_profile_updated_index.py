@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_request_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['updated_at'], name='profile_upd_idx'),
+        ),
+    ]
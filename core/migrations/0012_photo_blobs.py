@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:06
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_profile_updated_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.get_photo_storage, upload_to='profiles/'),
+        ),
+        migrations.CreateModel(
+            name='PhotoBlob',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['refs', 'released_at'], name='photoblob_unused_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_photo_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='left_donors_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def set_journal_mode(mode):
+    def apply(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != 'sqlite':
+            return
+        # persistent: stored in the database file, so it is set once here
+        # rather than on every connection
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode = {mode}')
+
+    return apply
+
+
+class Migration(migrations.Migration):
+    # the journal mode cannot change inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_profile_left_donors_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_journal_mode('WAL'), set_journal_mode('DELETE')),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_sqlite_wal'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='bloodrequest',
+            name='bloodreq_donor_upd_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='bloodrequest',
+            name='bloodreq_requester_upd_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='bloodrequestarchive',
+            name='bloodarch_donor_upd_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='bloodrequestarchive',
+            name='bloodarch_requester_upd_idx',
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['donor', 'updated_at', 'requester'], name='bloodreq_donor_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['requester', 'updated_at', 'donor'], name='bloodreq_requester_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequestarchive',
+            index=models.Index(fields=['donor', 'updated_at', 'requester'], name='bloodarch_donor_upd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequestarchive',
+            index=models.Index(fields=['requester', 'updated_at', 'donor'], name='bloodarch_requester_upd_idx'),
+        ),
+    ]
@@ -1,9 +1,17 @@
 # core/models.py
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta, date
 
+from .cities import city_key, fts_available, fts_match_sql
+from .storage import get_photo_storage, name_digest
+from . import geo
+
+# minimum gap between two donations
+DONATION_INTERVAL = timedelta(days=90)
+
 BLOOD_GROUPS = [
     ('A+', 'A+'), ('A-', 'A-'),
     ('B+', 'B+'), ('B-', 'B-'),
@@ -18,27 +26,189 @@ ROLE_CHOICES = [
 ]
 
 
+def eligible_q(day=None):
+    """Q object matching profiles allowed to donate on `day` (defaults to today)."""
+    if day is None:
+        day = timezone.now().date()
+    return models.Q(next_eligible_date__isnull=True) | models.Q(next_eligible_date__lte=day)
+
+
+class ProfileQuerySet(models.QuerySet):
+    def eligible_on(self, day=None):
+        """
+        Profiles that are allowed to donate on `day` (defaults to today).
+        Runs entirely in SQL against the stored next_eligible_date.
+        """
+        return self.filter(eligible_q(day))
+
+    def in_city(self, city):
+        """
+        Exact indexed match on the normalized city key; if nothing matches,
+        fall back to substring matching through the trigram side table
+        (or a key prefix range where FTS5 is unavailable).
+        """
+        key = city_key(city)
+        exact = self.filter(city_key=key)
+        if not key or exact.exists():
+            return exact
+        return self.city_like(key)
+
+    def city_like(self, key):
+        """Substring / prefix match on an already-normalized city key."""
+        if fts_available() and len(key) >= 3:
+            sql, params = fts_match_sql(key)
+            return self.filter(id__in=models.expressions.RawSQL(sql, params))
+        return self.filter(city_key__gte=key, city_key__lt=key + '\uffff')
+
+    def donor_changes(self):
+        """
+        Profiles whose changes can matter to a donor list: donors, and
+        profiles that left the donor role at some point (the change may be
+        them leaving). Other patients' edits never reach donor list deltas.
+        """
+        return self.filter(models.Q(role='donor') | models.Q(left_donors_at__isnull=False))
+
+    def record_donation(self, day=None):
+        """
+        Mark the profiles as having donated on `day` (defaults to today) in a
+        single UPDATE, keeping the stored next_eligible_date in step. Bypasses
+        save() and its signals, so callers must invalidate cached responses.
+        """
+        day = day or timezone.now().date()
+        return self.update(
+            ever_donated=True,
+            last_donation=day,
+            next_eligible_date=day + DONATION_INTERVAL,
+            updated_at=timezone.now(),
+        )
+
+    def near(self, lat, lon, radius_km):
+        """
+        Candidate profiles within `radius_km`: a few geohash prefix ranges on
+        the indexed column, narrowed by the bounding box. Callers compute the
+        exact distance on the (small) result.
+        """
+        cells = models.Q()
+        for prefix in geo.covering_cells(lat, lon, radius_km):
+            # '{' sorts right after 'z', the last geohash character
+            cells |= models.Q(geohash__gte=prefix, geohash__lt=prefix + '{')
+        min_lat, max_lat, min_lon, max_lon = geo.bounding_box(lat, lon, radius_km)
+        return self.filter(cells).filter(
+            latitude__range=(min_lat, max_lat), longitude__range=(min_lon, max_lon)
+        )
+
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     name = models.CharField(max_length=200)
     blood_group = models.CharField(max_length=3, choices=BLOOD_GROUPS)
     city = models.CharField(max_length=100)
+    # canonical spelling of `city` (see core.cities), maintained by save()
+    city_key = models.CharField(max_length=100, blank=True, default='', editable=False)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    # geohash of (latitude, longitude), maintained by save(); '' when unknown
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False, db_index=True)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='patient')
+    # set by save() when the role changes away from donor (see donor_changes)
+    left_donors_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     # donor-specific
     ever_donated = models.BooleanField(default=False)
     last_donation = models.DateField(null=True, blank=True)
     bio = models.TextField(blank=True)
-    photo = models.ImageField(upload_to='profiles/', null=True, blank=True)
+    # content-addressed: identical uploads share one file (see core.storage)
+    photo = models.ImageField(upload_to='profiles/', storage=get_photo_storage, null=True, blank=True)
+    # variant name -> stored file (see core.images); empty until generated
+    photo_variants = models.JSONField(default=dict, blank=True, editable=False)
     date_created = models.DateTimeField(auto_now_add=True)
+    # bumped on every save(); queryset.update() callers must set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
+    # derived from ever_donated/last_donation on save(); NULL means "eligible any time"
+    next_eligible_date = models.DateField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = ProfileQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # donors_list: role=? [AND blood_group=?], keyset-ordered by (date_created, id)
+            models.Index(fields=['role', 'blood_group', 'date_created', 'id'], name='profile_role_group_page_idx'),
+            models.Index(fields=['role', 'date_created', 'id'], name='profile_role_page_idx'),
+            models.Index(fields=['role', 'city_key', 'date_created', 'id'], name='profile_role_city_page_idx'),
+            # conditional GET validators: MAX(updated_at), COUNT(*) from the index alone
+            models.Index(fields=['role', 'blood_group', 'updated_at'], name='profile_role_group_upd_idx'),
+            models.Index(fields=['role', 'updated_at'], name='profile_role_upd_idx'),
+            # ?since= delta sync: donors and former donors, so role changes show up as tombstones
+            models.Index(fields=['updated_at'], name='profile_upd_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember what the row looked like so cache invalidation can also
+        # reach the group/city the profile is moving away from
+        loaded = dict(zip(field_names, values))
+        instance._loaded_search_keys = (loaded.get('blood_group'), loaded.get('city'))
+        instance._loaded_photo = loaded.get('photo')
+        instance._loaded_role = loaded.get('role')
+        return instance
+
+    def compute_next_eligible_date(self):
+        if not self.ever_donated or not self.last_donation:
+            return None
+        # last_donation may still be a raw string when set straight from request data
+        last = self._meta.get_field('last_donation').to_python(self.last_donation)
+        return last + DONATION_INTERVAL
+
+    def compute_geohash(self):
+        if self.latitude is None or self.longitude is None:
+            return ''
+        return geo.encode(float(self.latitude), float(self.longitude))
+
+    def fill_derived_fields(self):
+        """
+        Set the stored derived columns and normalize blood_group (lookups
+        match it exactly); bulk_create() callers must call this themselves.
+        """
+        self.blood_group = (self.blood_group or '').strip().upper()
+        self.next_eligible_date = self.compute_next_eligible_date()
+        self.city_key = city_key(self.city)
+        self.geohash = self.compute_geohash()
+
+    def save(self, *args, **kwargs):
+        self.fill_derived_fields()
+        if getattr(self, '_loaded_role', None) == 'donor' and self.role != 'donor':
+            self.left_donors_at = timezone.now()
+        # a new upload invalidates the old variants; post_save queues new ones
+        self._photo_changed = bool(self.photo) and self.photo.name != getattr(self, '_loaded_photo', None)
+        if self._photo_changed or not self.photo:
+            self.photo_variants = {}
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if {'ever_donated', 'last_donation'} & update_fields:
+                update_fields.add('next_eligible_date')
+            if 'city' in update_fields:
+                update_fields.add('city_key')
+            if {'latitude', 'longitude'} & update_fields:
+                update_fields.add('geohash')
+            if 'photo' in update_fields:
+                update_fields.add('photo_variants')
+            if 'role' in update_fields:
+                update_fields.add('left_donors_at')
+            # keep conditional-GET validators moving on partial saves too
+            update_fields.add('updated_at')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        self._loaded_role = self.role
 
     def can_donate_now(self):
         """
         Donor can donate if never donated OR 90 days have passed since last_donation.
         """
-        if not self.ever_donated or not self.last_donation:
+        next_possible = self.compute_next_eligible_date()
+        if next_possible is None:
             return True
-        next_possible = self.last_donation + timedelta(days=90)
         return timezone.now().date() >= next_possible
 
     def next_possible_donation_date(self):
@@ -47,7 +217,8 @@ class Profile(models.Model):
         """
         if not self.last_donation:
             return None
-        return self.last_donation + timedelta(days=90)
+        last = self._meta.get_field('last_donation').to_python(self.last_donation)
+        return last + DONATION_INTERVAL
 
     # ✅ Added: a clean alias so serializer can access it easily
     def next_donation_date(self):
@@ -65,16 +236,114 @@ class BloodRequest(models.Model):
         ('rejected', 'Rejected'),
     ]
 
+    # single-column FK indexes are covered by the composite indexes below
     requester = models.ForeignKey(
-        User, related_name='requests_made', on_delete=models.CASCADE
+        User, related_name='requests_made', on_delete=models.CASCADE, db_index=False
     )  # patient
     donor = models.ForeignKey(
-        User, related_name='requests_received', on_delete=models.CASCADE
+        User, related_name='requests_received', on_delete=models.CASCADE, db_index=False
     )  # donor user
     message = models.TextField(blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     requested_at = models.DateTimeField(auto_now_add=True)
     responded_at = models.DateTimeField(null=True, blank=True)
+    # bumped on every save(); queryset.update() callers must set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # donor/patient inboxes: filter by one side, keyset-ordered newest first
+            models.Index(fields=['donor', '-requested_at', '-id'], name='bloodreq_donor_page_idx'),
+            models.Index(fields=['requester', '-requested_at', '-id'], name='bloodreq_requester_page_idx'),
+            # admin_stats pending count
+            models.Index(fields=['status'], name='bloodreq_status_idx'),
+            # admin_stats daily series: range on requested_at, status read from the index
+            models.Index(fields=['requested_at', 'status'], name='bloodreq_recent_status_idx'),
+            # conditional GET validators for the inboxes; the other side's id
+            # joins the nested profiles without reading the table
+            models.Index(fields=['donor', 'updated_at', 'requester'], name='bloodreq_donor_upd_idx'),
+            models.Index(fields=['requester', 'updated_at', 'donor'], name='bloodreq_requester_upd_idx'),
+            # archive_requests: responded rows past the retention window
+            models.Index(fields=['responded_at', 'id'], name='bloodreq_responded_idx'),
+        ]
 
     def __str__(self):
         return f"Request {self.id} from {self.requester.email} -> {self.donor.email}"
+
+
+class BloodRequestArchive(models.Model):
+    """
+    Responded requests moved out of BloodRequest by the archive_requests
+    command, keeping their original id and timestamps. The inboxes read it
+    only with ?include_archived=true.
+    """
+    ARCHIVED_FIELDS = (
+        'id', 'requester_id', 'donor_id', 'message', 'status',
+        'requested_at', 'responded_at', 'updated_at',
+    )
+
+    id = models.BigIntegerField(primary_key=True)
+    requester = models.ForeignKey(
+        User, related_name='archived_requests_made', on_delete=models.CASCADE, db_index=False
+    )
+    donor = models.ForeignKey(
+        User, related_name='archived_requests_received', on_delete=models.CASCADE, db_index=False
+    )
+    message = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=BloodRequest.STATUS_CHOICES)
+    requested_at = models.DateTimeField()
+    responded_at = models.DateTimeField(null=True, blank=True)
+    # copied from the live row, so conditional GET validators stay comparable
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # same inbox and validator access paths as BloodRequest
+            models.Index(fields=['donor', '-requested_at', '-id'], name='bloodarch_donor_page_idx'),
+            models.Index(fields=['requester', '-requested_at', '-id'], name='bloodarch_requester_page_idx'),
+            models.Index(fields=['donor', 'updated_at', 'requester'], name='bloodarch_donor_upd_idx'),
+            models.Index(fields=['requester', 'updated_at', 'donor'], name='bloodarch_requester_upd_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived request {self.id}"
+
+
+class PhotoBlob(models.Model):
+    """
+    Reference count of one content-addressed photo file (core.storage):
+    how many profiles use it. Files of blobs that have had no references
+    for a while are deleted by the cleanup_photos command.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    refs = models.PositiveIntegerField(default=0)
+    # last release; cleanup waits a grace period from it
+    released_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['refs', 'released_at'], name='photoblob_unused_idx')]
+
+    @classmethod
+    def retain(cls, name):
+        if not name_digest(name):
+            return  # legacy upload names are not shared, nor counted
+        if cls.objects.filter(name=name).update(refs=F('refs') + 1, released_at=None):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, refs=1)
+        except IntegrityError:
+            # created concurrently
+            cls.objects.filter(name=name).update(refs=F('refs') + 1, released_at=None)
+
+    @classmethod
+    def release(cls, name):
+        if name_digest(name):
+            cls.objects.filter(name=name, refs__gt=0).update(
+                refs=F('refs') - 1, released_at=timezone.now()
+            )
+
+    def __str__(self):
+        return f"{self.name} ({self.refs})"
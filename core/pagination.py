@@ -0,0 +1,123 @@
+# core/pagination.py
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination over a (timestamp, id) pair.
+
+    The cursor encodes the sort key of the last row of the previous page, so
+    page N is a single index range probe instead of an OFFSET scan.
+    `ordering` is e.g. ('-requested_at', '-id'); both keys share a direction.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+        self.descending = ordering[0].startswith('-')
+        self.field, self.pk_field = (f.lstrip('-') for f in ordering)
+        self.default_page_size = getattr(settings, 'API_PAGE_SIZE', 20)
+        self.max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.default_page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, obj):
+        raw = f'{getattr(obj, self.field).isoformat()}|{getattr(obj, self.pk_field)}'
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            value, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+            return datetime.fromisoformat(value), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def page_queryset(self, queryset, request):
+        """
+        The lazy queryset for the requested page (one extra row to detect a
+        next page). Evaluate it and pass the rows to `set_page`.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = request.GET.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor)
+            # (field, pk) < (value, pk) for descending, > for ascending, written
+            # as a range on the leading column so the composite index is used
+            op, inverse = ('lt', 'gt') if self.descending else ('gt', 'lt')
+            queryset = queryset.filter(**{f'{self.field}__{op}e': value}).exclude(
+                **{self.field: value, f'{self.pk_field}__{inverse}e': pk}
+            )
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    def paginate_querysets(self, querysets, request):
+        """
+        One page across several querysets with the same ordering and
+        disjoint primary keys: a page from each, merged.
+        """
+        return self.set_page(
+            merge_ordered([list(self.page_queryset(qs, request)) for qs in querysets], self.ordering)
+        )
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+
+def merge_ordered(row_lists, ordering):
+    """Merge rows already sorted by a (field, pk) `ordering` into one sorted list."""
+    if len(row_lists) == 1:
+        return row_lists[0]
+    field, pk_field = (f.lstrip('-') for f in ordering)
+    return sorted(
+        (row for rows in row_lists for row in rows),
+        key=lambda row: (getattr(row, field), getattr(row, pk_field)),
+        reverse=ordering[0].startswith('-'),
+    )
+
+
+def pagination_requested(request):
+    """
+    Lists are paginated unless disabled via API_PAGINATE_LISTS or ?paginate=false
+    (the legacy plain-array shape still used by the existing frontend).
+    """
+    flag = request.GET.get('paginate')
+    if flag is None:
+        return getattr(settings, 'API_PAGINATE_LISTS', True)
+    return flag.lower() not in ('0', 'false', 'no')
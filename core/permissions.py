@@ -1,14 +1,31 @@
 # core/permissions.py
+from django.core.exceptions import ObjectDoesNotExist
 from rest_framework.permissions import BasePermission
 
+
+def user_role(user):
+    """
+    The user's profile role: from the token claims when the user was built by
+    ClaimsJWTAuthentication, otherwise from the profile. None without one.
+    """
+    if not user or not user.is_authenticated:
+        return None
+    if hasattr(user, 'role'):
+        return user.role
+    try:
+        return user.profile.role
+    except ObjectDoesNotExist:
+        return None
+
+
 class IsAdmin(BasePermission):
     def has_permission(self, request, view):
         return bool(request.user and request.user.is_staff)
 
 class IsDonor(BasePermission):
     def has_permission(self, request, view):
-        return bool(request.user and hasattr(request.user,'profile') and request.user.profile.role == 'donor')
+        return user_role(request.user) == 'donor'
 
 class IsPatient(BasePermission):
     def has_permission(self, request, view):
-        return bool(request.user and hasattr(request.user,'profile') and request.user.profile.role == 'patient')
+        return user_role(request.user) == 'patient'
@@ -0,0 +1,265 @@
+# core/roster.py
+"""
+Bulk import and export of donor rosters as CSV or NDJSON.
+
+Rows are read lazily and checked with ImportRowSerializer (the
+RegisterSerializer rules). Valid rows are written batch_size at a time in one
+transaction: a bulk_create of users, then one of profiles. This bypasses
+create_profile and the other per-row signals, so the derived columns are
+filled here and the cached searches are invalidated once at the end. Rows
+that fail validation, or whose email is already taken, end up in the report
+with their line number; the rest of the file still goes in.
+
+Exports stream the same columns through `.iterator(chunk_size=...)`, so a
+re-import of an export round-trips and memory stays flat however many rows
+there are.
+"""
+import csv
+import json
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .cache import bump_bulk
+from .models import Profile
+from .serializers import ImportRowSerializer
+
+FORMATS = ("csv", "ndjson")
+COLUMNS = (
+    "name", "email", "blood_group", "city", "role",
+    "ever_donated", "last_donation", "latitude", "longitude",
+)
+REQUIRED_COLUMNS = ("name", "email", "blood_group", "city", "role")
+
+
+class RosterFileError(ValueError):
+    """The file as a whole cannot be read (unknown format, missing columns)."""
+
+
+class ImportReport:
+    def __init__(self, max_errors=None):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, line, email, errors):
+        self.failed += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "email": email, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "created": self.created,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def format_for(name, default="csv"):
+    """Guess the format from a file name's extension."""
+    name = (name or "").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".csv"):
+        return "csv"
+    return default
+
+
+# ---------------------------
+# Import
+# ---------------------------
+def _decode(lines):
+    for line in lines:
+        # invalid bytes become U+FFFD, which the row check below rejects
+        yield line.decode("utf-8-sig", errors="replace") if isinstance(line, bytes) else line
+
+
+def read_rows(lines, fmt):
+    """
+    Yield (line number, row dict or None, error) for each record of an
+    iterable of lines (bytes or str, line endings kept).
+    """
+    if fmt not in FORMATS:
+        raise RosterFileError(f"Unknown format {fmt!r}; use one of {', '.join(FORMATS)}.")
+    lines = _decode(lines)
+    if fmt == "ndjson":
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield number, None, {"non_field_errors": ["Not valid JSON."]}
+                continue
+            if not isinstance(row, dict):
+                yield number, None, {"non_field_errors": ["Expected a JSON object."]}
+                continue
+            yield number, row, None
+        return
+
+    reader = csv.DictReader(lines)
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise RosterFileError(f"Missing CSV columns: {', '.join(missing)}.")
+    start = reader.line_num + 1
+    for row in reader:
+        # extra cells land under None
+        row.pop(None, None)
+        yield start, row, None
+        start = reader.line_num + 1
+
+
+def _clean(row):
+    # empty cells mean "not given", as an omitted form field would
+    return {
+        key: value.strip() if isinstance(value, str) else value
+        for key, value in row.items()
+        if value is not None and value != ""
+    }
+
+
+def _validate(row):
+    if any(isinstance(value, str) and "\ufffd" in value for value in row.values()):
+        return None, {"non_field_errors": ["Not valid UTF-8."]}
+    serializer = ImportRowSerializer(data=row)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    return serializer.validated_data, None
+
+
+def import_rows(rows, batch_size=None, max_errors=None):
+    """
+    Create a user and profile for every valid row from read_rows().
+    Returns an ImportReport; each committed batch stays committed.
+    """
+    batch_size = batch_size or getattr(settings, "ROSTER_IMPORT_BATCH_SIZE", 500)
+    report = ImportReport(max_errors)
+    seen = set()
+    batch = []
+    touched = (set(), set())
+
+    for line, row, error in rows:
+        email = row.get("email") if row else None
+        if error is None:
+            data, error = _validate(_clean(row))
+        if error is not None:
+            report.add_error(line, email, error)
+            continue
+        username = User.normalize_username(data["email"])
+        if username in seen:
+            report.add_error(line, data["email"], {"email": ["Duplicate email in this file."]})
+            continue
+        seen.add(username)
+        batch.append((line, username, data))
+        if len(batch) >= batch_size:
+            _write_batch(batch, report, touched)
+            batch = []
+    if batch:
+        _write_batch(batch, report, touched)
+
+    if report.created:
+        bump_bulk(*touched)
+    return report
+
+
+def _write_batch(batch, report, touched):
+    existing = set(
+        User.objects.filter(username__in=[username for _, username, _ in batch])
+        .values_list("username", flat=True)
+    )
+    rows = []
+    for line, username, data in batch:
+        if username in existing:
+            report.add_error(line, data["email"], {"email": ["User with this email already exists."]})
+        else:
+            rows.append((line, username, data))
+    if not rows:
+        return
+
+    users = [
+        User(
+            username=username,
+            email=User.objects.normalize_email(data["email"]),
+            # hashing is the slow part; without a password it is skipped
+            password=make_password(data.get("password")),
+        )
+        for _, username, data in rows
+    ]
+    try:
+        with transaction.atomic():
+            users = User.objects.bulk_create(users)
+            profiles = []
+            for user, (_, _, data) in zip(users, rows):
+                profile = Profile(
+                    user=user,
+                    name=data["name"],
+                    blood_group=data["blood_group"],
+                    city=data["city"],
+                    role=data["role"],
+                    ever_donated=data.get("ever_donated", False),
+                    last_donation=data.get("last_donation"),
+                    latitude=data.get("latitude"),
+                    longitude=data.get("longitude"),
+                )
+                profile.fill_derived_fields()
+                profiles.append(profile)
+            Profile.objects.bulk_create(profiles)
+    except IntegrityError:
+        # an email registered since the existence check; nothing of this batch was kept
+        for line, _, data in rows:
+            report.add_error(line, data["email"], {"non_field_errors": ["Conflicted with a concurrent write; retry."]})
+        return
+
+    report.created += len(profiles)
+    touched[0].update(profile.blood_group for profile in profiles)
+    touched[1].update(profile.city for profile in profiles)
+
+
+# ---------------------------
+# Export
+# ---------------------------
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_queryset(qs=None):
+    """Profiles as dicts with exactly COLUMNS, in id order."""
+    qs = Profile.objects.all() if qs is None else qs
+    return qs.order_by("id").values(*(c for c in COLUMNS if c != "email"), email=F("user__email"))
+
+
+def export_lines(qs, fmt, chunk_size=None):
+    """
+    Encoded export of export_queryset() rows, a header first for CSV. Yields
+    one string per chunk_size rows; the queryset is read with .iterator().
+    """
+    if fmt not in FORMATS:
+        raise RosterFileError(f"Unknown format {fmt!r}; use one of {', '.join(FORMATS)}.")
+    chunk_size = chunk_size or getattr(settings, "ROSTER_EXPORT_CHUNK_SIZE", 2000)
+    if fmt == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(COLUMNS)
+
+        def encode(row):
+            return writer.writerow(["" if row[c] is None else row[c] for c in COLUMNS])
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+        def encode(row):
+            return encoder.encode({c: row[c] for c in COLUMNS}) + "\n"
+
+    buffer = []
+    for row in qs.iterator(chunk_size=chunk_size):
+        buffer.append(encode(row))
+        if len(buffer) >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
@@ -1,14 +1,167 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
 from .models import Profile, BloodRequest, BLOOD_GROUPS
+from .images import VARIANTS, validate_photo
 from rest_framework_simplejwt.tokens import RefreshToken
 from datetime import date
+from functools import partial
 from django.utils import timezone
+from django.conf import settings
 
-class UserSerializer(serializers.ModelSerializer):
+
+# ---------------------------
+# Sparse fieldsets (?fields= / ?expand=)
+# ---------------------------
+def _add_path(selection, parts):
+    head, rest = parts[0], parts[1:]
+    if not rest:
+        selection[head] = None
+    elif head not in selection:
+        selection[head] = {}
+        _add_path(selection[head], rest)
+    elif selection[head] is not None:
+        _add_path(selection[head], rest)
+
+
+def parse_fields(spec):
+    """
+    "id,name,user.email" -> {"id": None, "name": None, "user": {"email": None}}.
+    None stands for every field of that (nested) serializer.
+    """
+    selection = {}
+    for path in (spec or "").split(","):
+        parts = [part.strip() for part in path.split(".")]
+        if all(parts):
+            _add_path(selection, parts)
+    return selection
+
+
+def _merge(selection, other):
+    for name, sub in other.items():
+        if name not in selection or sub is None:
+            selection[name] = sub
+        elif selection[name] is not None:
+            _merge(selection[name], sub)
+    return selection
+
+
+def requested_fields(request):
+    """
+    The ?fields= selection with ?expand= added to it, or None for the full
+    representation. expand names nested objects to include on top of a
+    shape, e.g. ?fields=card&expand=user.
+    """
+    fields = request.GET.get("fields") if request is not None else None
+    if not fields:
+        return None
+    return _merge(parse_fields(fields), parse_fields(request.GET.get("expand")))
+
+
+class SparseFieldsMixin:
+    """
+    Renders only the fields in `selection` (a parse_fields() tree; None means
+    all of them). Names in `shapes` stand for a predefined field list, and
+    "id" is always kept. Fields left out are never evaluated, and
+    query_paths() tells which columns the remaining ones read, so callers can
+    trim the query with only().
+    """
+    shapes = {}
+    # model columns read by a field beyond its own source (method fields)
+    field_columns = {}
+
+    def __init__(self, *args, selection=None, **kwargs):
+        self.selection = selection
+        super().__init__(*args, **kwargs)
+
+    def resolve(self, selection):
+        if selection is None:
+            return None
+        resolved = {"id": None}
+        for name, sub in selection.items():
+            if name in self.shapes:
+                _merge(resolved, parse_fields(self.shapes[name]))
+            else:
+                _merge(resolved, {name: sub})
+        return resolved
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.resolve(self.selection)
+        if selection is None:
+            return fields
+        kept = {}
+        for name, field in fields.items():
+            if name in selection:
+                if isinstance(field, SparseFieldsMixin):
+                    field.selection = selection[name]
+                kept[name] = field
+        return kept
+
+    def query_paths(self, prefix="", via=None):
+        """
+        (only() columns, select_related() paths) for the selected fields.
+        `via` is the reverse one-to-one this serializer was reached through;
+        following its forward side back (profile.user from user.profile)
+        reuses the row already joined.
+        """
+        model = self.Meta.model
+        columns, related = [], []
+        for name, field in self.fields.items():
+            columns += [prefix + column for column in self.field_columns.get(name, ())]
+            if field.source == "*":
+                continue
+            if not isinstance(field, SparseFieldsMixin):
+                columns.append(prefix + field.source.replace(".", "__"))
+                continue
+            path, reached_by, current = prefix, None, model
+            for part in field.source.split("."):
+                hop = current._meta.get_field(part)
+                if via is not None and path == prefix and hop is via.field:
+                    path = prefix[:-len(via.name) - 2]
+                    reached_by = None
+                else:
+                    path += part + "__"
+                    reached_by = hop if hop.one_to_one and hop.auto_created else None
+                current = hop.related_model
+            if path:
+                related.append(path[:-2])
+            nested = field.query_paths(path, reached_by)
+            columns += nested[0]
+            related += nested[1]
+        return columns, related
+
+    def restrict(self, queryset, *keep):
+        """`queryset` reading just the columns this serializer renders, plus `keep`."""
+        columns, related = self.query_paths()
+        # select_related() without arguments would follow every foreign key
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only(*dict.fromkeys([*columns, *keep]))
+
+
+def sparse_fields(request, serializer_class, *keep):
+    """
+    (serializer, trim) for the request's ?fields= / ?expand=. trim(queryset)
+    drops the columns the selection does not need; `keep` names those the
+    view reads itself (ordering, coordinates). Without ?fields= both are
+    returned unchanged.
+    """
+    selection = requested_fields(request)
+    if selection is None:
+        return serializer_class, lambda queryset: queryset
+    serializer = partial(serializer_class, selection=selection)
+    restrict = serializer().restrict
+    return serializer, lambda queryset: restrict(queryset, *keep)
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Provide a convenient name property (full name from profile if present)
     name = serializers.SerializerMethodField()
 
+    field_columns = {'name': ('first_name', 'last_name', 'username', 'email')}
+
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'is_staff', 'name']
@@ -26,18 +179,30 @@ class UserSerializer(serializers.ModelSerializer):
             return full
         return obj.username or obj.email or ""
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     can_donate_now = serializers.SerializerMethodField()
     next_possible_donation = serializers.SerializerMethodField()
     # Provide convenient URL field for frontend
     photo_url = serializers.SerializerMethodField()
+    # resized copies (thumb/card/full); the original until they are generated
+    photo_variants = serializers.SerializerMethodField()
+
+    # ?fields=card: what a search result card shows
+    shapes = {'card': 'id,name,blood_group,city,can_donate_now,photo_variants'}
+    field_columns = {
+        'user': ('name',),  # user.name prefers the profile's name
+        'can_donate_now': ('ever_donated', 'last_donation'),
+        'next_possible_donation': ('last_donation',),
+        'photo_url': ('photo',),
+        'photo_variants': ('photo', 'photo_variants'),
+    }
 
     class Meta:
         model = Profile
         fields = ['id','user','name','blood_group','city','role','ever_donated',
-                  'last_donation','bio','photo','photo_url','date_created',
-                  'can_donate_now','next_possible_donation']
+                  'last_donation','bio','photo','photo_url','photo_variants','date_created',
+                  'can_donate_now','next_possible_donation','latitude','longitude']
 
     def get_can_donate_now(self, obj):
         return obj.can_donate_now()
@@ -49,16 +214,31 @@ class ProfileSerializer(serializers.ModelSerializer):
     def get_photo_url(self, obj):
         if not obj.photo:
             return None
+        return self.absolute_url(obj.photo.url)
+
+    def get_photo_variants(self, obj):
+        if not obj.photo:
+            return None
+        ready = obj.photo_variants or {}
+        return {
+            variant: self.absolute_url(
+                default_storage.url(ready[variant]) if variant in ready else obj.photo.url
+            )
+            for variant in VARIANTS
+        }
+
+    def absolute_url(self, url):
         request = self.context.get('request') if isinstance(self.context, dict) else None
         try:
             if request:
-                return request.build_absolute_uri(obj.photo.url)
+                return request.build_absolute_uri(url)
         except Exception:
             pass
-        return obj.photo.url
+        return url
 
 
-class RegisterSerializer(serializers.Serializer):
+class BaseRegisterSerializer(serializers.Serializer):
+    """Account and profile fields shared by registration and bulk import."""
     name = serializers.CharField()
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True, min_length=6)
@@ -67,15 +247,26 @@ class RegisterSerializer(serializers.Serializer):
     role = serializers.ChoiceField(choices=['donor','patient'])
     ever_donated = serializers.BooleanField(required=False)
     last_donation = serializers.DateField(required=False, allow_null=True)
-    # accept image upload
-    photo = serializers.ImageField(required=False, allow_null=True)
+    # optional location for nearby search
+    latitude = serializers.FloatField(required=False, allow_null=True, min_value=-90, max_value=90)
+    longitude = serializers.FloatField(required=False, allow_null=True, min_value=-180, max_value=180)
 
     def validate(self, data):
         if data['role'] == 'donor' and data.get('ever_donated', False):
             if not data.get('last_donation', None):
                 raise serializers.ValidationError("Please provide last_donation date if you ever donated.")
+        if (data.get('latitude') is None) != (data.get('longitude') is None):
+            raise serializers.ValidationError("Provide both latitude and longitude, or neither.")
         return data
 
+
+class RegisterSerializer(BaseRegisterSerializer):
+    # accept image upload
+    photo = serializers.ImageField(required=False, allow_null=True)
+
+    def validate_photo(self, value):
+        return validate_photo(value) if value else value
+
     def create(self, validated_data):
         email = validated_data['email']
         password = validated_data['password']
@@ -90,6 +281,8 @@ class RegisterSerializer(serializers.Serializer):
             'ever_donated': validated_data.get('ever_donated', False),
             'last_donation': validated_data.get('last_donation', None),
             'bio': validated_data.get('bio', ''),
+            'latitude': validated_data.get('latitude'),
+            'longitude': validated_data.get('longitude'),
         }
         photo = validated_data.get('photo', None)
         if photo:
@@ -99,30 +292,62 @@ class RegisterSerializer(serializers.Serializer):
         return user
 
 
+class ImportRowSerializer(BaseRegisterSerializer):
+    """
+    Registration rules for one row of a bulk import, which core.roster writes
+    in batches. There is no photo, and without a password the account gets
+    an unusable one until the donor resets it.
+    """
+    password = serializers.CharField(write_only=True, min_length=6, required=False)
+
+
+class LocationSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(allow_null=True, min_value=-90, max_value=90)
+    longitude = serializers.FloatField(allow_null=True, min_value=-180, max_value=180)
+
+    def validate(self, data):
+        if (data['latitude'] is None) != (data['longitude'] is None):
+            raise serializers.ValidationError("Provide both latitude and longitude, or neither.")
+        return data
+
+
+class BroadcastRequestSerializer(serializers.Serializer):
+    # either explicit donor profile ids ...
+    donor_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, allow_empty=False
+    )
+    # ... or a match query (compatible, eligible donors, same city first)
+    blood = serializers.ChoiceField(choices=[g[0] for g in BLOOD_GROUPS], required=False)
+    city = serializers.CharField(required=False, allow_blank=True)
+    limit = serializers.IntegerField(required=False, min_value=1)
+    message = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate(self, data):
+        if bool(data.get('donor_ids')) == bool(data.get('blood')):
+            raise serializers.ValidationError("Provide either donor_ids or blood.")
+        max_donors = settings.BROADCAST_MAX_DONORS
+        if len(data.get('donor_ids', [])) > max_donors:
+            raise serializers.ValidationError(f"At most {max_donors} donors per broadcast.")
+        data['limit'] = min(data.get('limit', max_donors), max_donors)
+        return data
+
+
 class MyTokenObtainPairSerializer(serializers.Serializer):
     # placeholder: actual token serializer is in views (we don't use this class directly here)
     pass
 
 
-class BloodRequestSerializer(serializers.ModelSerializer):
-    requester_profile = serializers.SerializerMethodField()
-    donor_profile = serializers.SerializerMethodField()
+class BloodRequestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # one nested serializer instance per field, reused for every row; callers
+    # should select_related(*BloodRequestSerializer.related_fields) to avoid N+1
+    requester_profile = ProfileSerializer(source='requester.profile', read_only=True)
+    donor_profile = ProfileSerializer(source='donor.profile', read_only=True)
+
+    related_fields = ('requester__profile', 'donor__profile')
+    shapes = {
+        'card': 'id,status,requested_at,responded_at,requester_profile.card,donor_profile.card',
+    }
+
     class Meta:
         model = BloodRequest
         fields = ['id','requester','requester_profile','donor','donor_profile','message','status','requested_at','responded_at']
-
-    def get_requester_profile(self, obj):
-        from .serializers import ProfileSerializer
-        ctx = self.context if hasattr(self, 'context') else {}
-        try:
-            return ProfileSerializer(obj.requester.profile, context=ctx).data
-        except Exception:
-            return None
-
-    def get_donor_profile(self, obj):
-        from .serializers import ProfileSerializer
-        ctx = self.context if hasattr(self, 'context') else {}
-        try:
-            return ProfileSerializer(obj.donor.profile, context=ctx).data
-        except Exception:
-            return None
@@ -1,9 +1,89 @@
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, post_migrate
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from .models import PhotoBlob, Profile
+from .authentication import forget_user_state
+from .cache import bump_profile
+from .cities import ensure_city_search_index
+from .db import configure_sqlite
+from .metrics import install_query_recorder
+from .images import schedule_variants
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance, name=instance.username)
+
+
+# User columns shown in profile and request payloads (UserSerializer)
+SERIALIZED_USER_FIELDS = {'username', 'email', 'is_staff', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=User)
+def touch_profile(sender, instance, created, update_fields=None, **kwargs):
+    # profile payloads nest the user: bump updated_at so validators, cache
+    # generations and delta sync see the change (last_login saves do not)
+    if created or (update_fields is not None and not SERIALIZED_USER_FIELDS & set(update_fields)):
+        return
+    for profile in Profile.objects.filter(user=instance):
+        profile.save(update_fields=['updated_at'])
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_cache(sender, instance, **kwargs):
+    previous = getattr(instance, '_loaded_search_keys', None)
+    bump_profile(instance, previous if previous and None not in previous else None)
+    instance._loaded_search_keys = (instance.blood_group, instance.city)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_state(sender, instance, **kwargs):
+    forget_user_state(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_role_state(sender, instance, **kwargs):
+    forget_user_state(instance.user_id)
+
+
+@receiver(post_save, sender=Profile)
+def count_photo_references(sender, instance, update_fields=None, **kwargs):
+    # before queue_photo_variants, which moves _loaded_photo on
+    if update_fields is not None and 'photo' not in update_fields:
+        return
+    previous = getattr(instance, '_loaded_photo', None)
+    current = instance.photo.name if instance.photo else None
+    if previous != current:
+        PhotoBlob.release(previous)
+        PhotoBlob.retain(current)
+
+
+@receiver(post_delete, sender=Profile)
+def release_photo(sender, instance, **kwargs):
+    if instance.photo:
+        PhotoBlob.release(instance.photo.name)
+
+
+@receiver(post_save, sender=Profile)
+def queue_photo_variants(sender, instance, **kwargs):
+    if getattr(instance, '_photo_changed', False):
+        schedule_variants(instance)
+    instance._loaded_photo = instance.photo.name if instance.photo else None
+    instance._photo_changed = False
+
+
+@receiver(post_migrate)
+def restore_city_search_index(sender, using, **kwargs):
+    if sender.name == 'core':
+        ensure_city_search_index(using)
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        configure_sqlite(connection)
+    install_query_recorder(connection)
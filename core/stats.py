@@ -0,0 +1,74 @@
+# core/stats.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Min, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Profile, BloodRequest, eligible_q
+
+MAX_WINDOW_DAYS = 366
+
+
+def totals():
+    """
+    Dashboard headline numbers: one conditional aggregate over the role index
+    and one indexed count of pending requests.
+    """
+    data = Profile.objects.filter(role__in=("donor", "patient")).aggregate(
+        donors=Count("pk", filter=Q(role="donor")),
+        patients=Count("pk", filter=Q(role="patient")),
+    )
+    data["pending_requests"] = BloodRequest.objects.filter(status="pending").count()
+    return data
+
+
+def donor_breakdown(day=None):
+    """
+    Donor counts per blood group x city, with how many of them can donate today.
+    Cities are grouped on city_key, so "Dhaka", "dhaka " and "Dacca" are one
+    row; `city` is one of the spellings donors typed for it.
+    """
+    rows = (
+        Profile.objects.filter(role="donor")
+        .values("blood_group", "city_key")
+        .annotate(
+            city=Min("city"),
+            donors=Count("pk"),
+            available=Count("pk", filter=eligible_q(day)),
+        )
+        .order_by("blood_group", "city_key")
+    )
+    return [{**row, "city": row["city"].strip()} for row in rows]
+
+
+def daily_requests(days):
+    """
+    Requests created per local calendar day over the last `days` days, split by status.
+    """
+    since = timezone.now() - timedelta(days=days)
+    rows = (
+        BloodRequest.objects.filter(requested_at__gte=since)
+        .annotate(day=TruncDate("requested_at"))
+        .values("day")
+        .annotate(
+            total=Count("pk"),
+            **{
+                value: Count("pk", filter=Q(status=value))
+                for value, _ in BloodRequest.STATUS_CHOICES
+            },
+        )
+        .order_by("day")
+    )
+    return [{**row, "day": row["day"].isoformat()} for row in rows]
+
+
+def cached_stats(name, build, *args):
+    """
+    Short-TTL cache for the heavier grouped aggregates so the dashboard can
+    refresh often without re-scanning BloodRequest each time.
+    """
+    key = f"bms:stats:{name}:" + ":".join(str(arg) for arg in args)
+    return cache.get_or_set(key, lambda: build(*args), getattr(settings, "ADMIN_STATS_CACHE_TTL", 60))
@@ -0,0 +1,63 @@
+# core/storage.py
+"""
+Content-addressed storage for profile photos.
+
+A file is stored under the SHA-256 of its bytes, e.g.
+profiles/3f/3f9a...c1.jpg, whatever it was uploaded as. Uploading the same
+image again (or by another user) writes nothing and returns the existing
+name. A name therefore always has the same content: the media view can serve
+it as immutable, with the digest as a strong ETag.
+
+Files are shared, so they are only deleted once nothing uses them.
+PhotoBlob rows count the profiles referencing each stored name; the
+cleanup_photos command removes the files of blobs left unreferenced.
+"""
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files.storage import FileSystemStorage, storages
+
+DIGEST_RE = re.compile(r"^(?:.*/)?(?P<prefix>[0-9a-f]{2})/(?P<digest>(?P=prefix)[0-9a-f]{62})\.\w+$")
+
+
+def content_digest(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks() if hasattr(content, "chunks") else iter(lambda: content.read(65536), b""):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def name_digest(name):
+    """The content digest a stored name carries, or None for other names."""
+    match = DIGEST_RE.match(name or "")
+    return match["digest"] if match else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        directory, ext = os.path.dirname(name), os.path.splitext(name)[1].lower()
+        digest = content_digest(content)
+        name = os.path.join(directory, digest[:2], digest + ext).replace("\\", "/")
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # the name is the content; an existing file is the same file
+        return name
+
+    def _save(self, name, content):
+        # write under a private name and rename, so that two identical
+        # uploads racing each other both end up with one complete file
+        temp = super()._save(f"{name}.{uuid.uuid4().hex}.tmp", content)
+        os.replace(self.path(temp), self.path(name))
+        return name
+
+
+def get_photo_storage():
+    """Storage of Profile.photo, the "photos" entry of STORAGES."""
+    return storages["photos"]
@@ -1,3 +1,1810 @@
-from django.test import TestCase
+import asyncio
+import base64
+import importlib
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection, router
+from django.db.migrations.loader import MigrationLoader
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import compression, conditional, delta as delta_module, events, geo, metrics, renderers
+from .authentication import ClaimsJWTAuthentication, token_for_user
+from .cache import cache_stats
+from .cities import city_key
+from .db import pin_after_write, replica_reads
+from .images import VARIANTS, variant_names
+from .matching import COMPATIBLE_DONORS
+from .models import Profile, BloodRequest, BloodRequestArchive, PhotoBlob, BLOOD_GROUPS
+from .serializers import BloodRequestSerializer
+from .storage import get_photo_storage, name_digest
+
+
+def make_user(email, role='patient', blood_group='A+', city='Dhaka',
+              latitude=None, longitude=None, **extra):
+    user = User.objects.create_user(username=email, email=email, password='secret123', **extra)
+    profile = user.profile
+    profile.name = email.split('@')[0]
+    profile.role, profile.blood_group, profile.city = role, blood_group, city
+    profile.latitude, profile.longitude = latitude, longitude
+    profile.save()
+    return User.objects.get(pk=user.pk)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Every query issued by the list/detail/stats views must be served by an
+    index: no full scan of a core table and no temp b-tree for ORDER BY.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor', blood_group='O+')
+        cls.patient = make_user('patient@example.com')
+        cls.staff = make_user('staff@example.com', is_staff=True)
+        for i in range(5):
+            make_user(f'donor{i}@example.com', role='donor', city='Chittagong')
+            BloodRequest.objects.create(requester=cls.patient, donor=cls.donor)
+
+    def setUp(self):
+        # cached responses would skip the queries under test
+        cache.clear()
+        self.client = APIClient()
+
+    def plans_for(self, user, url):
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        self.client.force_authenticate(user=user)
+        with connection.execute_wrapper(capture):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for sql, params in statements:
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plans.append((sql, [row[-1] for row in cursor.fetchall()]))
+        self.assertTrue(plans, f'no queries captured for {url}')
+        return plans
+
+    def assertIndexed(self, user, url, allow_sort=False):
+        for sql, plan in self.plans_for(user, url):
+            for step in plan:
+                self.assertFalse(
+                    step.startswith('SCAN core_') and 'VIRTUAL TABLE' not in step,
+                    f'full table scan in {url}: {step}\n{sql}',
+                )
+                if not allow_sort:
+                    self.assertNotIn(
+                        'TEMP B-TREE FOR ORDER BY', step, f'unindexed sort in {url}\n{sql}'
+                    )
+
+    def test_donors_list(self):
+        url = reverse('donors-list')
+        self.assertIndexed(None, url)
+        self.assertIndexed(None, url + '?blood=o%2B')
+        self.assertIndexed(None, url + '?blood=O%2B&city=Dhaka&available=true')
+        # no exact key match: falls back to the trigram side table
+        self.assertIndexed(None, url + '?city=ttago')
+
+    def test_donors_match(self):
+        # ranking sorts the index-pruned candidates, so only the scan check applies
+        self.assertIndexed(None, reverse('donors-match') + '?blood=AB%2B&city=Dhaka', allow_sort=True)
+
+    def test_donors_nearby(self):
+        self.assertIndexed(None, reverse('donors-nearby') + '?lat=23.81&lon=90.41&radius_km=3&blood=A%2B')
+        self.assertIndexed(None, reverse('donors-nearby') + '?lat=23.81&lon=90.41&radius_km=80')
+
+    def test_profile_detail(self):
+        self.assertIndexed(None, reverse('profile-detail', args=[self.donor.profile.id]))
+
+    def test_donor_requests(self):
+        self.assertIndexed(self.donor, reverse('donor-requests'))
+        self.assertIndexed(self.donor, reverse('donor-requests') + '?paginate=false')
+
+    def test_patient_requests(self):
+        self.assertIndexed(self.patient, reverse('patient-requests'))
+
+    def test_deep_pages(self):
+        self.client.force_authenticate(user=self.patient)
+        next_url = self.client.get(reverse('patient-requests') + '?page_size=2').data['next']
+        self.assertIndexed(self.patient, next_url)
+        self.client.force_authenticate(user=None)
+        next_url = self.client.get(reverse('donors-list') + '?page_size=2&blood=A%2B').data['next']
+        self.assertIndexed(None, next_url)
+
+    def test_admin_stats(self):
+        self.assertIndexed(self.staff, reverse('admin-stats'))
+        self.assertIndexed(self.staff, reverse('admin-stats') + '?days=3')
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor')
+        cls.patient = make_user('patient@example.com')
+        cls.ids = [
+            BloodRequest.objects.create(requester=cls.patient, donor=cls.donor).id
+            for _ in range(7)
+        ]
+        # identical timestamps must not break the (requested_at, id) ordering
+        BloodRequest.objects.filter(id__in=cls.ids[2:5]).update(
+            requested_at=BloodRequest.objects.get(id=cls.ids[2]).requested_at
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.patient)
+
+    def test_walks_every_row_once(self):
+        seen = []
+        url = reverse('patient-requests') + '?page_size=3'
+        while url:
+            data = self.client.get(url).data
+            self.assertLessEqual(len(data['results']), 3)
+            seen += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(seen, sorted(self.ids, reverse=True))
+
+    def test_page_size_is_capped(self):
+        with self.settings(API_MAX_PAGE_SIZE=4):
+            data = self.client.get(reverse('patient-requests') + '?page_size=500').data
+        self.assertEqual(len(data['results']), 4)
+
+    def test_legacy_unpaginated_shape(self):
+        data = self.client.get(reverse('patient-requests') + '?paginate=false').data
+        self.assertEqual([row['id'] for row in data], sorted(self.ids, reverse=True))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('patient-requests') + '?cursor=bogus')
+        self.assertEqual(response.status_code, 404)
+
+
+class RequestQueryCountTests(TestCase):
+    """
+    The inbox views must cost the same number of queries for one row as for many.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor')
+        cls.patient = make_user('patient@example.com')
+        cls.other_donor = make_user('other@example.com', role='donor')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def count_queries(self, user, url):
+        # fresh instance so nothing is cached on the user between calls
+        self.client.force_authenticate(user=User.objects.get(pk=user.pk))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def add_requests(self, n, donor=None):
+        BloodRequest.objects.bulk_create(
+            BloodRequest(requester=self.patient, donor=donor or self.donor) for _ in range(n)
+        )
+
+    def assertConstantQueries(self, user, url):
+        self.add_requests(1)
+        baseline = self.count_queries(user, url)
+        self.add_requests(15)
+        self.add_requests(15, donor=self.other_donor)
+        self.assertEqual(self.count_queries(user, url), baseline)
+
+    def test_donor_requests(self):
+        self.assertConstantQueries(self.donor, reverse('donor-requests') + '?page_size=50')
+
+    def test_patient_requests(self):
+        self.assertConstantQueries(self.patient, reverse('patient-requests') + '?page_size=50')
+
+    def test_unpaginated(self):
+        self.assertConstantQueries(self.patient, reverse('patient-requests') + '?paginate=false')
+
+    def test_respond_request(self):
+        br = BloodRequest.objects.create(requester=self.patient, donor=self.donor)
+        self.client.force_authenticate(user=self.donor)
+        # conditional update of the request, update of the profile, then one
+        # select for the request + both profiles to render the response
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(
+                reverse('respond-request', args=[br.id]), {'status': 'accepted'}
+            )
+        self.assertEqual(response.status_code, 200)
+        statements = [q['sql'].split()[0] for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['UPDATE', 'UPDATE', 'SELECT'])
+        self.assertEqual(response.data['donor_profile']['last_donation'], str(timezone.now().date()))
+
+
+class RespondRaceTests(TransactionTestCase):
+    """
+    Concurrent responses to one request: the conditional UPDATE lets exactly
+    one through, whatever the interleaving.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.donor = make_user('donor@example.com', role='donor')
+        self.patient = make_user('patient@example.com')
+
+    def race(self, request_id, statuses):
+        barrier = threading.Barrier(len(statuses))
+        results = []
+
+        def respond(status_value):
+            client = APIClient()
+            client.force_authenticate(user=self.donor)
+            barrier.wait()
+            try:
+                response = client.post(
+                    reverse('respond-request', args=[request_id]), {'status': status_value}
+                )
+                results.append((status_value, response.status_code))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=respond, args=[value]) for value in statuses]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_one_response_wins(self):
+        for _ in range(5):
+            br = BloodRequest.objects.create(requester=self.patient, donor=self.donor)
+            results = self.race(br.id, ['accepted', 'rejected'] * 3)
+            winners = [value for value, code in results if code == 200]
+            self.assertEqual(len(winners), 1, results)
+            self.assertEqual(sorted(code for _, code in results), [200] + [409] * 5)
+
+            br.refresh_from_db()
+            self.assertEqual(br.status, winners[0])
+
+    def test_double_accept_records_one_donation(self):
+        br = BloodRequest.objects.create(requester=self.patient, donor=self.donor)
+        before = Profile.objects.get(user=self.donor).updated_at
+        results = self.race(br.id, ['accepted'] * 4)
+        self.assertEqual(sorted(code for _, code in results), [200, 409, 409, 409])
+        profile = Profile.objects.get(user=self.donor)
+        self.assertEqual(profile.last_donation, timezone.now().date())
+        self.assertEqual(profile.next_eligible_date, profile.last_donation + timedelta(days=90))
+        self.assertGreater(profile.updated_at, before)
+
+
+class EligibilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.now().date()
+        cls.never = make_user('never@example.com', role='donor')
+        cls.rested = make_user('rested@example.com', role='donor')
+        cls.resting = make_user('resting@example.com', role='donor')
+        # the rest period is 90 days: one donor is just out of it, one just in
+        for user, days_ago in ((cls.rested, 90), (cls.resting, 89)):
+            profile = user.profile
+            profile.ever_donated, profile.last_donation = True, today - timedelta(days=days_ago)
+            profile.save()
+
+    def test_eligible_on(self):
+        eligible = set(Profile.objects.eligible_on().values_list('user_id', flat=True))
+        self.assertEqual(eligible, {self.never.pk, self.rested.pk})
+        later = timezone.now().date() + timedelta(days=1)
+        self.assertIn(self.resting.profile.pk, Profile.objects.eligible_on(later).values_list('pk', flat=True))
+
+    def test_migration_backfills_next_eligible_date(self):
+        migration = importlib.import_module('core.migrations.0002_profile_next_eligible_date')
+        Profile.objects.update(next_eligible_date=None)
+        state = MigrationLoader(connection).project_state(('core', '0002_profile_next_eligible_date'))
+        migration.backfill_next_eligible_date(state.apps, None)
+        dates = dict(Profile.objects.values_list('user_id', 'next_eligible_date'))
+        self.assertIsNone(dates[self.never.pk])
+        self.assertEqual(dates[self.rested.pk], timezone.now().date())
+        self.assertEqual(dates[self.resting.pk], timezone.now().date() + timedelta(days=1))
+
+
+class DonorMatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.exact_far = make_user('a@example.com', role='donor', blood_group='A+', city='Sylhet')
+        cls.exact_near = make_user('b@example.com', role='donor', blood_group='A+', city='Dhaka')
+        cls.universal = make_user('c@example.com', role='donor', blood_group='O-', city='Dhaka')
+        cls.incompatible = make_user('d@example.com', role='donor', blood_group='B+', city='Dhaka')
+        cls.resting = make_user('e@example.com', role='donor', blood_group='A+', city='Dhaka')
+        profile = cls.resting.profile
+        profile.ever_donated = True
+        profile.last_donation = timezone.now().date()
+        profile.save()
+
+    def test_compatibility_table(self):
+        self.assertEqual(COMPATIBLE_DONORS['O-'], ('O-',))
+        self.assertEqual(set(COMPATIBLE_DONORS['AB+']), {g for g, _ in BLOOD_GROUPS})
+        self.assertEqual(COMPATIBLE_DONORS['A+'][0], 'A+')
+        self.assertNotIn('A+', COMPATIBLE_DONORS['A-'])
+
+    def test_ranking(self):
+        response = APIClient().get(reverse('donors-match') + '?blood=a%2B&city=dhaka')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row['id'] for row in response.data['results']],
+            [self.exact_near.profile.id, self.exact_far.profile.id, self.universal.profile.id],
+        )
+
+    def test_requires_valid_group(self):
+        response = APIClient().get(reverse('donors-match') + '?blood=C')
+        self.assertEqual(response.status_code, 400)
+
+    def test_updated_group_is_stored_upper_case(self):
+        cache.clear()
+        client = APIClient()
+        client.force_authenticate(user=self.incompatible)
+        url = reverse('profile-update')
+        self.assertEqual(client.put(url, {'blood_group': 'o+'}, format='json').status_code, 200)
+        self.assertEqual(Profile.objects.get(user=self.incompatible).blood_group, 'O+')
+        for blood in ('o%2B', 'O%2B'):
+            response = APIClient().get(reverse('donors-list') + f'?blood={blood}')
+            self.assertEqual([row['id'] for row in response.data['results']], [self.incompatible.profile.id])
+        response = client.put(url, {'blood_group': 'C+'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('blood_group', response.data)
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor', blood_group='B+', city='Dhaka')
+        make_user('other@example.com', role='donor', blood_group='B+', city='Sylhet')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.url = reverse('donors-list') + '?blood=b%2B&city=%20Dhaka'
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('donors-list') + '?blood=B%2B&city=dhaka').data
+        self.assertEqual(first.data, second)
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 1})
+        # the validators are cached with the payload
+        with self.assertNumQueries(0):
+            revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_profile_change_invalidates(self):
+        self.client.get(self.url)
+        detail_url = reverse('profile-detail', args=[self.donor.profile.id])
+        self.client.get(detail_url)
+
+        profile = Profile.objects.get(pk=self.donor.profile.pk)
+        profile.city = 'Khulna'
+        profile.save()
+
+        self.assertEqual(self.client.get(self.url).data['results'], [])
+        self.assertEqual(self.client.get(detail_url).data['city'], 'Khulna')
+        moved = self.client.get(reverse('donors-list') + '?city=khulna').data['results']
+        self.assertEqual([row['id'] for row in moved], [profile.id])
+
+    def test_eligibility_rolls_over_at_midnight(self):
+        self.client.get(self.url)
+        tomorrow = timezone.now() + timedelta(days=1)
+        with mock.patch('django.utils.timezone.now', return_value=tomorrow):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(self.url)
+        self.assertTrue(ctx.captured_queries)
+
+
+class AdminStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user('staff@example.com', is_staff=True)
+        cls.patient = make_user('patient@example.com')
+        cls.donors = [
+            make_user('a@example.com', role='donor', blood_group='O+', city='Dhaka'),
+            make_user('b@example.com', role='donor', blood_group='O+', city='Dhaka'),
+            make_user('c@example.com', role='donor', blood_group='A-', city='Sylhet'),
+            make_user('d@example.com', role='donor', blood_group='O+', city='dhaka '),
+            make_user('e@example.com', role='donor', blood_group='O+', city='Dacca'),
+        ]
+        for donor, value in zip(cls.donors, ['pending', 'pending', 'accepted']):
+            BloodRequest.objects.create(requester=cls.patient, donor=donor, status=value)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.staff)
+
+    def test_totals_in_two_queries(self):
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse('admin-stats')).data
+        self.assertEqual(
+            (data['donors'], data['patients'], data['pending_requests']), (5, 2, 2)
+        )
+
+    def test_breakdown_and_series(self):
+        data = self.client.get(reverse('admin-stats') + '?breakdown=true&days=30').data
+        self.assertEqual(
+            [(row['blood_group'], row['city_key'], row['donors']) for row in data['breakdown']],
+            [('A-', 'sylhet', 1), ('O+', 'dhaka', 4)],
+        )
+        self.assertIn(data['breakdown'][1]['city'], {'Dhaka', 'dhaka', 'Dacca'}
+        )
+        self.assertEqual(len(data['daily_requests']), 1)
+        today = data['daily_requests'][0]
+        self.assertEqual((today['total'], today['pending'], today['accepted']), (3, 2, 1))
+
+        # the 30-day series is cached for a short TTL
+        BloodRequest.objects.create(requester=self.patient, donor=self.donors[0])
+        data = self.client.get(reverse('admin-stats') + '?days=30').data
+        self.assertEqual(data['daily_requests'][0]['total'], 3)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(user=self.patient)
+        self.assertEqual(self.client.get(reverse('admin-stats')).status_code, 403)
+
+
+class CitySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dhaka = make_user('a@example.com', role='donor', city='Dhaka')
+        cls.ctg = make_user('b@example.com', role='donor', city='Chittagong')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, city):
+        response = APIClient().get(reverse('donors-list'), {'city': city})
+        return [row['id'] for row in response.data['results']]
+
+    def test_city_key(self):
+        self.assertEqual(city_key('  DACCA '), 'dhaka')
+        self.assertEqual(city_key("Cox's   Bazar"), 'cox s bazar')
+        self.assertEqual(city_key('Chittagong'), 'chattogram')
+
+    def test_exact_and_variants(self):
+        self.assertEqual(self.search('dhaka '), [self.dhaka.profile.id])
+        self.assertEqual(self.search('Dacca'), [self.dhaka.profile.id])
+        self.assertEqual(self.search('Chattogram'), [self.ctg.profile.id])
+
+    def test_fallback_substring_and_prefix(self):
+        self.assertEqual(self.search('togr'), [self.ctg.profile.id])
+        self.assertEqual(self.search('dh'), [self.dhaka.profile.id])
+        self.assertEqual(self.search('nowhere'), [])
+
+    def test_backfill_command(self):
+        Profile.objects.filter(pk=self.dhaka.profile.pk).update(city='Dacca', city_key='')
+        out = StringIO()
+        call_command('backfill_city_keys', batch_size=1, stdout=out)
+        self.assertIn('updated 1 city keys', out.getvalue())
+        self.assertEqual(Profile.objects.get(pk=self.dhaka.profile.pk).city_key, 'dhaka')
+        self.assertEqual(self.search('dhak'), [self.dhaka.profile.id])
+
+
+class NearbyDonorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Dhaka (Gulshan / Motijheel ~6.5km apart) and Chattogram (~215km away)
+        cls.gulshan = make_user('a@example.com', role='donor', latitude=23.7925, longitude=90.4078)
+        cls.motijheel = make_user('b@example.com', role='donor', latitude=23.7330, longitude=90.4172)
+        cls.chattogram = make_user('c@example.com', role='donor', latitude=22.3569, longitude=91.7832)
+        make_user('d@example.com', role='donor')
+
+    def nearby(self, **params):
+        return APIClient().get(reverse('donors-nearby'), params)
+
+    def test_geohash(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(self.gulshan.profile.geohash, geo.encode(23.7925, 90.4078))
+        cells = geo.covering_cells(23.79, 90.41, 2)
+        self.assertLessEqual(len(cells), geo.MAX_COVER_CELLS)
+        self.assertTrue(any(self.gulshan.profile.geohash.startswith(c) for c in cells))
+
+    def test_radius_and_ordering(self):
+        data = self.nearby(lat=23.7900, lon=90.4080, radius_km=2).data
+        self.assertEqual([row['id'] for row in data['results']], [self.gulshan.profile.id])
+
+        data = self.nearby(lat=23.7900, lon=90.4080, radius_km=10).data
+        self.assertEqual(
+            [row['id'] for row in data['results']],
+            [self.gulshan.profile.id, self.motijheel.profile.id],
+        )
+        self.assertLess(data['results'][0]['distance_km'], data['results'][1]['distance_km'])
+
+    def test_only_the_nearest_are_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.nearby(lat=23.7900, lon=90.4080, radius_km=10, limit=1).data
+        self.assertEqual([row['id'] for row in data['results']], [self.gulshan.profile.id])
+        ranked, loaded = (query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('auth_user', ranked)
+        self.assertNotIn('"core_profile"."name"', ranked)
+        self.assertIn(f'IN ({self.gulshan.profile.id})', loaded)
+
+    def test_invalid_params(self):
+        self.assertEqual(self.nearby(lat='x', lon=90).status_code, 400)
+        self.assertEqual(self.nearby(lat=23, lon=90, radius_km=5000).status_code, 400)
+
+    def test_location_is_validated_on_update(self):
+        client = APIClient()
+        client.force_authenticate(user=self.chattogram)
+        url = reverse('profile-update')
+        self.assertEqual(client.put(url, {'latitude': 91}, format='json').status_code, 400)
+        response = client.put(url, {'latitude': 23.8, 'longitude': 90.41}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Profile.objects.get(user=self.chattogram).geohash[:4], geo.encode(23.8, 90.41, 4))
+
+
+class BroadcastRequestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = make_user('patient@example.com', role='patient', blood_group='A+')
+        cls.donors = [
+            make_user(f'donor{i}@example.com', role='donor', blood_group=group)
+            for i, group in enumerate(['A+', 'O-', 'B+', 'A-'])
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.patient)
+        self.url = reverse('broadcast-request')
+
+    def test_explicit_ids_with_dedup(self):
+        first, second = (d.profile.id for d in self.donors[:2])
+        own = self.patient.profile.id
+        BloodRequest.objects.create(requester=self.patient, donor=self.donors[0])
+        # donor lookup, pending check and one insert (plus the savepoint pair)
+        with self.assertNumQueries(5):
+            response = self.client.post(
+                self.url, {'donor_ids': [first, second, second, own, 999]}, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['skipped'], {
+            'not_found': [own, 999],
+            'self': [],
+            'already_pending': [first],
+        })
+        self.assertEqual(
+            BloodRequest.objects.filter(requester=self.patient, donor=self.donors[1]).count(), 1
+        )
+
+    def test_match_query(self):
+        response = self.client.post(self.url, {'blood': 'A+', 'city': 'Dhaka'}, format='json')
+        self.assertEqual(response.data['created'], 3)  # A+, O-, A- but not B+
+        again = self.client.post(self.url, {'blood': 'A+'}, format='json')
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.data['created'], 0)
+        self.assertEqual(len(again.data['skipped']['already_pending']), 3)
+
+    def test_match_query_stays_in_city(self):
+        sylhet = make_user('sylhet@example.com', role='donor', blood_group='A+', city='Sylhet')
+        response = self.client.post(self.url, {'blood': 'A+', 'city': ' dhaka'}, format='json')
+        self.assertEqual(response.data['created'], 3)
+        self.assertFalse(BloodRequest.objects.filter(donor=sylhet).exists())
+
+    def test_requires_exactly_one_selector(self):
+        self.assertEqual(self.client.post(self.url, {}, format='json').status_code, 400)
+        response = self.client.post(self.url, {'donor_ids': [1], 'blood': 'A+'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor', blood_group='O+')
+        cls.patient = make_user('patient@example.com')
+        cls.donor_profile_id = cls.donor.profile.id
+        for _ in range(3):
+            BloodRequest.objects.create(requester=cls.patient, donor=cls.donor)
+        # token_for_user reads the profile, which async tests cannot do
+        cls.tokens = {user.pk: str(token_for_user(user).access_token) for user in (cls.donor, cls.patient)}
+
+    def setUp(self):
+        cache.clear()
+
+    def auth(self, user):
+        return {'Authorization': f'Bearer {self.tokens[user.pk]}'}
+
+    async def test_same_payload_as_sync_views(self):
+        pairs = [
+            ('donors-list', 'async-donors-list', [], None),
+            ('profile-detail', 'async-profile-detail', [self.donor_profile_id], None),
+            ('donor-requests', 'async-donor-requests', [], self.donor),
+            ('patient-requests', 'async-patient-requests', [], self.patient),
+        ]
+        for sync_name, async_name, args, user in pairs:
+            headers = self.auth(user) if user else {}
+            expected = await self.async_client.get(reverse(sync_name, args=args) + '?page_size=2', headers=headers)
+            actual = await self.async_client.get(reverse(async_name, args=args) + '?page_size=2', headers=headers)
+            self.assertEqual(actual.status_code, 200, actual.content)
+            sync_body = json.loads(expected.content)
+            if isinstance(sync_body, dict) and sync_body.get('next'):
+                sync_body['next'] = sync_body['next'].replace('/api/', '/api/async/')
+            self.assertEqual(json.loads(actual.content), sync_body)
+
+    async def test_send_request(self):
+        url = reverse('async-send-request', args=[self.donor_profile_id])
+        response = await self.async_client.post(
+            url, {'message': 'urgent'}, content_type='application/json', headers=self.auth(self.patient)
+        )
+        self.assertEqual(response.status_code, 201)
+        body = json.loads(response.content)
+        self.assertEqual((body['message'], body['donor_profile']['id']), ('urgent', self.donor_profile_id))
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(reverse('async-patient-requests'))
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(
+            reverse('async-donor-requests'), headers=self.auth(self.patient)
+        )
+        self.assertEqual(response.status_code, 403, response.content)
+
+
+class ClaimsAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor', blood_group='O+')
+        cls.patient = make_user('patient@example.com')
+
+    def setUp(self):
+        cache.clear()
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return ClaimsJWTAuthentication().authenticate(request)[0]
+
+    def test_login_token_carries_claims(self):
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': 'donor@example.com', 'password': 'secret123'}
+        )
+        token = AccessToken(response.data['access'])
+        self.assertEqual(
+            (token['role'], token['is_staff'], token['profile_id']),
+            ('donor', False, self.donor.profile.id),
+        )
+
+    def test_no_queries_once_state_is_cached(self):
+        token = token_for_user(self.donor).access_token
+        self.authenticate(token)
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertEqual(user, self.donor)
+        self.assertEqual((user.role, user.profile_id), ('donor', self.donor.profile.id))
+        with self.assertRaises(TypeError):
+            user.save()
+
+    def test_role_check_reads_claims(self):
+        token = token_for_user(self.patient).access_token
+        url = reverse('donor-requests')
+        self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 403)
+
+    def test_role_change_applies_to_issued_tokens(self):
+        token = token_for_user(self.patient).access_token
+        self.assertEqual(self.authenticate(token).role, 'patient')
+        profile = Profile.objects.get(user=self.patient)
+        profile.role = 'donor'
+        profile.save()
+        self.assertEqual(self.authenticate(token).role, 'donor')
+
+    def test_deactivated_user_is_rejected(self):
+        token = token_for_user(self.patient).access_token
+        self.authenticate(token)
+        user = User.objects.get(pk=self.patient.pk)
+        user.is_active = False
+        user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_responses_serialize_the_real_user(self):
+        boss = User.objects.create_user(
+            username='boss', email='boss@x.com', password='secret123',
+            first_name='Big', last_name='Boss',
+        )
+        Profile.objects.filter(user=boss).update(name='')
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token_for_user(boss).access_token}'}
+
+        response = self.client.put(
+            reverse('profile-update'), {'city': 'Sylhet'}, content_type='application/json', **headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            (response.json()['user']['username'], response.json()['user']['name']), ('boss', 'Big Boss')
+        )
+
+        response = self.client.post(
+            reverse('send-request', args=[self.donor.profile.id]), {}, content_type='application/json', **headers
+        )
+        self.assertEqual(response.status_code, 201)
+        requester = response.json()['requester_profile']['user']
+        self.assertEqual((requester['username'], requester['name']), ('boss', 'Big Boss'))
+
+    def test_tokens_without_claims_still_work(self):
+        user = self.authenticate(RefreshToken.for_user(self.donor).access_token)
+        self.assertFalse(hasattr(user, 'role'))
+        response = self.client.get(
+            reverse('donor-requests'),
+            HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.donor).access_token}',
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class DatabaseLayerTests(TestCase):
+    def test_sqlite_pragmas(self):
+        # WAL comes from the migration, not from every new connection
+        self.assertNotIn('journal_mode', settings.SQLITE_PRAGMAS)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    # no test transaction here: reads inside one always stay on the primary
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def routed(self, request):
+        return replica_reads(lambda request: router.db_for_read(Profile))(request)
+
+    @override_settings(DATABASE_REPLICA=None)
+    def test_no_replica_configured(self):
+        self.assertEqual(self.routed(self.factory.get('/')), 'default')
+
+    @override_settings(DATABASE_REPLICA='replica')
+    def test_read_only_views_use_replica(self):
+        self.assertEqual(self.routed(self.factory.get('/')), 'replica')
+        self.assertEqual(self.routed(self.factory.post('/')), 'default')
+        # unmarked code and transactions stay on the primary
+        self.assertEqual(router.db_for_read(Profile), 'default')
+        with mock.patch.object(connection, 'in_atomic_block', True):
+            self.assertEqual(self.routed(self.factory.get('/')), 'default')
+
+    @override_settings(DATABASE_REPLICA='replica')
+    def test_client_reads_its_own_writes(self):
+        middleware = pin_after_write(lambda request: HttpResponse(status=201))
+        middleware(self.factory.post('/', HTTP_AUTHORIZATION='Bearer one'))
+        self.assertEqual(self.routed(self.factory.get('/', HTTP_AUTHORIZATION='Bearer one')), 'default')
+        self.assertEqual(self.routed(self.factory.get('/', HTTP_AUTHORIZATION='Bearer two')), 'replica')
+
+    @override_settings(DATABASE_REPLICA='replica')
+    async def test_async_views_use_replica(self):
+        async def view(request):
+            return router.db_for_read(Profile)
+
+        self.assertEqual(await replica_reads(view)(self.factory.get('/')), 'replica')
+
+
+class SeedAndBenchmarkTests(TestCase):
+    def seed(self, **options):
+        call_command('seed_data', users=60, requests=200, batch_size=25, stdout=StringIO(), **options)
+        return list(
+            Profile.objects.filter(user__username__startswith='seed-')
+            .order_by('user__username')
+            .values_list('blood_group', 'city', 'role', 'city_key', 'geohash')
+        )
+
+    def test_seed_is_deterministic(self):
+        first = self.seed()
+        self.assertEqual(len(first), 60)
+        self.assertEqual(BloodRequest.objects.count(), 200)
+        self.assertTrue(all(key and geohash for *_, key, geohash in first))
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.assertEqual(self.seed(clear=True), first)
+        self.assertEqual(BloodRequest.objects.count(), 200)
+
+    def test_benchmark_report_and_baseline(self):
+        self.seed()
+        before = BloodRequest.objects.count()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f'{tmp}/bench.json'
+            options = dict(only='donors_list,respond_request', requests=3, warmup=1, profile_requests=1)
+            call_command('bench_api', output=path, stdout=StringIO(), stderr=StringIO(), **options)
+            with open(path) as fh:
+                report = json.load(fh)
+            self.assertEqual(set(report['results']), {'donors_list', 'respond_request'})
+            result = report['results']['respond_request']
+            self.assertEqual(result['errors'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+            report['results']['respond_request']['queries'] = 1
+            with open(path, 'w') as fh:
+                json.dump(report, fh)
+            with self.assertRaisesMessage(CommandError, 'respond_request queries'):
+                call_command('bench_api', baseline=path, stdout=StringIO(), stderr=StringIO(), **options)
+        # benchmark writes are rolled back
+        self.assertEqual(BloodRequest.objects.count(), before)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user('staff@example.com', is_staff=True)
+        cls.patient = make_user('patient@example.com')
+        make_user('donor@example.com', role='donor')
+
+    def setUp(self):
+        cache.clear()
+        metrics.reset()
+        self.client = APIClient()
+
+    def scrape(self):
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.client.force_authenticate(user=None)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_records_latency_and_queries_per_route(self):
+        self.client.get(reverse('donors-list'))
+        self.client.get(reverse('donors-list') + '?blood=A%2B')
+        self.client.get('/api/no-such-route/')
+        samples = self.scrape()
+        labels = '{route="donors-list",method="GET"}'
+        self.assertEqual(samples[f'bms_http_request_duration_seconds_count{labels}'], 2)
+        self.assertEqual(
+            samples['bms_http_request_duration_seconds_bucket{route="donors-list",method="GET",le="+Inf"}'], 2
+        )
+        self.assertGreaterEqual(samples[f'bms_db_queries_per_request_sum{labels}'], 2)
+        self.assertGreater(samples[f'bms_db_query_seconds_total{labels}'], 0)
+        self.assertEqual(
+            samples['bms_http_responses_total{route="donors-list",method="GET",status="200"}'], 2
+        )
+        self.assertEqual(samples['bms_http_request_duration_seconds_count{route="unmatched",method="GET"}'], 1)
+
+    async def test_async_views_queries_are_attributed(self):
+        await self.async_client.get(reverse('async-donors-list'))
+        data = await sync_to_async(metrics.collect)()
+        self.assertGreater(data['async-donors-list|GET']['queries'], 0)
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.client.force_authenticate(user=self.patient)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_slow_query_log(self):
+        with override_settings(SLOW_QUERY_MS=0), self.assertLogs('core.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('donors-list'))
+        self.assertIn('core_profile', logs.output[0])
+        self.assertGreater(self.scrape()['bms_db_slow_queries_total{route="donors-list",method="GET"}'], 0)
+
+    def test_totals_from_other_processes_are_summed(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(METRICS_DIR=tmp):
+            self.client.get(reverse('donors-list'))
+            other = metrics.Series()
+            other.latency[0], other.queries, other.statuses = 3, 7, {200: 3}
+            with open(f'{tmp}/99999-other.json', 'w') as fh:
+                json.dump({'donors-list|GET': other.as_dict()}, fh)
+            samples = self.scrape()
+        labels = '{route="donors-list",method="GET"}'
+        self.assertEqual(samples[f'bms_http_request_duration_seconds_count{labels}'], 4)
+        self.assertEqual(
+            samples['bms_http_responses_total{route="donors-list",method="GET",status="200"}'], 4
+        )
+
+    def test_exited_threads_are_retired(self):
+        metrics._shard()
+        live = len(metrics._shards)
+        other = metrics.RequestQueries()
+        other.count = 2
+        threads = [
+            threading.Thread(target=metrics.observe, args=('donors-list', 'GET', 200, 0.001, other))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+            thread.join()
+        del threads, thread
+        self.assertEqual(metrics.snapshot()['donors-list|GET']['queries'], 6)
+        self.assertEqual(len(metrics._shards), live)
+
+    def test_exited_workers_files_are_folded(self):
+        other = metrics.Series()
+        other.latency[0], other.queries, other.statuses = 3, 7, {200: 3}
+        with tempfile.TemporaryDirectory() as tmp, override_settings(METRICS_DIR=tmp):
+            for name in ('99998-gone', '99999-gone'):
+                with open(f'{tmp}/{name}.json', 'w') as fh:
+                    json.dump({'donors-list|GET': other.as_dict()}, fh)
+                os.utime(f'{tmp}/{name}.json', (0, 0))
+            before = metrics.collect()['donors-list|GET']
+            self.assertEqual(
+                sorted(name for name in os.listdir(tmp) if name.endswith('.json')),
+                [f'{os.getpid()}-{metrics._flush_state["token"]}.json', 'retired.json'],
+            )
+            self.assertEqual(metrics.collect()['donors-list|GET'], before)
+        self.assertEqual(before['queries'], 14)
+        self.assertEqual(before['statuses'], {'200': 6})
+
+
+def image_upload(name='photo.png', size=(640, 480), fmt='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+class PhotoVariantTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media, PHOTO_VARIANTS_ASYNC=False))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.donor)
+
+    def upload(self, upload):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.put(reverse('profile-update'), {'photo': upload}, format='multipart')
+        return response, callbacks
+
+    def test_upload_falls_back_then_uses_variants(self):
+        response, callbacks = self.upload(image_upload())
+        self.assertEqual(response.status_code, 200)
+        # variants are not built on the request thread
+        self.assertEqual(set(response.data['photo_variants'].values()), {response.data['photo_url']})
+        self.assertEqual(len(callbacks), 1)
+
+        callbacks[0]()
+        profile = Profile.objects.get(user=self.donor)
+        self.assertEqual(set(profile.photo_variants), set(VARIANTS))
+        with default_storage.open(profile.photo_variants['thumb']) as fh:
+            self.assertEqual(Image.open(fh).size, (96, 96))
+        with default_storage.open(profile.photo_variants['full']) as fh:
+            self.assertEqual(Image.open(fh).size, (640, 480))
+
+        data = self.client.get(reverse('profile-detail', args=[profile.id])).data
+        self.assertTrue(data['photo_variants']['card'].endswith('-card.jpg'))
+
+    def test_rejects_non_images(self):
+        bogus = SimpleUploadedFile('photo.png', b'not an image', content_type='image/png')
+        response, callbacks = self.upload(bogus)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(callbacks, [])
+
+    def test_management_command_backfills(self):
+        profile = Profile.objects.get(user=self.donor)
+        name = default_storage.save('profiles/legacy.jpg', image_upload(fmt='JPEG'))
+        Profile.objects.filter(pk=profile.pk).update(photo=name)
+        call_command('generate_photo_variants', stdout=StringIO())
+        self.assertEqual(set(Profile.objects.get(pk=profile.pk).photo_variants), set(VARIANTS))
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor', blood_group='O+')
+        cls.patient = make_user('patient@example.com')
+        BloodRequest.objects.create(requester=cls.patient, donor=cls.donor)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_matching_etag_skips_serializer(self):
+        url = reverse('donors-list') + '?blood=O%2B'
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        cache.clear()
+        with mock.patch('core.views.ProfileSerializer') as serializer:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        serializer.assert_not_called()
+
+    def test_inbox_validators_cover_nested_profiles(self):
+        self.client.force_authenticate(user=self.patient)
+        url = reverse('patient-requests')
+        first = self.client.get(url)
+        self.assertNotIn('Last-Modified', first)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        profile = Profile.objects.get(user=self.donor)
+        profile.name, profile.city = 'Renamed', 'Sylhet'
+        profile.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.data['results'][0]['donor_profile']['name'], 'Renamed')
+
+        BloodRequest.objects.create(requester=self.patient, donor=self.donor)
+        added = self.client.get(url, HTTP_IF_NONE_MATCH=changed['ETag'])
+        self.assertEqual(len(added.data['results']), 2)
+
+    def test_if_modified_since_alone_never_answers_304(self):
+        # a row leaving the list does not move any date
+        url = reverse('donors-list') + '?blood=O%2B'
+        self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_edit_changes_validators(self):
+        list_url = reverse('donors-list') + '?blood=O%2B'
+        detail_url = reverse('profile-detail', args=[self.donor.profile.id])
+        etags = [self.client.get(url)['ETag'] for url in (list_url, detail_url)]
+        user = User.objects.get(pk=self.donor.pk)
+        user.email = 'renamed@example.com'
+        user.save()
+        for url, etag in zip((list_url, detail_url), etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['email'], 'renamed@example.com')
+        # logins only touch last_login and leave the payloads alone
+        before = Profile.objects.get(user=self.donor).updated_at
+        user.save(update_fields=['last_login'])
+        self.assertEqual(Profile.objects.get(user=self.donor).updated_at, before)
+
+    def test_update_changes_validators(self):
+        url = reverse('profile-detail', args=[self.donor.profile.id])
+        etag = self.client.get(url)['ETag']
+        profile = Profile.objects.get(user=self.donor)
+        profile.name = 'Renamed'
+        profile.save(update_fields=['name'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'Renamed')
+
+    def test_etag_is_per_user(self):
+        url = reverse('donor-requests')
+        self.client.force_authenticate(user=self.donor)
+        etag = self.client.get(url)['ETag']
+        other = make_user('other@example.com', role='donor')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_validator_query_uses_covering_index(self):
+        related = BloodRequestSerializer.related_fields
+        querysets = [
+            (Profile.objects.filter(role='donor', blood_group='O+'), ()),
+            (BloodRequest.objects.filter(donor=self.donor), related),
+            (BloodRequest.objects.filter(requester=self.patient), related),
+        ]
+        for qs, paths in querysets:
+            with CaptureQueriesContext(connection) as ctx:
+                conditional.queryset_stats(qs, related=paths)
+            sql = ctx.captured_queries[0]['sql']
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+            # the filtered table from its index alone; the nested profiles
+            # through auth_user's rowid and the unique profile.user_id index
+            step = next(step for step in plan if f' {qs.model._meta.db_table} ' in step)
+            self.assertIn('COVERING INDEX', step, sql)
+            self.assertFalse([step for step in plan if step.startswith('SCAN')], sql)
+
+
+class RosterTests(TestCase):
+    CSV = (
+        'name,email,blood_group,city,role,ever_donated,last_donation,latitude,longitude,extra\n'
+        'Rahim,rahim@example.com,O+,Dhaka,donor,true,2024-01-15,23.81,90.41,x\n'
+        'Karim,karim@example.com,XX,Dhaka,donor,,,,\n'
+        'Taken,staff@example.com,A+,Dhaka,donor,,,,\n'
+        'Again,rahim@example.com,A+,Dhaka,donor,,,,\n'
+        'Nadia,nadia@example.com,AB-,"Chattogram",patient,,,,\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = make_user('staff@example.com', is_staff=True)
+        cls.patient = make_user('patient@example.com')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_import_batches_and_reports_rows(self):
+        self.client.force_authenticate(user=self.staff)
+        upload = SimpleUploadedFile('roster.csv', self.CSV.encode(), 'text/csv')
+        # one existence check and two bulk inserts, not a signal insert per row
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('donors-import'), {'file': upload})
+        self.assertEqual(sum('INSERT' in q['sql'] for q in ctx.captured_queries), 2)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            sorted((e['line'], list(e['errors'])) for e in response.data['errors']),
+            [(3, ['blood_group']), (4, ['email']), (5, ['email'])],
+        )
+        profile = Profile.objects.select_related('user').get(user__username='rahim@example.com')
+        self.assertEqual(profile.next_eligible_date, profile.last_donation + timedelta(days=90))
+        self.assertEqual((profile.city_key, bool(profile.geohash)), ('dhaka', True))
+        self.assertFalse(profile.user.has_usable_password())
+
+    def test_import_ndjson_in_small_batches(self):
+        lines = [json.dumps({'name': f'D{i}', 'email': f'd{i}@example.com', 'password': 'secret123',
+                             'blood_group': 'B+', 'city': 'Khulna', 'role': 'donor'}) for i in range(5)]
+        lines[2] = '{not json'
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as fh:
+            fh.write('\n'.join(lines) + '\n')
+            fh.flush()
+            with tempfile.NamedTemporaryFile('r', suffix='.json') as report:
+                call_command('import_donors', fh.name, batch_size=2, report=report.name,
+                             stdout=StringIO(), stderr=StringIO())
+                data = json.load(report)
+        self.assertEqual((data['created'], data['failed']), (4, 1))
+        self.assertEqual(data['errors'][0]['line'], 3)
+        self.assertTrue(User.objects.get(username='d4@example.com').check_password('secret123'))
+
+    def test_import_rejects_missing_columns_and_non_staff(self):
+        upload = SimpleUploadedFile('roster.csv', b'name,email\nA,a@example.com\n')
+        self.client.force_authenticate(user=self.patient)
+        self.assertEqual(self.client.post(reverse('donors-import'), {'file': upload}).status_code, 403)
+        self.client.force_authenticate(user=self.staff)
+        upload.seek(0)
+        response = self.client.post(reverse('donors-import'), {'file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('blood_group', response.data['detail'])
+
+    def test_export_streams_and_round_trips(self):
+        make_user('donor@example.com', role='donor', blood_group='O+', latitude=23.8, longitude=90.4)
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(reverse('donors-export') + '?fmt=ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['email'] for row in rows], ['donor@example.com'])
+
+        csv_body = b''.join(self.client.get(reverse('donors-export') + '?fmt=csv').streaming_content)
+        Profile.objects.filter(role='donor').delete()
+        User.objects.filter(username='donor@example.com').delete()
+        with tempfile.NamedTemporaryFile('wb', suffix='.csv') as fh:
+            fh.write(csv_body)
+            fh.flush()
+            call_command('import_donors', fh.name, stdout=StringIO(), stderr=StringIO())
+        profile = Profile.objects.get(user__username='donor@example.com')
+        self.assertEqual((profile.blood_group, profile.latitude), ('O+', 23.8))
+
+
+class RequestArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor')
+        cls.patient = make_user('patient@example.com')
+        now = timezone.now()
+        cls.old = []
+        for days, status in ((900, 'accepted'), (800, 'rejected'), (700, 'rejected')):
+            br = BloodRequest.objects.create(requester=cls.patient, donor=cls.donor, status=status)
+            BloodRequest.objects.filter(id=br.id).update(
+                requested_at=now - timedelta(days=days), responded_at=now - timedelta(days=days - 1)
+            )
+            cls.old.append(br.id)
+        cls.recent = BloodRequest.objects.create(requester=cls.patient, donor=cls.donor, status='rejected',
+                                                 responded_at=now).id
+        cls.pending = BloodRequest.objects.create(requester=cls.patient, donor=cls.donor).id
+        cls.patient_token = str(token_for_user(cls.patient).access_token)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def archive(self, **options):
+        call_command('archive_requests', stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_archives_in_resumable_batches(self):
+        self.archive(batch_size=2, max_batches=1)
+        self.assertEqual(BloodRequestArchive.objects.count(), 2)
+        self.archive(batch_size=2)
+        self.assertEqual(sorted(BloodRequestArchive.objects.values_list('id', flat=True)), self.old)
+        self.assertEqual(
+            sorted(BloodRequest.objects.values_list('id', flat=True)), [self.recent, self.pending]
+        )
+        archived = BloodRequestArchive.objects.get(id=self.old[0])
+        self.assertEqual((archived.status, archived.requester_id), ('accepted', self.patient.id))
+
+    def test_inboxes_read_archive_only_when_asked(self):
+        self.archive()
+        self.client.force_authenticate(user=self.patient)
+        url = reverse('patient-requests')
+        with CaptureQueriesContext(connection) as ctx:
+            hot = self.client.get(url)
+        self.assertFalse(any('archive' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual([r['id'] for r in hot.data['results']], [self.pending, self.recent])
+
+        full = self.client.get(url + '?include_archived=true&page_size=3')
+        self.assertEqual([r['id'] for r in full.data['results']], [self.pending, self.recent, self.old[2]])
+        rest = self.client.get(full.data['next'])
+        self.assertEqual([r['id'] for r in rest.data['results']], self.old[1::-1])
+        self.assertIsNone(rest.data['next'])
+        self.assertNotEqual(full['ETag'], hot['ETag'])
+
+        self.client.force_authenticate(user=self.donor)
+        legacy = self.client.get(reverse('donor-requests') + '?include_archived=true&paginate=false')
+        self.assertEqual(len(legacy.data), 5)
+        response = self.client.post(reverse('respond-request', args=[self.old[0]]), {'status': 'accepted'})
+        self.assertEqual(response.status_code, 409)
+
+    async def test_async_inbox_includes_archive(self):
+        await sync_to_async(self.archive)()
+        response = await self.async_client.get(
+            reverse('async-patient-requests') + '?include_archived=true',
+            headers={'Authorization': f'Bearer {self.patient_token}'},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(json.loads(response.content)['results']), 5)
+
+
+async def read_stream(response):
+    return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+
+class EventBrokerTests(SimpleTestCase):
+    def check_broker(self, broker):
+        self.assertEqual(broker.read('user:1', 0), ([], True))
+        for n in range(7):
+            broker.publish('user:1', 'request.created', {'n': n})
+        self.assertEqual(broker.last_id('user:1'), 7)
+        events, complete = broker.read('user:1', 5)
+        self.assertEqual(([e[0] for e in events], complete), ([6, 7], True))
+        # ids older than the kept history, or from before a restart, need a resync
+        self.assertFalse(broker.read('user:1', 0)[1])
+        self.assertFalse(broker.read('user:1', 9)[1])
+        self.assertEqual(broker.read('user:2', 0), ([], True))
+
+    def test_in_process_broker(self):
+        self.check_broker(events.InProcessBroker(history=3))
+
+    def test_file_broker_shares_and_trims(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.check_broker(events.FileBroker(tmp, history=3))
+            other_worker = events.FileBroker(tmp, history=3)
+            self.assertEqual(other_worker.last_id('user:1'), 7)
+            with open(f'{tmp}/user-1.ndjson') as fh:
+                self.assertLessEqual(len(fh.readlines()), 6)
+
+    def test_wait_wakes_on_publish(self):
+        broker = events.InProcessBroker()
+
+        async def waiter():
+            started = time.monotonic()
+            woke = await broker.wait('user:1', 0, 5)
+            return woke, time.monotonic() - started
+
+        timer = threading.Timer(0.05, broker.publish, ('user:1', 'request.created', {}))
+        timer.start()
+        woke, waited = async_to_sync(waiter)()
+        timer.join()
+        self.assertTrue(woke)
+        self.assertLess(waited, 1)
+
+
+@override_settings(EVENTS_BACKEND='core.events.InProcessBroker', EVENTS_MAX_STREAM_SECONDS=5)
+class EventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor')
+        cls.patient = make_user('patient@example.com')
+        cls.tokens = {
+            user.username: str(token_for_user(user).access_token) for user in (cls.donor, cls.patient)
+        }
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_requests_publish_to_both_sides(self):
+        # the in-process broker outlives a single test
+        self.seen = {user.id: events.get_broker().last_id(events.user_channel(user.id))
+                     for user in (self.donor, self.patient)}
+        self.client.force_authenticate(user=self.patient)
+        with self.captureOnCommitCallbacks(execute=True):
+            created = self.client.post(reverse('send-request', args=[self.donor.profile.id]), {'message': 'hi'})
+        self.client.force_authenticate(user=self.donor)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('respond-request', args=[created.data['id']]), {'status': 'accepted'})
+
+        broker = events.get_broker()
+        for user in (self.donor, self.patient):
+            sent = broker.read(events.user_channel(user.id), self.seen[user.id])[0]
+            self.assertEqual([e[1] for e in sent], ['request.created', 'request.responded'])
+        self.assertEqual(sent[1][2]['status'], 'accepted')
+
+    async def test_stream_resumes_from_last_event_id(self):
+        channel = events.user_channel(self.donor.id)
+        broker = events.get_broker()
+        first = broker.publish(channel, 'request.created', {'id': 1})
+        broker.publish(channel, 'request.created', {'id': 2})
+        response = await self.async_client.get(
+            reverse('events') + f'?token={self.tokens["donor@example.com"]}&timeout=0',
+            headers={'Last-Event-ID': str(first)},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = await read_stream(response)
+        self.assertIn('retry: ', body)
+        self.assertNotIn('"id":1', body)
+        self.assertIn(f'id: {first + 1}\nevent: request.created\ndata: {{"id":2}}', body)
+
+        stale = await self.async_client.get(
+            reverse('events') + '?last_event_id=999&timeout=0',
+            headers={'Authorization': f'Bearer {self.tokens["donor@example.com"]}'},
+        )
+        self.assertIn('event: resync', await read_stream(stale))
+
+    async def test_open_stream_receives_new_events(self):
+        response = await self.async_client.get(
+            reverse('events') + '?timeout=1',
+            headers={'Authorization': f'Bearer {self.tokens["patient@example.com"]}'},
+        )
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.05, events.publish, events.user_channel(self.patient.id), 'request.responded', {})
+        body = await read_stream(response)
+        self.assertIn('event: request.responded', body)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(reverse('events'))
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(DELTA_SYNC_LAG_SECONDS=0)
+class DeltaSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor', blood_group='O+')
+        cls.other = make_user('other@example.com', role='donor', blood_group='O+')
+        cls.patient = make_user('patient@example.com')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_empty_delta_is_one_index_probe(self):
+        url = reverse('donors-list') + '?blood=O%2B'
+        token = self.client.get(url)['X-Since-Token']
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url + f'&since={token}')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(response.data['results'], [])
+        sql = ctx.captured_queries[0]['sql']
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = ' '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('profile_upd_idx', plan)
+
+    def test_changes_and_tombstones(self):
+        url = reverse('donors-list') + '?blood=O%2B'
+        token = self.client.get(url)['X-Since-Token']
+        moved = Profile.objects.get(user=self.donor)
+        moved.blood_group = 'A+'
+        moved.save()
+        renamed = Profile.objects.get(user=self.other)
+        renamed.name = 'Renamed'
+        renamed.save()
+        make_user('patient2@example.com')
+        patient = Profile.objects.get(user=self.patient)
+        patient.bio = 'Edited'
+        patient.save()
+
+        response = self.client.get(url + f'&since={token}')
+        rows = {row['id']: row for row in response.data['results']}
+        self.assertEqual(rows[moved.id], {'id': moved.id, 'removed': True})
+        self.assertEqual((rows[renamed.id]['name'], rows[renamed.id]['removed']), ('Renamed', False))
+        self.assertEqual(len(rows), 2)  # patients' edits are not sent to donor lists
+        self.assertFalse(response.data['has_more'])
+
+        renamed.role = 'patient'
+        renamed.save()
+        left = self.client.get(url + f'&since={response.data["since"]}')
+        self.assertEqual(left.data['results'], [{'id': renamed.id, 'removed': True}])
+
+        again = self.client.get(url + f'&since={left.data["since"]}')
+        self.assertEqual(again.data['results'], [])
+
+    def test_donors_becoming_eligible_are_resent(self):
+        profile = Profile.objects.get(user=self.donor)
+        # nothing was written since the token, but today the donor may give blood again
+        Profile.objects.update(updated_at=timezone.now() - timedelta(days=3))
+        Profile.objects.filter(id=profile.id).update(
+            ever_donated=True,
+            last_donation=timezone.now().date() - timedelta(days=90),
+            next_eligible_date=timezone.now().date(),
+        )
+        since = delta_module.encode_token(timezone.now() - timedelta(days=2), 0)
+        response = self.client.get(reverse('donors-list') + f'?available=true&since={since}')
+        self.assertEqual([row['id'] for row in response.data['results']], [profile.id])
+        self.assertTrue(response.data['results'][0]['can_donate_now'])
+
+    def test_eligibility_flips_respect_the_row_limit(self):
+        Profile.objects.update(updated_at=timezone.now() - timedelta(days=20))
+        today = timezone.now().date()
+        flipped = []
+        for i in range(5):
+            user = make_user(f'flip{i}@example.com', role='donor', blood_group='O+')
+            flipped.append(user.profile.id)
+            Profile.objects.filter(user=user).update(
+                ever_donated=True,
+                last_donation=today - timedelta(days=90 + i),
+                next_eligible_date=today - timedelta(days=i),
+                updated_at=timezone.now() - timedelta(days=20),
+            )
+        since = delta_module.encode_token(timezone.now() - timedelta(days=10), 0)
+        url = reverse('donors-list') + '?available=true'
+        pages = []
+        with self.settings(DELTA_SYNC_MAX_ROWS=2):
+            while True:
+                response = self.client.get(url + f'&since={since}')
+                self.assertLessEqual(len(response.data['results']), 2)
+                pages.append([row['id'] for row in response.data['results']])
+                since = response.data['since']
+                if not response.data['has_more']:
+                    break
+        # oldest flip first, each sent once
+        self.assertEqual([pk for page in pages for pk in page], flipped[::-1])
+        self.assertEqual(self.client.get(url + f'&since={since}').data['results'], [])
+
+    def test_inbox_delta_pages_through_keyset(self):
+        self.client.force_authenticate(user=self.patient)
+        url = reverse('patient-requests')
+        token = self.client.get(url)['X-Since-Token']
+        created = [BloodRequest.objects.create(requester=self.patient, donor=self.donor).id for _ in range(3)]
+        with self.settings(DELTA_SYNC_MAX_ROWS=2):
+            first = self.client.get(url + f'?since={token}')
+            self.assertTrue(first.data['has_more'])
+            second = self.client.get(url + f'?since={first.data["since"]}')
+        ids = [row['id'] for row in first.data['results'] + second.data['results']]
+        self.assertEqual(ids, created)
+        self.assertEqual(self.client.get(url + '?since=garbage').status_code, 400)
+
+    def test_token_with_a_bad_id_is_rejected(self):
+        raw = base64.urlsafe_b64encode(b'2026-01-01T00:00:00+00:00|abc').decode()
+        with self.assertRaises(delta_module.InvalidSince):
+            delta_module.decode_token(raw)
+        self.client.force_authenticate(user=self.patient)
+        for name in ('donors-list', 'patient-requests'):
+            self.assertEqual(self.client.get(reverse(name) + f'?since={raw}').status_code, 400)
+
+    async def test_async_token_with_a_bad_id_is_rejected(self):
+        raw = base64.urlsafe_b64encode(b'2026-01-01T00:00:00+00:00|abc').decode()
+        response = await self.async_client.get(reverse('async-donors-list') + f'?since={raw}')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_inbox_delta(self):
+        token = await sync_to_async(lambda: str(token_for_user(self.patient).access_token))()
+        since = delta_module.encode_token(timezone.now() - timedelta(minutes=1), 0)
+        await BloodRequest.objects.acreate(requester=self.patient, donor=self.donor)
+        response = await self.async_client.get(
+            reverse('async-patient-requests') + f'?since={since}',
+            headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(json.loads(response.content)['results']), 1)
+
+
+class SparseFieldsTests(TestCase):
+    CARD = {'id', 'name', 'blood_group', 'city', 'can_donate_now', 'photo_variants'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor', blood_group='O+')
+        cls.other = make_user('other@example.com', role='donor', blood_group='O+')
+        cls.patient = make_user('patient@example.com')
+        for donor in (cls.donor, cls.other):
+            BloodRequest.objects.create(requester=cls.patient, donor=donor, message='urgent')
+        cls.token = str(token_for_user(cls.patient).access_token)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response, [q['sql'] for q in ctx.captured_queries]
+
+    def test_card_shape_reads_only_its_columns(self):
+        response, queries = self.get(reverse('donors-list') + '?fields=card&page_size=10')
+        self.assertEqual({frozenset(row) for row in response.data['results']}, {frozenset(self.CARD)})
+        select = queries[-1]
+        self.assertNotIn('auth_user', select)
+        self.assertNotIn('"bio"', select)
+        self.assertIn('"date_created"', select)  # the keyset cursor still needs it
+
+    def test_default_representation_unchanged(self):
+        full, _ = self.get(reverse('donors-list') + '?page_size=10')
+        card, _ = self.get(reverse('donors-list') + '?fields=card&page_size=10')
+        self.assertIn('user', full.data['results'][0])
+        self.assertIn('bio', full.data['results'][0])
+        self.assertLess(len(json.dumps(card.data)), len(json.dumps(full.data)))
+
+    def test_dotted_fields_and_expand(self):
+        response, queries = self.get(
+            reverse('profile-detail', args=[self.donor.profile.id]) + '?fields=name,user.email&expand=city'
+        )
+        self.assertEqual(response.data, {
+            'id': self.donor.profile.id, 'name': 'donor', 'city': 'Dhaka',
+            'user': {'id': self.donor.id, 'email': 'donor@example.com'},
+        })
+        self.assertNotIn('"username"', queries[-1])
+        response, _ = self.get(reverse('donors-list') + '?fields=card&expand=user&page_size=10')
+        self.assertEqual(set(response.data['results'][0]), self.CARD | {'user'})
+        self.assertEqual(response.data['results'][0]['user']['name'], response.data['results'][0]['name'])
+
+    def test_request_card_nests_profile_cards(self):
+        self.client.force_authenticate(user=self.patient)
+        response, queries = self.get(reverse('patient-requests') + '?fields=card&page_size=10')
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'status', 'requested_at', 'responded_at', 'requester_profile', 'donor_profile'})
+        self.assertEqual(set(row['donor_profile']), self.CARD)
+        self.assertNotIn('"message"', queries[-1])
+        self.assertEqual(len(queries), len(self.get(reverse('patient-requests') + '?page_size=10')[1]))
+
+    def test_delta_with_fields(self):
+        since = delta_module.encode_token(timezone.now() - timedelta(minutes=1), 0)
+        response, _ = self.get(reverse('donors-list') + f'?since={since}&fields=name')
+        live = [row for row in response.data['results'] if not row['removed']]
+        self.assertEqual({tuple(sorted(row)) for row in live}, {('id', 'name', 'removed')})
+        self.assertEqual(len(live), 2)
+
+    async def test_async_views_match(self):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        for sync_name, async_name in (('donors-list', 'async-donors-list'),
+                                      ('patient-requests', 'async-patient-requests')):
+            query = '?fields=card&expand=user&page_size=10'
+            expected = await self.async_client.get(reverse(sync_name) + query, headers=headers)
+            actual = await self.async_client.get(reverse(async_name) + query, headers=headers)
+            self.assertEqual(actual.status_code, 200, actual.content)
+            self.assertEqual(json.loads(actual.content), json.loads(expected.content))
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    DATA = {
+        'when': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        'day': date(2024, 5, 1),
+        'amount': Decimal('12.50'),
+        'uid': uuid.UUID(int=1),
+        'text': 'line\u2028break ঢাকা',
+        'rows': [{'id': 1}, {'id': 2}],
+        3: 'int key',
+    }
+
+    def test_matches_stock_renderer(self):
+        fast = renderers.FastJSONRenderer().render(self.DATA)
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(self.DATA)))
+        self.assertIn(b'"2024-05-01T12:30:15.123456Z"', fast)
+        self.assertIn(b'\\u2028', fast)
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.FastJSONRenderer().render(self.DATA), JSONRenderer().render(self.DATA))
+
+    def test_indent_and_big_integers_use_stock_renderer(self):
+        renderer = renderers.FastJSONRenderer()
+        self.assertEqual(
+            renderer.render({'a': 1}, 'application/json; indent=2'),
+            JSONRenderer().render({'a': 1}, 'application/json; indent=2'),
+        )
+        self.assertEqual(json.loads(renderer.render({'n': 2 ** 70})), {'n': 2 ** 70})
+
+
+class CompressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            make_user(f'donor{i}@example.com', role='donor', blood_group='O+')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_large_list_is_gzipped(self):
+        url = reverse('donors-list') + '?page_size=30'
+        plain = self.client.get(url)
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertLess(len(response.content), len(plain.content) / 3)
+        self.assertEqual(json.loads(gzip.decompress(response.content)), json.loads(plain.content))
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        # the weak tag still revalidates
+        again = self.client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+
+    def test_small_or_unaccepted_responses_are_not_compressed(self):
+        small = self.client.get(reverse('donors-list') + '?page_size=1', headers={'Accept-Encoding': 'gzip'})
+        self.assertFalse(small.has_header('Content-Encoding'))
+        refused = self.client.get(reverse('donors-list') + '?page_size=30', headers={'Accept-Encoding': 'gzip;q=0'})
+        self.assertFalse(refused.has_header('Content-Encoding'))
+
+    def test_async_views_are_compressed(self):
+        response = async_to_sync(self.async_client.get)(
+            reverse('async-donors-list') + '?page_size=30', headers={'Accept-Encoding': 'gzip'}
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_negotiation_prefers_brotli_when_installed(self):
+        self.assertEqual(compression.negotiate('gzip, br')[0], 'gzip' if compression.brotli is None else 'br')
+        fake = mock.Mock(compress=lambda content, quality: b'br')
+        with mock.patch.object(compression, 'brotli', fake):
+            self.assertEqual(compression.negotiate('gzip, br')[0], 'br')
+            self.assertEqual(compression.negotiate('gzip, br;q=0.5')[0], 'gzip')
+            self.assertEqual(compression.negotiate('*')[0], 'br')
+            # no BREACH padding for brotli, so pages get gzip
+            self.assertEqual(compression.negotiate('gzip, br', 'text/html')[0], 'gzip')
+            page = HttpResponse('<p>' + 'donor ' * 500 + '</p>')
+            request = APIRequestFactory().get('/', HTTP_ACCEPT_ENCODING='br, gzip')
+            self.assertEqual(compression.compress_response(request, page)['Content-Encoding'], 'gzip')
+        self.assertIsNone(compression.negotiate('identity'))
+        self.assertIsNone(compression.negotiate(''))
+
+
+class PhotoStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = tempfile.mkdtemp()
+        cls.enterClassContext(override_settings(MEDIA_ROOT=cls.media, PHOTO_VARIANTS_ASYNC=False))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.media, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.donor = make_user('donor@example.com', role='donor')
+        cls.other = make_user('other@example.com', role='donor')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        shutil.rmtree(self.media, ignore_errors=True)
+        os.makedirs(self.media)
+
+    def upload(self, user, upload):
+        self.client.force_authenticate(user=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(reverse('profile-update'), {'photo': upload}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        return Profile.objects.get(user=user)
+
+    def stored_files(self):
+        root = f'{self.media}/profiles'
+        return sorted(
+            os.path.relpath(os.path.join(path, name), self.media)
+            for path, _, names in os.walk(root) for name in names
+        ) if os.path.isdir(root) else []
+
+    def test_identical_uploads_share_one_counted_file(self):
+        first = self.upload(self.donor, image_upload('mine.png'))
+        with mock.patch('core.images.render_variant') as render:
+            second = self.upload(self.other, image_upload('copy.PNG'))
+        render.assert_not_called()  # variants of the same content are reused
+        self.assertEqual(first.photo.name, second.photo.name)
+        self.assertEqual(second.photo_variants, first.photo_variants)
+        self.assertRegex(first.photo.name, r'^profiles/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        originals = [name for name in self.stored_files() if '/variants/' not in name]
+        self.assertEqual(originals, [first.photo.name])
+        self.assertEqual(PhotoBlob.objects.get(name=first.photo.name).refs, 2)
+
+        self.upload(self.donor, image_upload(size=(300, 300)))
+        self.assertEqual(PhotoBlob.objects.get(name=first.photo.name).refs, 1)
+        User.objects.filter(pk=self.other.pk).delete()
+        self.assertEqual(PhotoBlob.objects.get(name=first.photo.name).refs, 0)
+
+    def test_cleanup_deletes_only_unreferenced_photos(self):
+        shared = self.upload(self.donor, image_upload()).photo.name
+        self.upload(self.other, image_upload())
+        self.upload(self.other, image_upload(size=(50, 50)))
+        kept = self.upload(self.donor, image_upload(size=(60, 60))).photo.name
+
+        out = StringIO()
+        call_command('cleanup_photos', stdout=out)  # within the grace period
+        self.assertIn('Deleted 0', out.getvalue())
+        call_command('cleanup_photos', '--grace-hours', '0', stdout=out)
+        storage = get_photo_storage()
+        self.assertFalse(storage.exists(shared))
+        self.assertFalse(any(storage.exists(name) for name in variant_names(shared).values()))
+        self.assertTrue(storage.exists(kept))
+        self.assertFalse(PhotoBlob.objects.filter(name=shared).exists())
+
+    def test_recount_repairs_counts(self):
+        name = self.upload(self.donor, image_upload()).photo.name
+        # bypasses the signals that keep the counts
+        Profile.objects.filter(user=self.other).update(photo=name)
+        orphan = get_photo_storage().save('profiles/orphan.png', image_upload(size=(10, 10)))
+        call_command('cleanup_photos', '--recount', stdout=StringIO())
+        self.assertEqual(PhotoBlob.objects.get(name=name).refs, 2)
+        # picked up, but only deleted once the grace period has passed
+        self.assertEqual(PhotoBlob.objects.get(name=orphan).refs, 0)
+        self.assertTrue(get_photo_storage().exists(orphan))
+        call_command('cleanup_photos', '--grace-hours', '0', stdout=StringIO())
+        self.assertFalse(get_photo_storage().exists(orphan))
+        self.assertTrue(get_photo_storage().exists(name))
+
+    def test_media_view_caching_and_ranges(self):
+        name = self.upload(self.donor, image_upload()).photo.name
+        url = reverse('media', args=[name])
+        with get_photo_storage().open(name) as fh:
+            content = fh.read()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), content)
+        self.assertEqual(response['ETag'], f'"{name_digest(name)}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+
+        partial = self.client.get(url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial['Content-Range'], f'bytes 10-19/{len(content)}')
+        self.assertEqual(b''.join(partial.streaming_content), content[10:20])
+        suffix = self.client.get(url, headers={'Range': 'bytes=-5'})
+        self.assertEqual(b''.join(suffix.streaming_content), content[-5:])
+        self.assertEqual(self.client.get(url, headers={'Range': f'bytes={len(content)}-'}).status_code, 416)
+        stale = self.client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': '"other"'})
+        self.assertEqual(stale.status_code, 200)
+
+    def test_media_view_other_files_and_offload(self):
+        legacy = default_storage.save('profiles/legacy.jpg', image_upload(fmt='JPEG'))
+        response = self.client.get(reverse('media', args=[legacy]))
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        b''.join(response.streaming_content)
+        self.assertEqual(self.client.get('/media/../bms_backend/settings.py').status_code, 404)
+        self.assertEqual(self.client.get(reverse('media', args=['profiles'])).status_code, 404)
+
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.client.get(reverse('media', args=[legacy]))
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + legacy)
+        self.assertEqual(response.content, b'')
+        with self.settings(MEDIA_SENDFILE='x-sendfile'):
+            response = self.client.get(reverse('media', args=[legacy]))
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media, legacy))
@@ -1,6 +1,6 @@
 # core/urls.py
 from django.urls import path
-from . import views
+from . import views, async_views
 from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
@@ -11,15 +11,31 @@ urlpatterns = [
 
     # Profiles & donors
     path('donors/', views.donors_list, name='donors-list'),
+    path('donors/match/', views.donors_match, name='donors-match'),
+    path('donors/nearby/', views.donors_nearby, name='donors-nearby'),
+    path('donors/import/', views.donors_import, name='donors-import'),
+    path('donors/export/', views.donors_export, name='donors-export'),
     path('profile/<int:pk>/', views.profile_detail, name='profile-detail'),
     path('profile/update/', views.update_profile, name='profile-update'),
 
     # Requests
     path('requests/send/<int:donor_id>/', views.send_request, name='send-request'),
+    path('requests/broadcast/', views.broadcast_request, name='broadcast-request'),
     path('requests/donor/', views.donor_requests, name='donor-requests'),
     path('requests/respond/<int:request_id>/', views.respond_request, name='respond-request'),
     path('requests/patient/', views.patient_requests, name='patient-requests'),
 
     # Admin
     path('admin/stats/', views.admin_stats, name='admin-stats'),
+    path('metrics/', views.metrics_view, name='metrics'),
+
+    # Async-native variants for ASGI deployments (same payloads as above)
+    path('async/donors/', async_views.donors_list, name='async-donors-list'),
+    path('async/profile/<int:pk>/', async_views.profile_detail, name='async-profile-detail'),
+    path('async/requests/send/<int:donor_id>/', async_views.send_request, name='async-send-request'),
+    path('async/requests/donor/', async_views.donor_requests, name='async-donor-requests'),
+    path('async/requests/patient/', async_views.patient_requests, name='async-patient-requests'),
+
+    # Server-sent request events (long-lived; serve under ASGI)
+    path('events/', async_views.events_stream, name='events'),
 ]
@@ -1,22 +1,114 @@
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
-from .models import Profile, BloodRequest
+from .models import BLOOD_GROUPS, Profile, BloodRequest, BloodRequestArchive
+from .authentication import add_claims, token_for_user
+from .cache import bump_profile, cache_stats, cached_conditional, profile_dependencies
+from .cities import city_key
+from .conditional import queryset_validators
+from .db import replica_reads
+from .delta import InvalidSince, delta_data, eligibility_flips, initial_token
+from . import events, metrics, roster, stats
+from .geo import haversine_km
+from .images import validate_photo
+from .matching import COMPATIBLE_DONORS, match_donors
+from .pagination import KeysetPagination, merge_ordered, pagination_requested
+from .permissions import IsAdmin, user_role
 from .serializers import (
     ProfileSerializer,
     RegisterSerializer,
     BloodRequestSerializer,
+    BroadcastRequestSerializer,
+    LocationSerializer,
     UserSerializer,
+    sparse_fields,
 )
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.shortcuts import get_object_or_404
-from django.db import IntegrityError
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.db import IntegrityError, router, transaction
 from django.utils import timezone
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+
+
+PROFILE_ORDERING = ("date_created", "id")
+REQUEST_ORDERING = ("-requested_at", "-id")
+
+
+def list_data(request, qs, serializer_class, ordering, archived=None):
+    """
+    Serialize a list endpoint, one keyset page at a time unless the caller
+    asked for the legacy unpaginated array. `archived` is a second queryset
+    of the same shape (see BloodRequestArchive) merged into the results.
+    """
+    context = {"request": request}
+    querysets = [qs] if archived is None else [qs, archived]
+    if not pagination_requested(request):
+        if archived is None:
+            rows = qs.order_by(*ordering)
+        else:
+            rows = merge_ordered([list(q.order_by(*ordering)) for q in querysets], ordering)
+        return serializer_class(rows, many=True, context=context).data
+
+    paginator = KeysetPagination(ordering)
+    page = paginator.paginate_querysets(querysets, request)
+    return paginator.get_paginated_response(
+        serializer_class(page, many=True, context=context).data
+    ).data
+
+
+def list_response(request, qs, serializer_class, ordering, archived=None):
+    return Response(list_data(request, qs, serializer_class, ordering, archived))
+
+
+def include_archived(request):
+    return request.GET.get("include_archived") == "true"
+
+
+def delta_response(request, changes, matching, serializer_class, flipped=None):
+    """?since= answer: the rows changed after the token, tombstones included (see core.delta)."""
+    try:
+        data = delta_data(
+            request, request.GET["since"], changes, matching, serializer_class, flipped
+        )
+    except InvalidSince as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data)
+
+
+def with_since_token(response, token):
+    """Full responses carry the token a client starts delta-syncing from."""
+    response["X-Since-Token"] = token
+    return response
+
+
+def conditional_list_response(request, qs, archived=None):
+    """
+    Request inbox with an ETag: a 304 costs one index-only aggregate (per
+    table, nested profiles included) and never reaches the serializer. With
+    ?since= only the changed requests are returned.
+    """
+    querysets = [qs] if archived is None else [qs, archived]
+    serializer, trim = sparse_fields(request, BloodRequestSerializer, "requested_at")
+    related = [trim(q.select_related(*BloodRequestSerializer.related_fields)) for q in querysets]
+    if "since" in request.GET:
+        return delta_response(request, querysets, related, serializer)
+
+    token = initial_token()
+    validators = queryset_validators(
+        request, *querysets, related=BloodRequestSerializer.related_fields
+    )
+    not_modified = validators.not_modified(request)
+    if not_modified is not None:
+        return with_since_token(not_modified, token)
+    return with_since_token(validators.apply(
+        list_response(request, related[0], serializer, REQUEST_ORDERING, *related[1:])
+    ), token)
 
 
 # ---------------------------
@@ -25,9 +117,7 @@ from django.utils import timezone
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
-        token = super().get_token(user)
-        token["email"] = user.email
-        return token
+        return add_claims(super().get_token(user), user)
 
     def validate(self, attrs):
         data = super().validate(attrs)
@@ -64,7 +154,7 @@ def register_view(request):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        refresh = RefreshToken.for_user(user)
+        refresh = token_for_user(user)
         user_data = UserSerializer(user).data
         try:
             profile_data = ProfileSerializer(
@@ -88,42 +178,181 @@ def register_view(request):
 # ---------------------------
 # Donor list & profiles
 # ---------------------------
+@replica_reads
 @api_view(["GET"])
 def donors_list(request):
-    qs = Profile.objects.filter(role="donor")
-    blood = request.GET.get("blood")
-    city = request.GET.get("city")
-    available = request.GET.get("available")
+    # stored groups are always upper-case, so an exact match can use the index
+    blood = (request.GET.get("blood") or "").strip().upper()
+    city = city_key(request.GET.get("city"))
+    available = request.GET.get("available") == "true"
+
+    def donors():
+        # called on cache misses only: in_city() probes the table
+        qs = Profile.objects.filter(role="donor")
+        if blood:
+            qs = qs.filter(blood_group=blood)
+        if city:
+            qs = qs.in_city(city)
+        if available:
+            qs = qs.eligible_on()
+        return qs
+
+    serializer, trim = sparse_fields(request, ProfileSerializer, "date_created")
+    if "since" in request.GET:
+        # donors and former donors, so that leaving the filter (or the donor role) shows up
+        matching = trim(donors().select_related("user"))
+        return delta_response(
+            request,
+            [Profile.objects.donor_changes()],
+            [matching],
+            serializer,
+            eligibility_flips(matching),
+        )
 
-    if blood:
-        qs = qs.filter(blood_group__iexact=blood)
-    if city:
-        qs = qs.filter(city__icontains=city)
-    if available == "true":
-        qs = [p for p in qs if p.can_donate_now()]
-        serializer = ProfileSerializer(qs, many=True, context={"request": request})
-        return Response(serializer.data)
+    def build(qs):
+        return list_data(request, trim(qs.select_related("user")), serializer, PROFILE_ORDERING)
+
+    params = {
+        "blood": blood,
+        "city": city,
+        "available": available,
+        "cursor": request.GET.get("cursor"),
+        "page_size": request.GET.get("page_size"),
+        "paginate": pagination_requested(request),
+        "fields": request.GET.get("fields"),
+        "expand": request.GET.get("expand"),
+    }
+    token = initial_token()
+    validators, data = cached_conditional(
+        request,
+        "donors",
+        params,
+        profile_dependencies(blood_group=blood, city=city),
+        donors,
+        build,
+    )
+    if data is None:
+        return with_since_token(validators.not_modified(request), token)
+    return with_since_token(validators.apply(Response(data)), token)
+
+
+@replica_reads
+@api_view(["GET"])
+def donors_match(request):
+    """
+    Eligible donors compatible with the patient's blood group, ranked.
+    """
+    blood = (request.GET.get("blood") or "").strip().upper()
+    if blood not in COMPATIBLE_DONORS:
+        return Response(
+            {"detail": "A valid blood group is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        limit = int(request.GET.get("limit", settings.API_PAGE_SIZE))
+    except ValueError:
+        limit = settings.API_PAGE_SIZE
+    limit = max(1, min(limit, settings.API_MAX_PAGE_SIZE))
 
-    serializer = ProfileSerializer(qs, many=True, context={"request": request})
-    return Response(serializer.data)
+    serializer, trim = sparse_fields(request, ProfileSerializer)
+    donors = trim(match_donors(blood, city=request.GET.get("city"), limit=limit))
+    return Response(
+        {
+            "blood": blood,
+            "compatible_groups": COMPATIBLE_DONORS[blood],
+            "results": serializer(
+                donors, many=True, context={"request": request}
+            ).data,
+        }
+    )
 
 
+@replica_reads
+@api_view(["GET"])
+def donors_nearby(request):
+    """
+    Donors within radius_km of (lat, lon), nearest first.
+    """
+    try:
+        lat = float(request.GET["lat"])
+        lon = float(request.GET["lon"])
+        radius_km = float(request.GET.get("radius_km", 5))
+    except (KeyError, ValueError):
+        return Response(
+            {"detail": "lat, lon and radius_km must be numbers."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 0 < radius_km <= settings.NEARBY_MAX_RADIUS_KM):
+        return Response(
+            {"detail": "Coordinates or radius out of range."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        limit = int(request.GET.get("limit", settings.API_PAGE_SIZE))
+    except ValueError:
+        limit = settings.API_PAGE_SIZE
+    limit = max(1, min(limit, settings.API_MAX_PAGE_SIZE))
+
+    candidates = Profile.objects.filter(role="donor").near(lat, lon, radius_km)
+    blood = (request.GET.get("blood") or "").strip().upper()
+    if blood:
+        candidates = candidates.filter(blood_group=blood)
+    if request.GET.get("available") == "true":
+        candidates = candidates.eligible_on()
+
+    # exact distances for the index-pruned candidates, from their coordinates
+    # only; just the nearest `limit` are loaded in full
+    nearby = []
+    for pk, latitude, longitude in candidates.values_list("id", "latitude", "longitude"):
+        distance = haversine_km(lat, lon, latitude, longitude)
+        if distance <= radius_km:
+            nearby.append((distance, pk))
+    nearby.sort()
+    nearby = nearby[:limit]
+
+    serializer, trim = sparse_fields(request, ProfileSerializer)
+    profiles = trim(Profile.objects.select_related("user")).in_bulk([pk for _, pk in nearby])
+    results = serializer(
+        [profiles[pk] for _, pk in nearby], many=True, context={"request": request}
+    ).data
+    for row, (distance, _) in zip(results, nearby):
+        row["distance_km"] = round(distance, 3)
+    return Response({"results": results})
+
+
+@replica_reads
 @api_view(["GET"])
 def profile_detail(request, pk):
+    serializer, trim = sparse_fields(request, ProfileSerializer)
+
+    def build(qs):
+        profile = trim(qs.select_related("user")).get()
+        return serializer(profile, context={"request": request}).data
+
+    params = {"pk": pk, "fields": request.GET.get("fields"), "expand": request.GET.get("expand")}
     try:
-        profile = Profile.objects.get(id=pk)
-        return Response(ProfileSerializer(profile, context={"request": request}).data)
+        validators, data = cached_conditional(
+            request,
+            "profile",
+            params,
+            profile_dependencies(profile_id=pk),
+            lambda: Profile.objects.filter(id=pk),
+            build,
+        )
     except Profile.DoesNotExist:
         return Response({"detail": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+    if data is None:
+        return validators.not_modified(request)
+    return validators.apply(Response(data))
 
 
 @api_view(["PUT"])
 @permission_classes([IsAuthenticated])
 @parser_classes([MultiPartParser, FormParser, JSONParser])
 def update_profile(request):
-    user = request.user
+    # request.user is built from the token; the response needs the real row
     try:
-        profile = user.profile
+        profile = Profile.objects.select_related("user").get(user_id=request.user.id)
     except Profile.DoesNotExist:
         return Response(
             {"detail": "Profile not found for user"}, status=status.HTTP_404_NOT_FOUND
@@ -132,7 +361,6 @@ def update_profile(request):
     data = request.data
     for field in [
         "name",
-        "blood_group",
         "city",
         "bio",
         "ever_donated",
@@ -144,8 +372,31 @@ def update_profile(request):
                 val = val.lower() in ("1", "true", "yes")
             setattr(profile, field, val)
 
+    if "blood_group" in data:
+        try:
+            profile.blood_group = serializers.ChoiceField(BLOOD_GROUPS).run_validation(
+                str(data["blood_group"]).strip().upper()
+            )
+        except ValidationError as exc:
+            return Response({"blood_group": exc.detail}, status=status.HTTP_400_BAD_REQUEST)
+
+    if "latitude" in data or "longitude" in data:
+        location = LocationSerializer(
+            data={
+                axis: data.get(axis, getattr(profile, axis)) if data.get(axis) != "" else None
+                for axis in ("latitude", "longitude")
+            }
+        )
+        if not location.is_valid():
+            return Response(location.errors, status=status.HTTP_400_BAD_REQUEST)
+        profile.latitude = location.validated_data["latitude"]
+        profile.longitude = location.validated_data["longitude"]
+
     if "photo" in request.FILES:
-        profile.photo = request.FILES["photo"]
+        try:
+            profile.photo = validate_photo(request.FILES["photo"])
+        except ValidationError as exc:
+            return Response({"photo": exc.detail}, status=status.HTTP_400_BAD_REQUEST)
 
     profile.save()
     return Response(ProfileSerializer(profile, context={"request": request}).data)
@@ -161,7 +412,9 @@ def send_request(request, donor_id):
     Patient sends blood request to a donor.
     """
     message = request.data.get("message", "")
-    donor_profile = get_object_or_404(Profile, id=donor_id, role="donor")
+    donor_profile = get_object_or_404(
+        Profile.objects.select_related("user"), id=donor_id, role="donor"
+    )
     donor_user = donor_profile.user
 
     if request.user == donor_user:
@@ -173,33 +426,93 @@ def send_request(request, donor_id):
     blood_request = BloodRequest.objects.create(
         requester=request.user, donor=donor_user, message=message
     )
+    events.notify_request(blood_request, "request.created")
+    blood_request = BloodRequest.objects.select_related(
+        *BloodRequestSerializer.related_fields
+    ).get(pk=blood_request.pk)
     return Response(
         BloodRequestSerializer(blood_request, context={"request": request}).data,
         status=status.HTTP_201_CREATED,
     )
 
 
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def broadcast_request(request):
+    """
+    Patient sends the same request to many donors at once: explicit donor
+    profile ids, or the best matches for a blood group (and city).
+    Donors who already have a pending request from this patient are skipped.
+    """
+    serializer = BroadcastRequestSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    data = serializer.validated_data
+
+    if data.get("donor_ids"):
+        requested = list(dict.fromkeys(data["donor_ids"]))
+        candidates = Profile.objects.filter(id__in=requested, role="donor")
+    else:
+        requested = None
+        # a broadcast is only sent to donors in the requested city
+        candidates = match_donors(
+            data["blood"], city=data.get("city"), limit=data["limit"], same_city=True
+        )
+    # profile id -> user id, in one query
+    donors = dict(candidates.values_list("id", "user_id"))
+
+    skipped = {
+        "not_found": [pk for pk in requested if pk not in donors] if requested else [],
+        "self": [pk for pk, user_id in donors.items() if user_id == request.user.id],
+        "already_pending": [],
+    }
+    targets = {pk: user_id for pk, user_id in donors.items() if user_id != request.user.id}
+
+    with transaction.atomic():
+        pending = set(
+            BloodRequest.objects.filter(
+                requester=request.user, status="pending", donor_id__in=targets.values()
+            ).values_list("donor_id", flat=True)
+        )
+        skipped["already_pending"] = [pk for pk, user_id in targets.items() if user_id in pending]
+        created = BloodRequest.objects.bulk_create(
+            BloodRequest(requester=request.user, donor_id=user_id, message=data["message"])
+            for user_id in targets.values()
+            if user_id not in pending
+        )
+        for blood_request in created:
+            events.notify_request(blood_request, "request.created")
+
+    return Response(
+        {
+            "created": len(created),
+            "request_ids": [br.id for br in created],
+            "skipped": skipped,
+        },
+        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+    )
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def donor_requests(request):
     """
-    Donor views all incoming requests
+    Donor views all incoming requests; ?include_archived=true adds the
+    archived history.
     """
-    user = request.user
-    try:
-        profile = user.profile
-    except Profile.DoesNotExist:
+    role = user_role(request.user)
+    if role is None:
         return Response({"detail": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    if profile.role != "donor":
+    if role != "donor":
         return Response(
             {"detail": "Only donors can access this endpoint."},
             status=status.HTTP_403_FORBIDDEN,
         )
 
-    qs = BloodRequest.objects.filter(donor=user).order_by("-requested_at")
-    serializer = BloodRequestSerializer(qs, many=True, context={"request": request})
-    return Response(serializer.data)
+    qs = BloodRequest.objects.filter(donor=request.user)
+    archived = BloodRequestArchive.objects.filter(donor=request.user) if include_archived(request) else None
+    return conditional_list_response(request, qs, archived)
 
 
 @api_view(["POST"])
@@ -216,28 +529,43 @@ def respond_request(request, request_id):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    br = get_object_or_404(BloodRequest, id=request_id)
-
-    if br.donor != request.user:
+    # the pending -> responded transition is a single conditional UPDATE, so
+    # of several concurrent responses exactly one wins and the rest see 409
+    now = timezone.now()
+    with transaction.atomic():
+        responded = BloodRequest.objects.filter(
+            id=request_id, donor_id=request.user.id, status="pending"
+        ).update(status=status_value, responded_at=now, updated_at=now)
+        if responded and status_value == "accepted":
+            Profile.objects.filter(user_id=request.user.id).record_donation(now.date())
+
+    if not responded:
+        current = (
+            BloodRequest.objects.filter(id=request_id).values("donor_id", "status").first()
+            or BloodRequestArchive.objects.filter(id=request_id).values("donor_id", "status").first()
+        )
+        if current is None:
+            return Response(
+                {"detail": "No BloodRequest matches the given query."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        if current["donor_id"] != request.user.id:
+            return Response(
+                {"detail": "Only the donor can respond to this request."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
         return Response(
-            {"detail": "Only the donor can respond to this request."},
-            status=status.HTTP_403_FORBIDDEN,
+            {"detail": f'Request has already been {current["status"]}.'},
+            status=status.HTTP_409_CONFLICT,
         )
 
-    br.status = status_value
-    br.responded_at = timezone.now()
-    br.save()
-
-    # ✅ Auto update donor's profile if accepted
+    br = BloodRequest.objects.select_related(*BloodRequestSerializer.related_fields).get(
+        id=request_id
+    )
     if status_value == "accepted":
-        try:
-            donor_profile = request.user.profile
-            donor_profile.ever_donated = True
-            donor_profile.last_donation = timezone.now().date()
-            donor_profile.save()
-        except Profile.DoesNotExist:
-            pass
-
+        # record_donation() skipped the post_save cache invalidation
+        bump_profile(br.donor.profile)
+    events.notify_request(br, "request.responded")
     return Response(BloodRequestSerializer(br, context={"request": request}).data)
 
 
@@ -245,16 +573,18 @@ def respond_request(request, request_id):
 @permission_classes([IsAuthenticated])
 def patient_requests(request):
     """
-    Patient views all requests they have sent.
+    Patient views all requests they have sent; ?include_archived=true adds
+    the archived history.
     """
-    qs = BloodRequest.objects.filter(requester=request.user).order_by("-requested_at")
-    serializer = BloodRequestSerializer(qs, many=True, context={"request": request})
-    return Response(serializer.data)
+    qs = BloodRequest.objects.filter(requester=request.user)
+    archived = BloodRequestArchive.objects.filter(requester=request.user) if include_archived(request) else None
+    return conditional_list_response(request, qs, archived)
 
 
 # ---------------------------
 # Admin statistics
 # ---------------------------
+@replica_reads
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def admin_stats(request):
@@ -263,13 +593,102 @@ def admin_stats(request):
             {"detail": "Admin only."}, status=status.HTTP_403_FORBIDDEN
         )
 
-    donors_count = Profile.objects.filter(role="donor").count()
-    patients_count = Profile.objects.filter(role="patient").count()
-    pending_requests = BloodRequest.objects.filter(status="pending").count()
+    data = stats.totals()
+    data["cache"] = cache_stats()
 
-    data = {
-        "donors": donors_count,
-        "patients": patients_count,
-        "pending_requests": pending_requests,
-    }
+    if request.GET.get("breakdown") == "true":
+        data["breakdown"] = stats.cached_stats("breakdown", stats.donor_breakdown)
+
+    days = request.GET.get("days")
+    if days:
+        try:
+            days = max(1, min(int(days), stats.MAX_WINDOW_DAYS))
+        except ValueError:
+            return Response(
+                {"detail": "days must be an integer."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if days >= settings.ADMIN_STATS_CACHE_MIN_DAYS:
+            data["daily_requests"] = stats.cached_stats("daily", stats.daily_requests, days)
+        else:
+            data["daily_requests"] = stats.daily_requests(days)
     return Response(data)
+
+
+# ---------------------------
+# Roster import / export (staff)
+# ---------------------------
+ROSTER_CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+
+@api_view(["POST"])
+@permission_classes([IsAdmin])
+@parser_classes([MultiPartParser])
+def donors_import(request):
+    """
+    Bulk-create users and profiles from an uploaded CSV or NDJSON roster
+    ("file"). The format follows ?fmt= or the file extension. Responds with
+    the created count and the rejected rows.
+    """
+    upload = request.FILES.get("file")
+    if upload is None:
+        return Response({"detail": "Upload the roster as 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+    fmt = request.GET.get("fmt") or roster.format_for(upload.name)
+    try:
+        report = roster.import_rows(
+            roster.read_rows(upload, fmt),
+            max_errors=settings.ROSTER_IMPORT_MAX_ERRORS,
+        )
+    except roster.RosterFileError as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(
+        report.as_dict(),
+        status=status.HTTP_201_CREATED if report.created else status.HTTP_200_OK,
+    )
+
+
+@replica_reads
+@api_view(["GET"])
+@permission_classes([IsAdmin])
+def donors_export(request):
+    """
+    Stream profiles as CSV or NDJSON (?fmt=), optionally narrowed by ?role=,
+    ?blood= and ?city=. The columns are the ones donors_import reads.
+    """
+    fmt = request.GET.get("fmt", "csv")
+    if fmt not in roster.FORMATS:
+        return Response(
+            {"detail": f"fmt must be one of {', '.join(roster.FORMATS)}."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    qs = Profile.objects.all()
+    role = request.GET.get("role", "donor")
+    if role != "all":
+        qs = qs.filter(role=role)
+    blood = (request.GET.get("blood") or "").strip().upper()
+    if blood:
+        qs = qs.filter(blood_group=blood)
+    city = city_key(request.GET.get("city"))
+    if city:
+        qs = qs.filter(city_key=city)
+    # the body is read after the view returns, outside @replica_reads
+    qs = qs.using(router.db_for_read(Profile))
+
+    response = StreamingHttpResponse(
+        roster.export_lines(roster.export_queryset(qs), fmt),
+        content_type=ROSTER_CONTENT_TYPES[fmt],
+    )
+    response["Content-Disposition"] = f'attachment; filename="donors.{fmt}"'
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAdmin])
+def metrics_view(request):
+    """Prometheus scrape endpoint (text format 0.0.4); staff only."""
+    return HttpResponse(
+        metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )